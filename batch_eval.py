@@ -0,0 +1,164 @@
+"""
+Batch evaluation: run many independent conversations through coordinator.graph
+concurrently and stream one JSON line per conversation.
+
+All conversations share one event loop and one RateLimiter
+(tools/llm_scheduler.py), so throughput grows with --concurrency until the
+requests-per-minute / tokens-per-minute budget is reached. A turn that fails
+on a 429 (or a timeout / 5xx) is retried after a jittered backoff, during which
+every conversation holds off. The output file is the checkpoint: conversations
+already in it without an error are skipped when the run is started again.
+
+    python batch_eval.py questions.jsonl --out results.jsonl --concurrency 16 --rpm 500 --tpm 200000
+
+Input lines: {"id": ..., "question": "..."} or {"id": ..., "turns": ["...", "..."]}
+(id defaults to the line number). Output lines: {"id", "turns": [{"question",
+"answer", "route"}], "seconds", "llm_calls", "tokens", "attempts", "error"}.
+
+From Python:
+
+    from batch_eval import run_batch
+    results = run_batch([{"id": 1, "question": "How many Titanic survivors?"}], out="results.jsonl")
+"""
+import os, json, time, asyncio, argparse
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+from tools import llm_registry
+from tools.llm_scheduler import RateLimiter, UsageHandler, backoff_delay, is_retryable
+
+llm_registry.load_env()
+
+# defaults for the CLI and run_batch (0 = no limit)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_RETRIES = int(os.getenv("BATCH_RETRIES", "5"))
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+
+# one line per conversation; id falls back to the line number
+def load_items(path: str) -> List[Dict[str, Any]]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if line.strip():
+                item = json.loads(line)
+                item.setdefault("id", n)
+                items.append(item)
+    return items
+
+# ids already answered in an earlier run of the same output file
+def completed_ids(out: str | None) -> set:
+    done = set()
+    if out and Path(out).exists():
+        with open(out, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError: # a line cut short by the interruption
+                    continue
+                if not row.get("error"):
+                    done.add(str(row["id"]))
+    return done
+
+class _RateLimited(Exception):
+    """An agent answered, but one of its LLM calls hit a 429 along the way."""
+    def __init__(self, error: BaseException):
+        super().__init__(str(error))
+        self.response = getattr(error, "response", None)
+
+# one conversation, turn by turn; a failed turn is retried from the state before it
+async def _run_conversation(graph, item: Dict[str, Any], limiter: RateLimiter, retries: int) -> Dict[str, Any]:
+    questions = item.get("turns") or [item["question"]]
+    messages: List[Dict[str, str]] = []
+    context = {"summary": "", "summarised": 0}
+    usage = UsageHandler(limiter)
+    turns, attempts, error = [], 0, None
+    started = time.perf_counter()
+    for question in questions:
+        for attempt in range(retries + 1):
+            attempts += 1
+            usage.rate_limited = None
+            try:
+                out = await graph.ainvoke(
+                    {"messages": messages + [{"role": "user", "content": question}], **context},
+                    config={"callbacks": [usage]},
+                )
+                if usage.rate_limited is not None:
+                    raise _RateLimited(usage.rate_limited)
+                error = None
+                break
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if attempt == retries or not (isinstance(e, _RateLimited) or is_retryable(e)):
+                    break
+                delay = backoff_delay(attempt, e)
+                limiter.pause(delay)
+                print(f"[batch_eval] {item['id']}: {type(e).__name__}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        if error is not None:
+            break
+        answer = out["messages"][-1].content
+        messages += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+        context = {"summary": out.get("summary", ""), "summarised": out.get("summarised", 0)}
+        turns.append({"question": question, "answer": answer, "route": out.get("route")})
+    return {"id": item["id"], "turns": turns, "seconds": round(time.perf_counter() - started, 3),
+            "llm_calls": usage.llm_calls, "tokens": usage.tokens, "attempts": attempts, "error": error}
+
+# Run every conversation not yet in `out`, at most `concurrency` at a time; results are
+# appended to `out` as they finish and returned in completion order. `limiter` replaces
+# the one built from rpm / tpm (e.g. to share it with models outside llm_registry)
+async def arun_batch(items: Iterable[Dict[str, Any]], out: str | None = None, *, concurrency: int = BATCH_CONCURRENCY,
+                     rpm: float = LLM_RPM, tpm: float = LLM_TPM, retries: int = BATCH_RETRIES,
+                     graph=None, limiter: RateLimiter | None = None) -> List[Dict[str, Any]]:
+    if graph is None:
+        from coordinator import graph
+    done = completed_ids(out)
+    todo = [it for it in items if str(it["id"]) not in done]
+    if done:
+        print(f"[batch_eval] resuming: {len(done)} done, {len(todo)} to go")
+    limiter = limiter or RateLimiter(rpm, tpm)
+    limited = bool(limiter.rpm or limiter.tpm)
+    llm_registry.set_rate_limiter(limiter if limited else None)
+    sem = asyncio.Semaphore(concurrency)
+    sink = open(out, "a", encoding="utf-8") if out else None
+    results = []
+
+    async def one(item):
+        async with sem:
+            row = await _run_conversation(graph, item, limiter, retries)
+        results.append(row)
+        if sink is not None:
+            sink.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            sink.flush()
+
+    try:
+        await asyncio.gather(*(one(it) for it in todo))
+    finally:
+        llm_registry.set_rate_limiter(None)
+        if sink is not None:
+            sink.close()
+    if limited:
+        print(f"[batch_eval] rate limiter: {limiter.stats()}")
+    return results
+
+def run_batch(items: Iterable[Dict[str, Any]], out: str | None = None, **kwargs: Any) -> List[Dict[str, Any]]:
+    return asyncio.run(arun_batch(items, out, **kwargs))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run a JSONL file of questions through the assistant")
+    ap.add_argument("input")
+    ap.add_argument("--out", required=True, help="results JSONL; also the checkpoint for resuming")
+    ap.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    ap.add_argument("--rpm", type=float, default=LLM_RPM, help="LLM requests per minute (0 = no limit)")
+    ap.add_argument("--tpm", type=float, default=LLM_TPM, help="LLM tokens per minute (0 = no limit)")
+    ap.add_argument("--retries", type=int, default=BATCH_RETRIES)
+    args = ap.parse_args(argv)
+    started = time.perf_counter()
+    results = run_batch(load_items(args.input), args.out, concurrency=args.concurrency,
+                        rpm=args.rpm, tpm=args.tpm, retries=args.retries)
+    seconds = time.perf_counter() - started
+    failed = sum(1 for r in results if r["error"])
+    print(f"[batch_eval] {len(results)} conversations in {seconds:.1f}s ({len(results) / seconds if seconds else 0:.2f}/s), "
+          f"{failed} failed, {sum(r['llm_calls'] for r in results)} LLM calls, {sum(r['tokens'] for r in results)} tokens")
+
+if __name__ == "__main__":
+    main()
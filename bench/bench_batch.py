@@ -0,0 +1,96 @@
+"""
+Offline run of batch_eval over the replay workload (bench/workloads/replay.jsonl),
+with the same scripted models, weather stub and SQLite databases as
+bench_replay:
+  - throughput (conversations/s) at each --concurrency level, no budget
+  - the same at the highest level under an --rpm budget: the LLM call rate stays
+    at the limit
+  - a model that answers every --fail-every'th call with a 429: every
+    conversation still finishes, through retries
+  - resume: a run interrupted half-way continues from its output file
+
+    python -m bench.bench_batch
+    python -m bench.bench_batch --conversations 96 --concurrency 1,8,32 --rpm 600
+"""
+import os, io, json, asyncio, argparse, tempfile, contextlib, time
+from pathlib import Path
+from bench.bench_replay import DEFAULT_WORKLOAD, Script, load_workload, _setup_env, _install_fakes
+from bench.weather_stub import WeatherStub
+
+class RateLimitError(Exception):
+    status_code = 429
+
+def _items(workload, n: int):
+    return [{"id": i, "question": workload[i % len(workload)]["question"]} for i in range(n)]
+
+def _run(batch_eval, items, out=None, **kwargs):
+    t0 = time.perf_counter()
+    results = asyncio.run(batch_eval.arun_batch(items, out, **kwargs))
+    return results, time.perf_counter() - t0
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="batch_eval throughput / rate-limit / retry benchmark")
+    ap.add_argument("--workload", default=str(DEFAULT_WORKLOAD))
+    ap.add_argument("--conversations", type=int, default=48)
+    ap.add_argument("--concurrency", default="1,4,16", type=lambda s: [int(x) for x in s.split(",")])
+    ap.add_argument("--llm-latency", type=float, default=0.2, help="seconds before each fake model reply")
+    ap.add_argument("--rpm", type=float, default=600)
+    ap.add_argument("--fail-every", type=int, default=7, help="every n-th model call returns a 429")
+    args = ap.parse_args(argv)
+    args.token_delay, args.trace, args.no_templates, args.warm_caches = 0.0, False, False, False
+
+    workload = load_workload(Path(args.workload))
+    stub = WeatherStub(delay=0.02).start()
+    tmp = tempfile.mkdtemp(prefix="bench_batch_")
+    _setup_env(args, stub.base_url, tmp)
+    script = Script(workload)
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph, fake = _install_fakes(script, args)
+        import batch_eval
+        from tools.llm_scheduler import RateLimiter
+        _run(batch_eval, _items(workload, len(workload)), graph=graph) # warm-up: schema snapshots, book index, pools
+    items = _items(workload, args.conversations)
+
+    for c in args.concurrency:
+        calls0 = fake.calls
+        with contextlib.redirect_stdout(io.StringIO()):
+            results, secs = _run(batch_eval, items, graph=graph, concurrency=c)
+        print(f"concurrency={c:<3} no budget   {len(results) / secs:6.2f} conv/s  {(fake.calls - calls0) / secs * 60:7.0f} LLM calls/min  "
+              f"failed={sum(1 for r in results if r['error'])}")
+
+    c = max(args.concurrency)
+    limiter = RateLimiter(rpm=args.rpm)
+    fake.rate_limiter = limiter
+    calls0 = fake.calls
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, secs = _run(batch_eval, items, graph=graph, concurrency=c, limiter=limiter)
+    fake.rate_limiter = None
+    print(f"concurrency={c:<3} rpm={args.rpm:<7g} {len(results) / secs:6.2f} conv/s  {(fake.calls - calls0) / secs * 60:7.0f} LLM calls/min  "
+          f"failed={sum(1 for r in results if r['error'])}")
+
+    def flaky(messages, n=[0]):
+        n[0] += 1
+        if n[0] % args.fail_every == 0:
+            raise RateLimitError("429 Too Many Requests")
+        return script(messages)
+    fake.respond = flaky
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        results, secs = _run(batch_eval, items, graph=graph, concurrency=c)
+    fake.respond = script
+    retried = sum(r["attempts"] - 1 for r in results)
+    print(f"concurrency={c:<3} 429 every {args.fail_every} calls: {len(results)} conversations in {secs:.1f}s, "
+          f"{retried} retried turns, failed={sum(1 for r in results if r['error'])}")
+
+    out = os.path.join(tmp, "results.jsonl")
+    half = len(items) // 2
+    with contextlib.redirect_stdout(io.StringIO()):
+        _run(batch_eval, items[:half], out, graph=graph, concurrency=c) # the "interrupted" run
+        resumed, _ = _run(batch_eval, items, out, graph=graph, concurrency=c)
+    with open(out, encoding="utf-8") as f:
+        ids = [json.loads(line)["id"] for line in f]
+    print(f"resume: second run answered {len(resumed)} of {len(items)}; output has {len(set(ids))} ids in {len(ids)} lines")
+    stub.stop()
+
+if __name__ == "__main__":
+    main()
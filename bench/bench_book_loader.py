@@ -0,0 +1,65 @@
+"""
+Peak memory and load time: json.load (previous loader) vs streaming BookCorpus.
+
+Writes a synthetic books.json with N records, then loads it in a fresh
+subprocess per mode and reports wall time and peak RSS above the interpreter
+baseline.
+
+    python -m bench.bench_book_loader            # 100k and 1M records
+    python -m bench.bench_book_loader 50000
+"""
+import os, sys, json, time, resource, tempfile, subprocess
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "bench") # agents build their LLM clients at import
+
+MODES = ["json.load", "stream", "stream+index", "persisted"]
+
+def _peak_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+
+def _worker(mode: str, path: Path) -> None:
+    from tools import book_agent, book_corpus, book_index
+    base = _peak_mb()
+    t0 = time.perf_counter()
+    if mode == "json.load":
+        with path.open("r", encoding="utf-8") as f:
+            n = len(json.load(f))
+    elif mode == "stream":
+        n = len(book_corpus.BookCorpus.build(path))
+    elif mode == "stream+index":
+        index = book_index.BookIndex(book_agent._FIELD_WEIGHTS)
+        n = len(book_corpus.BookCorpus.build(path, lambda rec: index.add(book_agent._doc_tokens(rec))))
+    else: # corpus + index already persisted by a previous run
+        sig = book_index.file_signature(path)
+        corpus = book_corpus.BookCorpus.load(path.with_name(path.name + ".corpus.pkl"), path, sig)
+        book_index.BookIndex.load(path.with_name(path.name + ".index.pkl"), sig, book_agent._FIELD_WEIGHTS)
+        n = len(corpus)
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({"n": n, "seconds": elapsed, "peak_mb": _peak_mb() - base}))
+
+def run(n: int) -> None:
+    from bench.bench_book_search import _corpus
+    with tempfile.TemporaryDirectory() as d:
+        path = Path(d) / "books.json"
+        with path.open("w", encoding="utf-8") as f:
+            f.write("[\n")
+            for i, rec in enumerate(_corpus(n)):
+                f.write((",\n" if i else "") + json.dumps(rec, ensure_ascii=False))
+            f.write("\n]")
+        # persist corpus + index so the 'persisted' mode has something to load
+        subprocess.run([sys.executable, "-c", "from tools import book_agent; book_agent._load_books()"],
+                       check=True, capture_output=True, env={**os.environ, "BOOKS_PATH": str(path)})
+        size_mb = path.stat().st_size / 1e6
+        for mode in MODES:
+            out = subprocess.run([sys.executable, "-m", "bench.bench_book_loader", "--worker", mode, str(path)],
+                                 check=True, capture_output=True, text=True).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"n={n:>9,} file={size_mb:7.1f} MB  {mode:<13} load={r['seconds']:7.2f} s  peak_rss=+{r['peak_mb']:8.1f} MB")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--worker"]:
+        _worker(sys.argv[2], Path(sys.argv[3]))
+    else:
+        for n in [int(x) for x in sys.argv[1:]] or [100_000, 1_000_000]:
+            run(n)
@@ -0,0 +1,110 @@
+"""
+book_search: linear scan (previous implementation) vs BM25 inverted index.
+
+Builds a synthetic corpus shaped like data/books.json at each size (Zipf-distributed
+20k-word vocabulary) and times index build, persisted-index load and per-query
+latency for both approaches.
+
+    python -m bench.bench_book_search            # 1k, 100k, 1M records
+    python -m bench.bench_book_search 1000 10000
+"""
+import os, sys, time, random, tempfile
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "bench") # agents build their LLM clients at import
+from tools import book_agent, book_index
+
+QUERIES = [
+    "who wrote the raven",
+    "famous line from hamlet",
+    "two roads diverged in a yellow wood",
+    "moby dick whale",
+    "shall i compare thee to a summer's day",
+]
+
+_WORDS = (
+    "the raven hamlet whale sea night king question love road wood yellow summer day "
+    "midnight dreary weary volume lore tapping chamber door ghost sword crown ship "
+    "storm river mountain garden winter spring autumn star moon sun fire shadow light"
+).split()
+_AUTHORS = ["William Shakespeare", "Edgar Allan Poe", "Herman Melville", "Robert Frost", "Homer", "Walt Whitman", "Jane Austen"]
+
+def _vocabulary(size: int = 20_000, seed: int = 1):
+    rnd = random.Random(seed)
+    words = ["".join(rnd.choices("abcdefghijklmnopqrstuvwxyz", k=rnd.randint(3, 9))) for _ in range(size)]
+    for i, w in enumerate(_WORDS): # real words spread over the frequency ranks
+        words[i * (size // 2) // len(_WORDS)] = w
+    words[:8] = ["the", "and", "of", "a", "to", "in", "i", "is"]
+    cum, total = [], 0.0
+    for rank in range(size):
+        total += 1.0 / (rank + 1)
+        cum.append(total)
+    return words, cum
+
+def _corpus(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    vocab, cum = _vocabulary()
+    words = lambda k: rnd.choices(vocab, cum_weights=cum, k=k)
+    for i in range(n):
+        rec = {
+            "title": " ".join(words(rnd.randint(1, 4))).title(),
+            "author": rnd.choice(_AUTHORS),
+            "published_year": rnd.randint(1600, 1950),
+            "genre": rnd.choice(["Poem", "Play", "Novel"]),
+        }
+        if rnd.random() < 0.5:
+            rec["lines"] = [" ".join(words(rnd.randint(6, 12))) for _ in range(3)]
+        else:
+            rec["text"] = " ".join(words(rnd.randint(10, 30)))
+        yield rec
+
+# previous _score_record: substring tests over freshly built text per record
+def _linear_score(rec, terms):
+    score = 0
+    title = book_agent._norm(str(rec.get("title", "")))
+    author = book_agent._norm(str(rec.get("author", "")))
+    body = book_agent._field_to_text(rec)
+    for t in terms:
+        if t in title:  score += 5
+        if t in author: score += 4
+        if t in body:   score += 2
+    return score
+
+def _linear_search(books, query, k=5):
+    terms = book_agent._tokenise(book_agent._norm(query))
+    scored = [(rec, _linear_score(rec, terms)) for rec in books]
+    scored = [x for x in scored if x[1] > 0]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:k]
+
+def _time(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+def run(n: int):
+    books = list(_corpus(n))
+    repeat = max(1, min(20, 200_000 // n))
+    linear = sum(_time(lambda q=q: _linear_search(books, q), repeat) for q in QUERIES) / len(QUERIES)
+
+    t0 = time.perf_counter()
+    index = book_index.BookIndex.build((book_agent._doc_tokens(r) for r in books), book_agent._FIELD_WEIGHTS)
+    build = time.perf_counter() - t0
+    with tempfile.TemporaryDirectory() as d:
+        path = Path(d) / "books.index.pkl"
+        index.save(path)
+        t0 = time.perf_counter()
+        book_index.BookIndex.load(path, index.signature, book_agent._FIELD_WEIGHTS)
+        load = time.perf_counter() - t0
+        size = path.stat().st_size
+
+    terms = [book_agent._tokenise(book_agent._norm(q)) for q in QUERIES]
+    indexed = sum(_time(lambda t=t: index.search(t, 5), max(repeat, 20)) for t in terms) / len(terms)
+    print(f"n={n:>9,}  linear={linear * 1e3:9.2f} ms/query  index={indexed * 1e3:8.3f} ms/query  "
+          f"speedup={linear / indexed:7.1f}x  build={build:6.2f} s  load={load:6.2f} s  index_size={size / 1e6:7.1f} MB")
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1_000, 100_000, 1_000_000]
+    for n in sizes:
+        run(n)
@@ -0,0 +1,87 @@
+"""
+Concurrent conversations through the coordinator graph: sync graph.invoke on a
+bounded thread pool (one thread per in-flight turn, as Streamlit does today)
+versus graph.astream on a single event loop.
+
+The chat model is a scripted fake with a fixed latency and weather comes from
+the local stub, so the numbers measure how well each path overlaps waiting.
+
+    python -m bench.bench_load
+"""
+import os, time, asyncio, statistics
+from concurrent.futures import ThreadPoolExecutor
+from bench.weather_stub import WeatherStub
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+LLM_LATENCY = 0.3     # seconds per simulated model call
+WEATHER_DELAY = 0.2   # seconds per simulated upstream request
+THREADS = 16          # worker threads for the sync path
+LEVELS = [1, 8, 32, 128]
+CITIES = ["London", "Paris", "Tokyo", "Berlin", "Madrid", "Rome", "Oslo", "Lima"]
+
+def _respond(messages):
+    from langchain_core.messages import AIMessage, ToolMessage
+    if any(isinstance(m, ToolMessage) for m in messages): # finalise
+        return AIMessage(content="It is " + messages[-1].content[:40])
+    text = messages[-1].content
+    city = next((c for c in CITIES if c in text), "London")
+    return AIMessage(content="", tool_calls=[{"name": "get_weather", "args": {"cities": [city]}, "id": f"call-{city}"}])
+
+def _percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+def _report(mode, n, elapsed, latencies):
+    print(f"{mode:<6} concurrency={n:<4} throughput={n / elapsed:6.1f} turns/s  "
+          f"p50={statistics.median(latencies) * 1e3:6.0f} ms  p95={_percentile(latencies, 95) * 1e3:6.0f} ms")
+
+def main():
+    stub = WeatherStub(delay=WEATHER_DELAY).start()
+    os.environ["WEATHER_API_BASE"] = stub.base_url
+    os.environ.setdefault("WEATHER_API_KEY", "stub")
+    os.environ["WEATHER_CACHE_TTL"] = "0" # every turn goes upstream
+    from bench.fakes import ScriptedChatModel
+    import coordinator
+    from tools import weather_agent
+    from langchain_core.messages import HumanMessage
+
+    fake = ScriptedChatModel(respond=_respond, latency=LLM_LATENCY)
+    coordinator.llm = weather_agent.llm = fake
+
+    def question(i):
+        return {"messages": [HumanMessage(content=f"What's the weather in {CITIES[i % len(CITIES)]}?")]}
+
+    # each turn returns its finish time; latency is measured from the start of the level so
+    # time spent queued for a worker thread counts
+    def sync_turn(i):
+        coordinator.graph.invoke(question(i))
+        return time.perf_counter()
+
+    async def async_turn(i):
+        async for _ in coordinator.graph.astream(question(i), stream_mode="values"):
+            pass
+        return time.perf_counter()
+
+    async def async_level(n):
+        return await asyncio.gather(*(async_turn(i) for i in range(n)))
+
+    sync_turn(0) # import/compile warm-up
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        for n in LEVELS:
+            t0 = time.perf_counter()
+            latencies = [t - t0 for t in pool.map(sync_turn, range(n))]
+            _report("sync", n, time.perf_counter() - t0, latencies)
+
+    async def async_levels():
+        await async_level(LEVELS[1]) # warm-up on this loop (HTTP client, connections, executor threads)
+        for n in LEVELS:
+            t0 = time.perf_counter()
+            latencies = [t - t0 for t in await async_level(n)]
+            _report("async", n, time.perf_counter() - t0, latencies)
+
+    asyncio.run(async_levels()) # one loop for every level, as in the app
+    print(f"model calls={fake.calls}  upstream weather requests={stub.total_requests}")
+    stub.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Offline replay of a JSONL workload through coordinator.graph.
+
+Everything external is replaced by a local stand-in, so this runs on an
+offline box without API keys or Postgres:
+  - every chat model is a deterministic scripted fake (bench/fakes.py) that
+    emits the tool calls described in the workload, after a fixed latency
+  - WeatherAPI is the local stub server (bench/weather_stub.py)
+  - the SQL agent runs against SQLite copies of the titanic and happiness
+    dumps in init/dumps/, built into a temp dir (there is no LEGO dump, so no
+    LEGO questions)
+
+Reports end-to-end and per-node p50/p95/p99 latency, LLM calls per node, DB
+queries, upstream weather requests and throughput for each concurrency level.
+Save a run with --out and compare a later commit against it with --compare:
+
+    python -m bench.bench_replay
+    python -m bench.bench_replay --concurrency 1,8,32 --out bench/results/base.json
+    python -m bench.bench_replay --compare bench/results/base.json
+
+Workload lines: {"question", "agent": sql|book|weather, "db", "sql", "book_query", "cities"}
+"""
+import os, io, json, time, zlib, asyncio, argparse, tempfile, threading, statistics, subprocess, contextlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+from bench.weather_stub import WeatherStub
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_WORKLOAD = ROOT / "bench" / "workloads" / "replay.jsonl"
+
+def load_workload(path: Path) -> List[Dict[str, Any]]:
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ---------- scripted model ----------
+
+class Script:
+    """Answers each prompt the way the real model would for the workload item it belongs to."""
+    def __init__(self, workload: List[Dict[str, Any]]):
+        self.items = {it["question"]: it for it in workload}
+
+    def _item(self, question: str) -> Dict[str, Any]:
+        item = self.items.get(question)
+        if item is None: # e.g. the SQL agent's retry prompt appends an instruction
+            item = next((it for q, it in self.items.items() if question.startswith(q)), {})
+        return item
+
+    @staticmethod
+    def _call(name: str, args: Dict[str, Any], question: str):
+        from langchain_core.messages import AIMessage
+        call_id = f"call_{zlib.crc32((name + question).encode('utf-8')):08x}"
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+    def __call__(self, messages):
+        from langchain_core.messages import AIMessage
+        system = next((m.content for m in messages if m.type == "system" and isinstance(m.content, str)), "")
+        humans = [m for m in messages if m.type == "human"]
+        question = humans[-1].content if humans else ""
+        item = self._item(question)
+        last = messages[-1]
+        answered = last.type == "tool"
+        if "strict router" in system:
+            return AIMessage(content=item.get("agent", "sql"))
+        if "strict classifier" in system:
+            return AIMessage(content=item.get("db", "titanic"))
+        if "book-RAG agent" in system:
+            if answered:
+                return AIMessage(content="From the library: " + last.content.splitlines()[1 if "\n" in last.content else 0][:200])
+            return self._call("book_search", {"query": item.get("book_query", question)}, question)
+        if "weather assistant" in system:
+            return self._call("get_weather", {"cities": item.get("cities", ["London"])}, question)
+        if "SQL database" in system:
+            if answered:
+                return AIMessage(content="The query returned " + last.content[:200])
+            return self._call("sql_db_query", {"query": item.get("sql", "SELECT 1")}, question)
+        if "running summary" in system:
+            return AIMessage(content="Summary: " + question[:200])
+        # finalise (full re-synthesis or formatting rewrite)
+        body = next((m.content for m in reversed(messages) if isinstance(m.content, str) and m.content.strip()), "")
+        return AIMessage(content="Final answer: " + body[:300])
+
+# ---------- instrumentation ----------
+
+def _node_path(metadata: Dict[str, Any]) -> str:
+    ns = metadata.get("langgraph_checkpoint_ns", "")
+    return "/".join(part.split(":")[0] for part in ns.split("|") if part) or metadata.get("langgraph_node", "")
+
+def _make_recorder():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class Recorder(BaseCallbackHandler):
+        """Per-node durations and LLM calls, from LangGraph's run metadata."""
+        run_inline = True
+
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.started: Dict[Any, tuple] = {}
+            self.node_seconds: Dict[str, List[float]] = defaultdict(list)
+            self.llm_calls: Dict[str, int] = defaultdict(int)
+
+        def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+            metadata = metadata or {}
+            if metadata.get("langgraph_node") and kwargs.get("name") == metadata["langgraph_node"]:
+                path = _node_path(metadata)
+                with self.lock:
+                    parent = self.started.get(parent_run_id)
+                    if parent and parent[0] == path: # a function named like its node, inside the node run
+                        return
+                    self.started[run_id] = (path, time.perf_counter())
+
+        def _end(self, run_id):
+            with self.lock:
+                started = self.started.pop(run_id, None)
+                if started:
+                    self.node_seconds[started[0]].append(time.perf_counter() - started[1])
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            self._end(run_id)
+
+        def on_chain_error(self, error, *, run_id, **kwargs):
+            self._end(run_id)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+            with self.lock:
+                self.llm_calls[_node_path(metadata or {}) or "(outside graph)"] += 1
+
+    return Recorder()
+
+class QueryCounter:
+    """Counts statements sent to any SQLAlchemy engine."""
+    def __init__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        self.n = 0
+        self._lock = threading.Lock()
+        event.listen(Engine, "before_cursor_execute", self._count)
+
+    def _count(self, *_args, **_kwargs):
+        with self._lock:
+            self.n += 1
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "n": 0}
+    if len(values) == 1:
+        v = values[0] * 1e3
+        return {"p50": v, "p95": v, "p99": v, "n": 1}
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": statistics.median(values) * 1e3, "p95": q[94] * 1e3, "p99": q[98] * 1e3, "n": len(values)}
+
+# ---------- runner ----------
+
+def _setup_env(args, stub_url: str, tmp: str) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ["WEATHER_API_BASE"] = stub_url
+    os.environ["WEATHER_API_KEY"] = "stub"
+    os.environ["SCHEMA_CACHE_DIR"] = os.path.join(tmp, "schema") # never reuse a snapshot from a previous run
+    if args.trace:
+        os.environ["TRACING"] = "1"
+        os.environ["TRACE_PATH"] = os.path.join(tmp, "traces.jsonl")
+        os.environ["METRICS_PORT"] = "0"
+    if args.no_templates: # every SQL question goes through the agent loop
+        os.environ["SQL_TEMPLATES"] = "0"
+    if not args.warm_caches: # every turn does the full work
+        os.environ["SQL_CACHE"] = "0"
+        os.environ["WEATHER_CACHE_TTL"] = "0"
+    # SQLite copies built from init/dumps with their template summary tables (the bundled
+    # data/*.db files, which have none, when a dump is missing); imported only now, after
+    # the settings above are in the environment
+    from tools import sqlite_import
+    for dump, db_file, env in (("titanic.sql", "titanic.db", "TITANIC_DB_URI"),
+                               ("happiness_index.sql", "happiness_index.db", "HAPPINESS_DB_URI")):
+        path = ROOT / "data" / db_file
+        if (sqlite_import.INIT_DIR / dump).exists():
+            path = Path(tmp) / db_file
+            with contextlib.redirect_stdout(io.StringIO()):
+                sqlite_import.convert(sqlite_import.INIT_DIR / dump, path)
+        os.environ[env] = f"sqlite:///{path}"
+
+def _install_fakes(script: Script, args):
+    from bench.fakes import ScriptedChatModel
+    import coordinator
+    from tools import book_agent, weather_agent, sql_agent, context_window
+    fake = ScriptedChatModel(respond=script, latency=args.llm_latency, token_delay=args.token_delay)
+    coordinator.llm = coordinator.format_llm = fake
+    weather_agent.llm = fake
+    book_agent.llm_with_tools = fake
+    sql_agent.CLF_LLM = sql_agent.SQL_LLM = fake
+    context_window.summary_llm = fake
+    return coordinator.graph, fake
+
+def _run_level(graph, workload, concurrency: int, repeat: int, mode: str, recorder) -> Dict[str, Any]:
+    from langchain_core.messages import HumanMessage
+    from tools import tracing
+    turns = [it["question"] for _ in range(repeat) for it in workload]
+    latencies: List[float] = []
+    errors = 0
+
+    def check(answer: str) -> None:
+        nonlocal errors
+        if "error" in answer.lower():
+            errors += 1
+
+    if mode == "sync":
+        def one(q):
+            t0 = time.perf_counter()
+            trace = tracing.start_turn(q) # None unless --trace
+            tracing.activate(trace)
+            out = graph.invoke({"messages": [HumanMessage(content=q)]}, config={"callbacks": [recorder, *tracing.callbacks(trace)]})
+            if trace is not None:
+                trace.finish()
+            latencies.append(time.perf_counter() - t0)
+            check(out["messages"][-1].content)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, turns))
+        return {"elapsed": time.perf_counter() - t0, "latencies": latencies, "errors": errors}
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one(q):
+            async with limit:
+                t0 = time.perf_counter()
+                trace = tracing.start_turn(q)
+                tracing.activate(trace) # this task's context only
+                out = await graph.ainvoke({"messages": [HumanMessage(content=q)]}, config={"callbacks": [recorder, *tracing.callbacks(trace)]})
+                if trace is not None:
+                    trace.finish()
+                latencies.append(time.perf_counter() - t0)
+                check(out["messages"][-1].content)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in turns))
+        return time.perf_counter() - t0
+
+    elapsed = asyncio.run(main())
+    return {"elapsed": elapsed, "latencies": latencies, "errors": errors}
+
+def run(args) -> Dict[str, Any]:
+    workload = load_workload(Path(args.workload))
+    stub = WeatherStub(delay=args.weather_delay).start()
+    tmp = tempfile.mkdtemp(prefix="bench_replay_")
+    _setup_env(args, stub.base_url, tmp)
+    log = None if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(log) if log else contextlib.nullcontext():
+        graph, fake = _install_fakes(Script(workload), args)
+        from tools import sql_templates
+        queries = QueryCounter()
+        _run_level(graph, workload, 1, 1, args.mode, _make_recorder()) # warm-up: schema snapshots, book index, pools
+        levels = {}
+        for c in args.concurrency:
+            recorder = _make_recorder()
+            calls0, q0, w0 = fake.calls, queries.n, stub.total_requests
+            hits0, misses0 = sql_templates.STATS["hits"], sql_templates.STATS["misses"]
+            res = _run_level(graph, workload, c, args.repeat, args.mode, recorder)
+            n = len(res["latencies"])
+            levels[str(c)] = {
+                "turns": n,
+                "errors": res["errors"],
+                "throughput": n / res["elapsed"],
+                "e2e_ms": _percentiles(res["latencies"]),
+                "nodes_ms": {k: _percentiles(v) for k, v in sorted(recorder.node_seconds.items())},
+                "llm_calls": fake.calls - calls0,
+                "llm_calls_by_node": dict(sorted(recorder.llm_calls.items())),
+                "db_queries": queries.n - q0,
+                "weather_requests": stub.total_requests - w0,
+                "template_hits": sql_templates.STATS["hits"] - hits0,
+                "template_lookups": sql_templates.STATS["hits"] - hits0 + sql_templates.STATS["misses"] - misses0,
+            }
+    stub.stop()
+    return {
+        "commit": _git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "workload": os.path.relpath(args.workload, ROOT), "turns_per_level": len(workload) * args.repeat,
+            "mode": args.mode, "llm_latency": args.llm_latency, "token_delay": args.token_delay,
+            "weather_delay": args.weather_delay, "warm_caches": args.warm_caches, "trace": args.trace,
+            "templates": not args.no_templates,
+        },
+        "levels": levels,
+    }
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+# ---------- report ----------
+
+def _fmt(p: Dict[str, float]) -> str:
+    return f"p50={p['p50']:7.1f}  p95={p['p95']:7.1f}  p99={p['p99']:7.1f} ms"
+
+def _delta(new: float, old: float) -> str:
+    return f"{(new - old) / old * 100:+6.1f}%" if old else "   n/a"
+
+def report(result: Dict[str, Any], baseline: Dict[str, Any] | None = None) -> None:
+    cfg = result["config"]
+    print(f"commit {result['commit']}  mode={cfg['mode']}  turns/level={cfg['turns_per_level']}  "
+          f"llm_latency={cfg['llm_latency']}s  weather_delay={cfg['weather_delay']}s")
+    for c, lv in result["levels"].items():
+        turns = lv["turns"]
+        print(f"\n== concurrency {c}: {lv['throughput']:.1f} turns/s  errors={lv['errors']}  "
+              f"llm_calls/turn={lv['llm_calls'] / turns:.2f}  db_queries/turn={lv['db_queries'] / turns:.2f}  "
+              f"weather_requests/turn={lv['weather_requests'] / turns:.2f}  "
+              f"sql_templates={lv.get('template_hits', 0)}/{lv.get('template_lookups', 0)}")
+        print(f"  {'end-to-end':<22} {_fmt(lv['e2e_ms'])}")
+        for node, p in lv["nodes_ms"].items():
+            calls = lv["llm_calls_by_node"].get(node, 0)
+            print(f"  {node:<22} {_fmt(p)}  n={p['n']:<4} llm_calls={calls}")
+        old = (baseline or {}).get("levels", {}).get(c)
+        if old:
+            print(f"  vs {baseline['commit']}: throughput {_delta(lv['throughput'], old['throughput'])}  "
+                  f"e2e p50 {_delta(lv['e2e_ms']['p50'], old['e2e_ms']['p50'])}  "
+                  f"p95 {_delta(lv['e2e_ms']['p95'], old['e2e_ms']['p95'])}  "
+                  f"p99 {_delta(lv['e2e_ms']['p99'], old['e2e_ms']['p99'])}  "
+                  f"llm_calls {_delta(lv['llm_calls'], old['llm_calls'])}")
+            for node, p in lv["nodes_ms"].items():
+                if node in old["nodes_ms"]:
+                    print(f"    {node:<20} p95 {_delta(p['p95'], old['nodes_ms'][node]['p95'])}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--workload", default=str(DEFAULT_WORKLOAD))
+    ap.add_argument("--concurrency", default="1,8", type=lambda s: [int(x) for x in s.split(",")])
+    ap.add_argument("--repeat", type=int, default=2, help="passes over the workload per concurrency level")
+    ap.add_argument("--mode", choices=["async", "sync"], default="async", help="graph.ainvoke on one loop, or graph.invoke on threads")
+    ap.add_argument("--llm-latency", type=float, default=0.05, help="seconds before each fake model reply")
+    ap.add_argument("--token-delay", type=float, default=0.0)
+    ap.add_argument("--weather-delay", type=float, default=0.02)
+    ap.add_argument("--warm-caches", action="store_true", help="keep the SQL answer cache and weather TTL cache on")
+    ap.add_argument("--no-templates", action="store_true", help="disable the SQL query-template fast path")
+    ap.add_argument("--trace", action="store_true", help="run with TRACING=1 (measures the tracing overhead)")
+    ap.add_argument("--out", help="write the result as JSON (for --compare on a later commit)")
+    ap.add_argument("--compare", help="baseline JSON written by --out")
+    ap.add_argument("--verbose", action="store_true", help="show the agents' own logging")
+    args = ap.parse_args(argv)
+    result = run(args)
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+    report(result, baseline)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(result, indent=2), encoding="utf-8")
+        print(f"\nwrote {args.out}")
+
+if __name__ == "__main__":
+    main()
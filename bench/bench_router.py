@@ -0,0 +1,82 @@
+"""
+Accuracy / latency of the local intent classifier vs the old keyword router.
+
+Leave-one-out over data/intent_examples.jsonl (each example is classified by a
+model trained on all the others). The old router could not be scored on the
+questions it sent to the LLM, so those are reported as LLM calls instead.
+
+    python -m bench.bench_router
+"""
+import time
+from tools import intent_classifier as ic
+
+# routing used before the classifier (keyword list from coordinator._coordinator)
+def _keyword_router(text: str) -> str:
+    t = text.lower()
+    if any(k in t for k in ["weather", "forecast", "temperature", "rain", "晴れ", "天気", "降水"]):
+        return "weather"
+    if any(k in t for k in ["book", "novel", "poem", "quote", "author", "line", "hamlet", "raven", "詩", "小説", "台詞", "作者"]):
+        return "book"
+    if any(k in t for k in ["lego", "titanic", "happiness", "sql", "table", "count", "average", "top", "rank", "group by"]):
+        return "sql"
+    return ""
+
+def _loo(examples, key):
+    rows = [e for e in examples if e.get(key)]
+    out = []
+    for i, e in enumerate(rows):
+        rest = rows[:i] + rows[i + 1:]
+        model = ic.IntentClassifier().fit([r["text"] for r in rest], [r[key] for r in rest])
+        label, conf = model.predict(e["text"])
+        out.append((e, label, conf))
+    return out
+
+def _report(name, results, key, threshold):
+    n = len(results)
+    local = [(e, l) for e, l, c in results if c >= threshold]
+    ok_local = sum(1 for e, l in local if l == e[key])
+    ok_all = sum(1 for e, l, _ in results if l == e[key])
+    print(f"{name}: n={n} top1_acc={ok_all / n:.1%} "
+          f"resolved_locally={len(local) / n:.1%} acc_when_local={ok_local / max(1, len(local)):.1%} "
+          f"llm_calls={n - len(local)}")
+
+def main():
+    examples = ic.load_examples()
+    threshold = ic.INTENT_CONFIDENCE
+
+    # old router: keyword hit or LLM call; _classify_db always used the LLM
+    hits = [(e, _keyword_router(e["text"])) for e in examples]
+    routed = [(e, l) for e, l in hits if l]
+    ok = sum(1 for e, l in routed if l == e["agent"])
+    print(f"keyword router: n={len(hits)} resolved_locally={len(routed) / len(hits):.1%} "
+          f"acc_when_local={ok / max(1, len(routed)):.1%} llm_calls={len(hits) - len(routed)}")
+    print(f"old _classify_db: llm_calls={sum(1 for e in examples if e.get('db'))} (always)")
+
+    agent = _loo(examples, "agent")
+    db = _loo(examples, "db")
+    _report(f"classifier agent (threshold={threshold})", agent, "agent", threshold)
+    _report(f"classifier db    (threshold={threshold})", db, "db", threshold)
+
+    # calibration of INTENT_CONFIDENCE: share resolved locally / accuracy at each threshold
+    for t in (0.6, 0.65, 0.7, 0.75, 0.8):
+        cells = []
+        for key, results in (("agent", agent), ("db", db)):
+            local = [(e, l) for e, l, c in results if c >= t]
+            ok = sum(1 for e, l in local if l == e[key])
+            cells.append(f"{key} {len(local) / len(results):6.1%} local {ok / max(1, len(local)):6.1%} acc")
+        print(f"threshold={t:<5g} " + "   ".join(cells))
+
+    # latency (model trained on everything, as in the app)
+    texts = [e["text"] for e in examples]
+    ic.classify_agent(texts[0]) # train once
+    for name, fn in [("keyword router", _keyword_router), ("classify_agent", ic.classify_agent), ("classify_db", ic.classify_db)]:
+        t0 = time.perf_counter()
+        rounds = 20
+        for _ in range(rounds):
+            for t in texts:
+                fn(t)
+        per_call = (time.perf_counter() - t0) / (rounds * len(texts))
+        print(f"latency {name}: {per_call * 1e6:.1f} us/call")
+
+if __name__ == "__main__":
+    main()
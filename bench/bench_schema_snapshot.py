@@ -0,0 +1,64 @@
+"""
+Agent iterations and DB statements per SQL question with the schema snapshot in
+the prompt (SQL_SCHEMA_SNAPSHOT=1) against the baseline where the agent lists
+tables and fetches the schema itself (SQL_SCHEMA_SNAPSHOT=0).
+
+Needs a real model: the scripted fake in bench_replay never calls the schema
+tools, so it cannot show what the snapshot saves. Runs on the embedded SQLite
+files (SQL_BACKEND=sqlite) unless the environment says otherwise; snapshots are
+built once before timing, into a temp dir.
+
+    OPENAI_API_KEY=... python -m bench.bench_schema_snapshot
+    OPENAI_API_KEY=... python -m bench.bench_schema_snapshot --repeat 3
+"""
+import os, json, argparse, tempfile, statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+WORKLOAD = ROOT / "bench" / "workloads" / "replay.jsonl"
+
+def _questions():
+    with WORKLOAD.open(encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    return [(it["db"], it["question"]) for it in items if it.get("agent") == "sql" and it.get("db") in ("titanic", "happiness")]
+
+# run every question through the agent; per-run stats from sql_agent.LAST_RUN_STATS
+def _measure(sql_agent, questions, snapshot: bool, repeat: int):
+    sql_agent.USE_SCHEMA_SNAPSHOT = snapshot
+    runs = []
+    for _ in range(repeat):
+        for label, question in questions:
+            sql_agent._run_sql_agent(question, sql_agent.get_sqldb(label), label)
+            runs.append(dict(sql_agent.LAST_RUN_STATS))
+    return runs
+
+def _mean(runs, key) -> float:
+    return statistics.mean(r[key] for r in runs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the questions per mode")
+    args = parser.parse_args(argv)
+    from tools import llm_registry
+    llm_registry.load_env()
+    if not os.getenv("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY is not set: this bench needs the real SQL model")
+        return
+    os.environ.setdefault("SQL_BACKEND", "sqlite")
+    os.environ["SQL_CACHE"] = "0"
+    os.environ["SCHEMA_CACHE_DIR"] = tempfile.mkdtemp(prefix="schema-") # never reuse a snapshot from a previous run
+    from tools import sql_agent, sql_schema
+    questions = _questions()
+    for label in {label for label, _ in questions}: # snapshot queries are not part of a turn
+        sql_schema.get_snapshot(label, sql_agent.get_sqldb(label))
+    results = {mode: _measure(sql_agent, questions, mode == "snapshot", args.repeat) for mode in ("baseline", "snapshot")}
+    print(f"{len(questions)} questions x {args.repeat}")
+    for mode, runs in results.items():
+        print(f"  {mode:<9} iterations={_mean(runs, 'iterations'):5.2f}  schema_tool_calls={_mean(runs, 'schema_tool_calls'):5.2f}  "
+              f"db_statements={_mean(runs, 'db_queries'):5.2f}  per turn")
+    base, snap = results["baseline"], results["snapshot"]
+    print(f"  saved     iterations={_mean(base, 'iterations') - _mean(snap, 'iterations'):5.2f}  "
+          f"db_statements={_mean(base, 'db_queries') - _mean(snap, 'db_queries'):5.2f}  per turn")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Cold-start cost of the app, each sample in a fresh interpreter:
+  - import:  `import coordinator` (what every worker process pays before serving)
+  - page:    process start -> first page rendered by main.py (streamlit AppTest, no browser)
+  - ready:   process start -> warm-up finished (agents, LLM clients, SQL engines built)
+
+Runs the page with WARMUP=background (default) and WARMUP=sync. Offline: the
+SQL engines use the SQLite copies in data/ and no LLM call is made.
+
+    python -m bench.bench_startup
+    python -m bench.bench_startup --runs 10
+"""
+import os, sys, json, time, argparse, statistics, subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_CHILD = r"""
+import sys, json, time, threading
+t0 = time.perf_counter()
+if sys.argv[1] == "import":
+    import coordinator
+    print(json.dumps({"import": time.perf_counter() - t0}))
+else:
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file("main.py", default_timeout=120)
+    at.run()
+    page = time.perf_counter() - t0
+    for t in threading.enumerate():
+        if t.name == "warm-up":
+            t.join()
+    print(json.dumps({"page": page, "ready": time.perf_counter() - t0, "errors": len(at.exception)}))
+"""
+
+def _sample(kind: str, warmup: str) -> dict:
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "bench"), "SQL_BACKEND": "sqlite",
+           "WARMUP": warmup, "TRACING": "0", "PYTHONPATH": str(ROOT)}
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", _CHILD, kind], cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    wall = time.perf_counter() - t0
+    lines = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    if out.returncode or not lines:
+        raise RuntimeError(f"{kind} run failed:\n{out.stderr[-2000:]}")
+    return {**json.loads(lines[-1]), "wall": wall}
+
+def _fmt(values) -> str:
+    return f"median={statistics.median(values):6.2f}s  min={min(values):6.2f}s  max={max(values):6.2f}s"
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cold-start benchmark")
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args(argv)
+    imports = [_sample("import", "off") for _ in range(args.runs)]
+    print(f"import coordinator        {_fmt([s['import'] for s in imports])}")
+    print(f"  process wall            {_fmt([s['wall'] for s in imports])}")
+    for warmup in ("background", "sync"):
+        pages = [_sample("page", warmup) for _ in range(args.runs)]
+        print(f"first page  WARMUP={warmup:<10} {_fmt([s['page'] for s in pages])}  errors={sum(s['errors'] for s in pages)}")
+        print(f"ready       WARMUP={warmup:<10} {_fmt([s['ready'] for s in pages])}")
+
+if __name__ == "__main__":
+    main()
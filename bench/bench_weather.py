@@ -0,0 +1,58 @@
+"""
+get_weather against a local WeatherAPI stub: cold vs cached latency, request
+coalescing under concurrency, multi-city batches and retry behaviour.
+
+    python -m bench.bench_weather
+"""
+import os, time
+from concurrent.futures import ThreadPoolExecutor
+from bench.weather_stub import WeatherStub
+
+DELAY = 0.2 # simulated upstream latency (seconds)
+
+def main():
+    stub = WeatherStub(delay=DELAY).start()
+    os.environ["WEATHER_API_BASE"] = stub.base_url
+    os.environ.setdefault("WEATHER_API_KEY", "stub")
+    from tools import weather_client
+
+    t0 = time.perf_counter()
+    weather_client.fetch_current("London")
+    cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    weather_client.fetch_current("  london ")
+    warm = time.perf_counter() - t0
+    print(f"cold={cold * 1e3:.1f} ms  cached={warm * 1e3:.3f} ms  upstream_requests={stub.total_requests}")
+
+    cities = ["Paris", "Tokyo", "São Paulo", "New York"] * 25 # 100 concurrent lookups, 4 distinct
+    before = stub.total_requests
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        results = list(pool.map(weather_client.fetch_current, cities))
+    elapsed = time.perf_counter() - t0
+    ok = sum(1 for r in results if r["status"] == "ok")
+    print(f"{len(cities)} concurrent lookups ({len(set(cities))} cities): {elapsed * 1e3:.0f} ms  ok={ok}  "
+          f"upstream_requests={stub.total_requests - before}")
+
+    batch = ["London", "Paris", "Tokyo", "Berlin", "Madrid"]
+    weather_client.clear_cache()
+    t0 = time.perf_counter()
+    for c in batch:
+        weather_client.fetch_current(c)
+    sequential = time.perf_counter() - t0
+    weather_client.clear_cache()
+    t0 = time.perf_counter()
+    weather_client.fetch_many(batch)
+    concurrent = time.perf_counter() - t0
+    print(f"{len(batch)} cities: sequential={sequential * 1e3:.0f} ms  fetch_many={concurrent * 1e3:.0f} ms")
+
+    weather_client.clear_cache()
+    stub.fail_first = 2
+    before = stub.total_requests
+    r = weather_client.fetch_current("Berlin")
+    print(f"retry: status={r['status']} after {stub.total_requests - before} upstream attempts (2 x 503 injected)")
+    print(f"client stats: {weather_client.STATS}")
+    stub.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Offline stand-ins for the chat models used by the agents.
+
+ScriptedChatModel answers every call with respond(messages) after a fixed
+latency: time.sleep on the sync path, asyncio.sleep on the async path, so it
+behaves like a remote model that is waiting on the network. When streamed,
+text answers arrive word by word, token_delay apart, after the same latency.
+
+    fake = ScriptedChatModel(respond=lambda msgs: AIMessage(content="ok"), latency=0.3)
+    coordinator.llm = fake
+"""
+import re, json, time, asyncio
+from typing import Any, AsyncIterator, Callable, Iterator, List
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+class ScriptedChatModel(BaseChatModel):
+    respond: Callable[[List[BaseMessage]], AIMessage]
+    latency: float = 0.0
+    token_delay: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    # rough usage (one token per word) so token counters have something to count
+    @staticmethod
+    def _usage(messages: List[BaseMessage], content: str) -> dict:
+        n_in = sum(len(str(m.content).split()) for m in messages)
+        n_out = len(content.split())
+        return {"input_tokens": n_in, "output_tokens": n_out, "total_tokens": n_in + n_out}
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        self.calls += 1
+        msg = self.respond(messages)
+        if msg.usage_metadata is None:
+            msg = msg.model_copy(update={"usage_metadata": self._usage(messages, str(msg.content))})
+        return ChatResult(generations=[ChatGeneration(message=msg)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    # tool-call answers are emitted as one chunk, text answers word by word
+    def _chunks(self, messages: List[BaseMessage]) -> List[ChatGenerationChunk]:
+        self.calls += 1
+        msg = self.respond(messages)
+        if msg.tool_calls or not msg.content:
+            return [ChatGenerationChunk(message=AIMessageChunk(content=msg.content, tool_call_chunks=[
+                {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+                for i, tc in enumerate(msg.tool_calls)
+            ]))]
+        chunks = [ChatGenerationChunk(message=AIMessageChunk(content=t)) for t in re.findall(r"\S+\s*|\s+", msg.content)]
+        chunks.append(ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, msg.content))))
+        return chunks
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        for i, chunk in enumerate(self._chunks(messages)):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for i, chunk in enumerate(self._chunks(messages)):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    # tools are chosen by respond(), so binding is a no-op
+    def bind_tools(self, tools, **kwargs: Any) -> "ScriptedChatModel":
+        return self
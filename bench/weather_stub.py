@@ -0,0 +1,87 @@
+"""
+Local stand-in for WeatherAPI.com's /v1/current.json.
+
+Answers every city with deterministic conditions after an optional delay and
+counts requests per city, so the weather client can be exercised offline:
+
+    stub = WeatherStub(delay=0.2).start()
+    os.environ["WEATHER_API_BASE"] = stub.base_url   # before importing tools.weather_client
+    ...
+    stub.stop()
+
+Run directly to serve on a fixed port:  python -m bench.weather_stub 8765
+"""
+import sys, json, time, threading, zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+_CONDITIONS = ["Sunny", "Partly cloudy", "Overcast", "Light rain", "Mist", "Clear"]
+
+def conditions_for(city: str) -> dict:
+    h = zlib.crc32(city.strip().lower().encode("utf-8"))
+    return {"condition": {"text": _CONDITIONS[h % len(_CONDITIONS)]}, "temp_c": round(-5 + (h % 400) / 10, 1)}
+
+class WeatherStub:
+    def __init__(self, port: int = 0, delay: float = 0.0, fail_first: int = 0):
+        self.delay = delay
+        self.fail_first = fail_first # answer this many requests with 503 first (retry tests)
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, like the real API
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                city = parse_qs(url.query).get("q", [""])[0]
+                with stub._lock:
+                    stub.requests[city] += 1
+                    fail = stub.fail_first > 0
+                    stub.fail_first -= 1 if fail else 0
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if fail:
+                    return self._send(503, {"error": {"message": "try again"}})
+                if url.path != "/v1/current.json" or not city:
+                    return self._send(400, {"error": {"code": 1006, "message": "No matching location found."}})
+                self._send(200, {"location": {"name": city}, "current": conditions_for(city)})
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def start(self) -> "WeatherStub":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == "__main__":
+    stub = WeatherStub(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8765).start()
+    print(f"WeatherAPI stub on {stub.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -1,27 +1,46 @@
 import os
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langgraph.graph import START, END, StateGraph, MessagesState
+import re
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import List
+from langgraph.graph import START, END, StateGraph
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from tools.sql_agent import sql_graph 
-from tools.book_agent import book_graph 
-from tools.weather_agent import weather_graph
+from langchain_core.runnables import RunnableLambda
+from tools import intent_classifier, context_window, tracing, llm_registry
+from tools.context_window import ConversationState
 
-load_dotenv()
-llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0)
+llm_registry.load_env()
+# router / finalise model and the cheap model for formatting-only rewrites in finalise;
+# created on first use (benches assign a fake)
+llm = None
+format_llm = None
+
+def _llm():
+    global llm
+    if llm is None:
+        llm = llm_registry.get("gpt-4.1-mini", stream_usage=True)
+    return llm
+
+def _format_llm():
+    global format_llm
+    if format_llm is None:
+        format_llm = llm_registry.get(os.getenv("FINALISE_FORMAT_MODEL", "gpt-4.1-nano"), stream_usage=True)
+    return format_llm
+
+class CoordinatorState(ConversationState):
+    route: str | List[str] # agent(s) picked for the current turn
  
-# classifies user intent into one of: sql, book, weather
+# classifies user intent into one of: sql, book, weather ("" if not confident)
 def _coordinator(text: str) -> str:
-    t = text.lower() # normalize to lowercase to simplify matching
-    # weather keywords
-    if any(k in t for k in ["weather", "forecast", "temperature", "rain", "晴れ", "天気", "降水"]):
-        return "weather"
-    # book keywords
-    if any(k in t for k in ["book", "novel", "poem", "quote", "author", "line", "hamlet", "raven", "詩", "小説", "台詞", "作者"]):
-        return "book"
-    # db keywords 
-    if any(k in t for k in ["lego", "titanic", "happiness", "sql", "table", "count", "average", "top", "rank", "group by"]):
-        return "sql"
+    label, conf = intent_classifier.classify_agent(text) # local model, no LLM call
+    print(f"[coordinator] intent={label} confidence={conf:.2f}")
+    if conf >= intent_classifier.INTENT_CONFIDENCE:
+        tracing.event("classify", "agent", source="local", label=label, confidence=round(conf, 3))
+        return label
+    tracing.event("classify", "agent", source="llm", confidence=round(conf, 3))
     return ""
 
 ROUTER_SYS = SystemMessage(content=(
@@ -30,16 +49,70 @@ ROUTER_SYS = SystemMessage(content=(
 ))
 
 # START: node to route to the appropriate agent
-def route_node(state: MessagesState):
+def route_node(state: CoordinatorState):
     user = state["messages"][-1].content if state.get("messages") else ""
+    labels = _coordinator_multi(user) if ROUTE_MODE == "multi" else None
+    if labels:
+        return {"route": labels}
+    if labels == []: # compound question the local model cannot split
+        return {"route": _parse_routes(_llm().invoke([ROUTER_MULTI_SYS, HumanMessage(content=user)]).content)}
     hint = _coordinator(user)
     if hint:
         return {"route": hint}
-    # Use LLM to classify if no hint
-    label = llm.invoke([ROUTER_SYS, HumanMessage(content=user)]).content.strip().lower()
+    # Use LLM to classify only when the local classifier is unsure
+    label = _llm().invoke([ROUTER_SYS, HumanMessage(content=user)]).content
+    return {"route": _parse_route(label)}
+
+async def aroute_node(state: CoordinatorState):
+    user = state["messages"][-1].content if state.get("messages") else ""
+    labels = _coordinator_multi(user) if ROUTE_MODE == "multi" else None
+    if labels:
+        return {"route": labels}
+    if labels == []:
+        return {"route": _parse_routes((await _llm().ainvoke([ROUTER_MULTI_SYS, HumanMessage(content=user)])).content)}
+    hint = _coordinator(user)
+    if hint:
+        return {"route": hint}
+    label = (await _llm().ainvoke([ROUTER_SYS, HumanMessage(content=user)])).content
+    return {"route": _parse_route(label)}
+
+# 'single' = one agent per turn; 'multi' = every agent the question needs, run concurrently
+ROUTE_MODE = os.getenv("ROUTE_MODE", "single").strip().lower()
+
+ROUTER_MULTI_SYS = SystemMessage(content=(
+    "You are a strict router. List every domain the user's last message needs, from: "
+    "'book', 'weather', 'sql'. Return ONLY those words, comma-separated."
+))
+
+# agents of a compound question's clauses; [] when a clause is unclear, None for a single clause
+def _coordinator_multi(text: str) -> List[str] | None:
+    clauses = intent_classifier.classify_agent_clauses(text)
+    if len(clauses) < 2:
+        return None
+    labels = []
+    for _clause, label, conf in clauses:
+        if conf < intent_classifier.INTENT_CONFIDENCE:
+            tracing.event("classify", "agents", source="llm", clauses=len(clauses))
+            return []
+        if label not in labels:
+            labels.append(label)
+    print(f"[coordinator] intents={labels} clauses={len(clauses)}")
+    tracing.event("classify", "agents", source="local", labels=",".join(labels))
+    return labels
+
+def _parse_routes(reply: str) -> List[str]:
+    labels = []
+    for word in re.split(r"[\s,]+", reply.lower()):
+        word = word.strip("'\".")
+        if word in {"book", "weather", "sql"} and word not in labels:
+            labels.append(word)
+    return labels or ["sql"]
+
+def _parse_route(label: str) -> str:
+    label = label.strip().lower()
     if label not in {"book", "weather", "sql"}:
         label = "sql"  # default to sql if unsure
-    return {"route": label}
+    return label
 
 FINAL_SYS = SystemMessage(content=(
     "You are an expert assistant. "
@@ -48,11 +121,11 @@ FINAL_SYS = SystemMessage(content=(
     "If you do not have enough information to answer, say so honestly."
 )) 
 
-# END: Finalise node: collate tool calls and produce final answer
-def finalise(state: MessagesState):
+# drop tool results whose tool call is not in the history
+def _final_messages(state: CoordinatorState) -> list:
     filtered_msgs = [] 
     tool_call_ids = set() # collect tool call IDs
-    for msg in state["messages"]: # for each message
+    for msg in context_window.window(state): # summary + recent messages
         if hasattr(msg, "tool_calls") and msg.tool_calls: # if it has tool calls
             for tc in msg.tool_calls: # for each tool call
                 tool_call_ids.add(tc["id"]) # add its ID to the set
@@ -61,20 +134,228 @@ def finalise(state: MessagesState):
         filtered_msgs.append(msg) # keep the message
     if tool_call_ids: # if there are any remaining tool call IDs
         filtered_msgs = [m for m in filtered_msgs if not (hasattr(m, "tool_call_id") and m.tool_call_id in tool_call_ids)] # remove messages with those IDs
-    resp = llm.invoke([FINAL_SYS] + filtered_msgs) # invoke LLM with system message and filtered messages
-    return {"messages": [AIMessage(content=resp.content)]} # return final answer message
+    return [FINAL_SYS] + filtered_msgs
+
+# how finalise produces the answer:
+#   full        - re-synthesise from the whole history (one full-history LLM call)
+#   format      - cheap formatting-only rewrite of the last exchange
+#   passthrough - return the agent's own answer unchanged (format if it only returned tool output)
+#   auto        - passthrough / format for single-agent turns, full when several tool results need merging
+FINALISE_POLICY = os.getenv("FINALISE_POLICY", "full").strip().lower()
+
+FORMAT_SYS = SystemMessage(content=(
+    "Rewrite the agent result below as a short, well-formatted answer to the question. "
+    "Do not add facts that are not in the result. Keep numbers, names and quotes exactly as given."
+))
+
+# agent replies that need the full model to explain to the user
+_NO_ANSWER_MARKERS = ("NOT_RELEVANT", "NO_DB_ANSWER", "SQL agent error:", "I didn’t receive a question.", "agent timed out")
+
+# per-mode counters: turns, LLM calls, seconds, tokens
+FINALISE_STATS = {}
+_STATS_LOCK = threading.Lock()
+
+def _record_finalise(mode: str, seconds: float, resp=None) -> None:
+    usage = getattr(resp, "usage_metadata", None) or {}
+    with _STATS_LOCK:
+        st = FINALISE_STATS.setdefault(mode, {"turns": 0, "llm_calls": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0})
+        st["turns"] += 1
+        st["llm_calls"] += resp is not None
+        st["seconds"] += seconds
+        st["input_tokens"] += usage.get("input_tokens", 0)
+        st["output_tokens"] += usage.get("output_tokens", 0)
+    print(f"[coordinator] finalise mode={mode} {seconds * 1e3:.0f} ms tokens={usage.get('total_tokens', 0)}")
+
+# messages produced in this turn (after the last user message)
+def _turn_messages(messages: list) -> list:
+    for i in range(len(messages) - 1, -1, -1):
+        if getattr(messages[i], "type", None) == "human":
+            return messages[i + 1:]
+    return list(messages)
+
+# pick 'full', 'format' or 'passthrough' for this turn
+def _finalise_mode(state: CoordinatorState) -> str:
+    if FINALISE_POLICY not in {"format", "passthrough", "auto"}:
+        return "full"
+    turn = _turn_messages(state["messages"])
+    if not turn:
+        return "full"
+    last = turn[-1]
+    tool_results = [m for m in turn if getattr(m, "type", None) == "tool"]
+    if isinstance(state.get("route"), list) and len(state["route"]) > 1: # several agents answered: merge them
+        return "full"
+    answered = getattr(last, "type", None) == "ai" and not getattr(last, "tool_calls", None)
+    content = last.content if isinstance(last.content, str) else ""
+    if not content.strip() or any(marker in content for marker in _NO_ANSWER_MARKERS):
+        return "full"
+    if FINALISE_POLICY == "format":
+        return "format"
+    if FINALISE_POLICY == "auto" and len(tool_results) > 1:
+        return "full"
+    return "passthrough" if answered else "format"
+
+# question + the agent's result only, for the formatting rewrite
+def _format_messages(state: CoordinatorState) -> list:
+    messages = state["messages"]
+    turn = _turn_messages(messages)
+    question = messages[-len(turn) - 1].content if len(turn) < len(messages) else ""
+    results = [m.content for m in turn if getattr(m, "type", None) == "tool"]
+    last = turn[-1]
+    if getattr(last, "type", None) == "ai" and not getattr(last, "tool_calls", None): # the agent's own answer
+        results.append(last.content)
+    result = "\n\n".join(r for r in results if isinstance(r, str))
+    return [FORMAT_SYS, HumanMessage(content=f"Question:\n{question}\n\nAgent result:\n{result}")]
+
+# END: Finalise node: collate tool calls and produce final answer
+def finalise(state: CoordinatorState):
+    mode, started = _finalise_mode(state), time.perf_counter()
+    if mode == "passthrough":
+        content, resp = state["messages"][-1].content, None
+    elif mode == "format":
+        resp = _format_llm().invoke(context_window.track("finalise.format", _format_messages(state)))
+        content = resp.content
+    else:
+        resp = _llm().invoke(context_window.track("finalise", _final_messages(state))) # invoke LLM with system message and filtered messages
+        content = resp.content
+    _record_finalise(mode, time.perf_counter() - started, resp)
+    return {"messages": [AIMessage(content=content)]} # return final answer message
+
+async def afinalise(state: CoordinatorState):
+    mode, started = _finalise_mode(state), time.perf_counter()
+    if mode == "passthrough":
+        content, resp = state["messages"][-1].content, None
+    elif mode == "format":
+        resp = await _format_llm().ainvoke(context_window.track("finalise.format", _format_messages(state)))
+        content = resp.content
+    else:
+        resp = await _llm().ainvoke(context_window.track("finalise", _final_messages(state)))
+        content = resp.content
+    _record_finalise(mode, time.perf_counter() - started, resp)
+    return {"messages": [AIMessage(content=content)]}
+
+# seconds a branch of a multi-agent turn may run before finalise goes on without the
+# others' answers (0 = no limit); a single-agent turn always waits for its agent
+BRANCH_TIMEOUT = float(os.getenv("BRANCH_TIMEOUT", "60"))
+# runs the sync branches of a fan-out so they can be abandoned on timeout
+_BRANCH_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("BRANCH_WORKERS", "16")), thread_name_prefix="branch")
+
+# messages the branch added (subgraphs return the whole history)
+def _new_messages(state: CoordinatorState, out) -> list:
+    seen = {m.id for m in state["messages"]}
+    return [m for m in out.get("messages", []) if m.id is None or m.id not in seen]
+
+# several agents answer this turn
+def _fan_out(state: CoordinatorState) -> bool:
+    route = state.get("route")
+    return isinstance(route, list) and len(route) > 1
+
+def _timed_out(name: str) -> dict:
+    print(f"[coordinator] {name} branch timed out after {BRANCH_TIMEOUT:g}s")
+    tracing.event("branch", name, result="timeout")
+    return {"messages": [AIMessage(content=f"The {name} agent timed out after {BRANCH_TIMEOUT:g}s without an answer.")]}
+
+# Agent (sub)graphs are imported and compiled on first use, so importing the
+# coordinator (and rendering the first page) does not wait for the SQL toolkit,
+# the agents' dependencies or their LLM clients. warm_up() builds them ahead of time.
+def _load_agent(name: str):
+    if name == "sql":
+        from tools.sql_agent import sql_graph, asql_graph
+        return RunnableLambda(sql_graph, afunc=asql_graph)
+    if name == "book":
+        from tools.book_agent import book_graph
+        return book_graph
+    from tools.weather_agent import weather_graph
+    return weather_graph
+
+_AGENTS = {}
+_AGENTS_LOCK = threading.Lock()
+
+def get_agent(name: str):
+    agent = _AGENTS.get(name)
+    if agent is None:
+        with _AGENTS_LOCK:
+            agent = _AGENTS.get(name)
+            if agent is None:
+                started = time.perf_counter()
+                agent = _AGENTS[name] = _load_agent(name)
+                print(f"[coordinator] built {name} agent in {time.perf_counter() - started:.2f}s")
+    return agent
+
+# Build every agent, the LLM clients, the intent models and the SQL engines
+def warm_up() -> None:
+    started = time.perf_counter()
+    for name in ("sql", "book", "weather"):
+        get_agent(name)
+    _llm(), _format_llm(), context_window._summary_llm()
+    intent_classifier.classify_agent("warm up")
+    from tools import sql_agent
+    sql_agent.warm_up()
+    print(f"[coordinator] warm-up done in {time.perf_counter() - started:.2f}s")
+
+# 'background' = warm up on a daemon thread, 'sync' = before returning, 'off' = on first use only
+WARMUP = os.getenv("WARMUP", "background").strip().lower()
+
+def start_warm_up(mode: str = WARMUP) -> threading.Thread | None:
+    if mode == "off":
+        return None
+    if mode == "sync":
+        warm_up()
+        return None
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+# Wrap an agent (sub)graph as a branch node: only its new messages are returned, so
+# branches running in the same step never write the same state key. When the turn fans
+# out to several agents, a branch that exceeds BRANCH_TIMEOUT is replaced by a timeout
+# note and its SQL statements are cancelled; a timed-out async branch is cancelled as a
+# whole, a sync one is left to finish its remaining (LLM) work in the background.
+def _branch(name: str):
+    def run(state: CoordinatorState, config):
+        if BRANCH_TIMEOUT <= 0 or not _fan_out(state):
+            return {"messages": _new_messages(state, get_agent(name).invoke(state, config))}
+        from tools import sql_governor # loaded with the SQL agent anyway
+        scope = sql_governor.CancelScope()
+
+        def job():
+            sql_governor.bind(scope) # statements of this branch stop when it is abandoned
+            return get_agent(name).invoke(state, config)
+
+        future = _BRANCH_POOL.submit(contextvars.copy_context().run, job)
+        try:
+            return {"messages": _new_messages(state, future.result(timeout=BRANCH_TIMEOUT))}
+        except FuturesTimeout:
+            scope.cancel()
+            return _timed_out(name)
+
+    async def arun(state: CoordinatorState, config):
+        agent = _AGENTS.get(name) or await asyncio.to_thread(get_agent, name) # keep imports off the event loop
+        if BRANCH_TIMEOUT <= 0 or not _fan_out(state):
+            return {"messages": _new_messages(state, await agent.ainvoke(state, config))}
+        try:
+            out = await asyncio.wait_for(agent.ainvoke(state, config), BRANCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            return _timed_out(name)
+        return {"messages": _new_messages(state, out)}
+
+    return RunnableLambda(run, afunc=arun, name=name)
 
 # Build the state graph
-builder = StateGraph(MessagesState)
-builder.add_node("route", route_node)
-builder.add_node("sql", sql_graph)
-builder.add_node("book", book_graph)
-builder.add_node("weather", weather_graph)
-builder.add_node("finalise", finalise)
-builder.add_node("end", finalise)
+builder = StateGraph(CoordinatorState)
+# each node has a sync and an async implementation: graph.invoke/stream use the
+# first, graph.ainvoke/astream the second
+builder.add_node("context", RunnableLambda(context_window.update_context, afunc=context_window.aupdate_context))
+builder.add_node("route", RunnableLambda(route_node, afunc=aroute_node))
+builder.add_node("sql", _branch("sql"))
+builder.add_node("book", _branch("book"))
+builder.add_node("weather", _branch("weather"))
+builder.add_node("finalise", RunnableLambda(finalise, afunc=afinalise))
+builder.add_node("end", RunnableLambda(finalise, afunc=afinalise))
 
-builder.add_edge(START, "route")
+builder.add_edge(START, "context") # roll the history window / summary once per turn
+builder.add_edge("context", "route")
 
+# one agent, or a list of agents that run concurrently; finalise waits for all of them
 def _on_route(state):
     return state.get("route", "sql")
 
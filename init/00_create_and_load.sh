@@ -5,6 +5,27 @@ psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "postgres" <<-EOSQL
   CREATE DATABASE happiness;
 EOSQL
 
-psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "lego"      -f /docker-entrypoint-initdb.d/lego.sql
-psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "titanic"   -f /docker-entrypoint-initdb.d/titanic.sql
-psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "happiness" -f /docker-entrypoint-initdb.d/happiness_index.sql
+# Load one database in a single transaction: from init/load/<db>/load.sql (COPY data,
+# indexes built after the load; generated by `python -m tools.pg_bootstrap`), or from
+# its dump in init/dumps/ if that has not been converted yet.
+load_db() {
+  local db=$1 dump=$2 dir=/docker-entrypoint-initdb.d/load/$1 start=$SECONDS
+  if [ -f "$dir/load.sql" ]; then
+    (cd "$dir" && psql -q -v ON_ERROR_STOP=1 --single-transaction --username "$POSTGRES_USER" --dbname "$db" -f load.sql)
+  elif [ -f "/docker-entrypoint-initdb.d/dumps/$dump" ]; then
+    psql -q -v ON_ERROR_STOP=1 --single-transaction --username "$POSTGRES_USER" --dbname "$db" -f "/docker-entrypoint-initdb.d/dumps/$dump"
+  else
+    echo "[init] no data for $db (init/load/$db/ or init/dumps/$dump); leaving it empty"
+    return 0
+  fi
+  echo "[init] loaded $db in $((SECONDS - start))s"
+}
+
+# the three databases load in parallel
+pids=()
+load_db lego lego.sql & pids+=($!)
+load_db titanic titanic.sql & pids+=($!)
+load_db happiness happiness_index.sql & pids+=($!)
+for pid in "${pids[@]}"; do
+  wait "$pid"
+done
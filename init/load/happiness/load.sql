@@ -0,0 +1,26 @@
+-- generated by `python -m tools.pg_bootstrap` from init/dumps/happiness_index.sql; do not edit
+SET synchronous_commit = off;
+SET maintenance_work_mem = '256MB';
+
+DROP TABLE IF EXISTS happiness_2019;
+CREATE TABLE happiness_2019 (
+    overall_rank INT PRIMARY KEY,
+    country_or_region TEXT NOT NULL,
+    score NUMERIC(5,2) NOT NULL,
+    gdp_per_capita NUMERIC(5,2),
+    social_support NUMERIC(5,2),
+    healthy_life_expectancy NUMERIC(5,2),
+    freedom_to_make_life_choices NUMERIC(5,2),
+    generosity NUMERIC(5,2),
+    perceptions_of_corruption NUMERIC(5,2)
+);
+
+\copy "happiness_2019" (overall_rank, country_or_region, score, gdp_per_capita, social_support, healthy_life_expectancy, freedom_to_make_life_choices, generosity, perceptions_of_corruption) FROM 'happiness_2019.tsv' WITH (FREEZE)
+
+CREATE UNIQUE INDEX IF NOT EXISTS "2019_pkey" ON "happiness_2019" (overall_rank);
+
+-- pg_dump output empties search_path
+RESET search_path;
+CREATE INDEX IF NOT EXISTS agent_happiness_2019_country_or_region ON happiness_2019 (country_or_region);
+CREATE INDEX IF NOT EXISTS agent_happiness_2019_score ON happiness_2019 (score DESC);
+ANALYZE;
@@ -0,0 +1,51 @@
+-- generated by `python -m tools.pg_bootstrap` from init/dumps/titanic.sql; do not edit
+SET synchronous_commit = off;
+SET maintenance_work_mem = '256MB';
+
+SET statement_timeout = 0;
+SET lock_timeout = 0;
+SET idle_in_transaction_session_timeout = 0;
+SET client_encoding = 'UTF8';
+SET standard_conforming_strings = on;
+SELECT pg_catalog.set_config('search_path', '', false);
+SET check_function_bodies = false;
+SET xmloption = content;
+SET client_min_messages = warning;
+SET row_security = off;
+SET default_table_access_method = heap;
+CREATE TABLE public.passenger (
+    passengerid integer NOT NULL,
+    survived double precision,
+    pclass integer,
+    name text,
+    sex text,
+    age double precision,
+    sibsp integer,
+    parch integer,
+    ticket text,
+    fare double precision,
+    cabin text,
+    embarked text,
+    wikiid double precision,
+    name_wiki text,
+    age_wiki double precision,
+    hometown text,
+    boarded text,
+    destination text,
+    lifeboat text,
+    body text,
+    class integer
+);
+
+\copy public.passenger (passengerid, survived, pclass, name, sex, age, sibsp, parch, ticket, fare, cabin, embarked, wikiid, name_wiki, age_wiki, hometown, boarded, destination, lifeboat, body, class) FROM 'passenger.tsv' WITH (FREEZE)
+
+ALTER TABLE ONLY public.passenger
+    ADD CONSTRAINT passenger_pkey PRIMARY KEY (passengerid);
+
+-- pg_dump output empties search_path
+RESET search_path;
+CREATE INDEX IF NOT EXISTS agent_passenger_pclass_sex ON passenger (pclass, sex);
+CREATE INDEX IF NOT EXISTS agent_passenger_survived ON passenger (survived);
+DROP MATERIALIZED VIEW IF EXISTS tmpl_titanic_survival;
+CREATE MATERIALIZED VIEW tmpl_titanic_survival AS SELECT pclass, sex, COUNT(*) AS passengers, COUNT(survived) AS known, SUM(CASE WHEN survived = 1 THEN 1 ELSE 0 END) AS survivors, COUNT(age) AS aged, SUM(age) AS age_total FROM passenger GROUP BY pclass, sex;
+ANALYZE;
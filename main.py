@@ -1,10 +1,25 @@
 import os
 import json
+import time
 import streamlit as st
-from dotenv import load_dotenv
-from coordinator import graph  
+from langchain_core.messages import AIMessageChunk
+from coordinator import graph, start_warm_up # reads .env (tools/llm_registry.py)
+from tools import async_runtime, tracing
 
-load_dotenv()
+# build the agents, LLM clients and DB engines once per process (on a background
+# thread by default, so the first page renders without waiting; see WARMUP)
+@st.cache_resource(show_spinner=False)
+def _warm_up():
+    return start_warm_up()
+
+_warm_up()
+
+# Prometheus endpoint for the whole process (only when TRACING=1)
+@st.cache_resource(show_spinner=False)
+def _metrics_server():
+    return tracing.start_metrics_server()
+
+_metrics_server()
 
 # Title and description
 st.title("Multi-Agent AI Assistant")
@@ -28,50 +43,112 @@ if "messages" not in st.session_state:
 if "tool_calls" not in st.session_state:
     st.session_state.tool_calls = {}
 
+if "timings" not in st.session_state:
+    st.session_state.timings = {}
+
+# rolling summary of turns that left the prompt window (see tools/context_window.py)
+if "context" not in st.session_state:
+    st.session_state.context = {"summary": "", "summarised": 0}
+
+# the coordinator node whose tokens are the user-facing answer
+ANSWER_NODE = "finalise"
+
+# per-node timing of a traced turn (TRACING=1)
+def _show_timing(rows, total):
+    lines = [f"**Timing:** {total:.2f}s total\n", "| node | time | LLM | SQL | HTTP | cache hits |", "|---|---|---|---|---|---|"]
+    for r in rows:
+        lines.append(
+            f"| `{r['node']}` | {r['seconds']:.2f}s "
+            f"| {r['llm_calls']} calls, {r['llm_seconds']:.2f}s, {r['tokens']} tok "
+            f"| {r['sql']} stmts, {r['sql_seconds'] * 1e3:.0f} ms, {r['rows']} rows "
+            f"| {r['http']} req, {r['http_seconds'] * 1e3:.0f} ms | {r['cache_hits']} |"
+        )
+    st.info("\n".join(lines))
+
+def _show_tool(t):
+    st.info(
+        f"**Tool Executed:** `{t.get('name','')}`\n\n"
+        f"**Input:**\n```json\n{t.get('args', {})}\n```\n"
+        f"**Output:**\n```json\n{t.get('result', {})}\n```"
+    )
+
 for i, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
+        for t in st.session_state.tool_calls.get(i, []):
+            _show_tool(t)
         st.markdown(message["content"])
-        if i in st.session_state.tool_calls:
-            t = st.session_state.tool_calls[i]
-            st.info(
-                f"**Tool Executed:** `{t.get('name','')}`\n\n"
-                f"**Input:**\n```json\n{t.get('args', {})}\n```\n"
-                f"**Output:**\n```json\n{t.get('result', {})}\n```"
-            )
+        if i in st.session_state.timings:
+            _show_timing(*st.session_state.timings[i])
 
 if prompt := st.chat_input("Ask something?"):
     # Display user message immediately
     with st.chat_message("user"):
         st.markdown(prompt)
     st.session_state.messages.append({"role": "user", "content": prompt})
-    steps = graph.stream({"messages": st.session_state["messages"]}, stream_mode="values")
-    final_reply = None
-    tool_info_for_this_turn = None
-    for step in steps:
-        msgs = step.get("messages", [])
-        if not msgs:
-            continue
-        last = msgs[-1]
-        mtype = getattr(last, "type", None)
-        if mtype == "tool":
-            tool_info_for_this_turn = {
-                "name": getattr(last, "name", ""),
-                "args": getattr(last, "input", {}),
-                "result": getattr(last, "content", {}),
-            }
-        if mtype == "ai":
-            final_reply = last.content
-    if final_reply is None:
-        final_reply = "Done."
-    st.session_state["messages"].append({"role": "assistant", "content": final_reply})
+    started = time.perf_counter()
+    trace = tracing.start_turn(prompt) # None unless TRACING=1
+    # run the turn on the shared event loop so concurrent sessions don't each hold a thread while waiting.
+    # "messages" yields LLM tokens as they arrive, "updates" each node's output (incl. tools inside subgraphs)
+    steps = async_runtime.iterate(tracing.bind(trace, graph.astream(
+        {"messages": st.session_state["messages"], **st.session_state["context"]},
+        config={"callbacks": tracing.callbacks(trace)},
+        stream_mode=["messages", "updates"],
+        subgraphs=True,
+    )))
+    final_reply = ""
+    ttft = None
+    tool_args = {} # tool_call_id -> args, from the agent message that requested the call
+    tools_this_turn = []
+    shown = set()
     with st.chat_message("assistant"):
-        st.markdown(final_reply)
-        if tool_info_for_this_turn:
-            st.info(
-                f"**Tool Executed:** `{tool_info_for_this_turn.get('name','')}`\n\n"
-                f"**Input:**\n```json\n{tool_info_for_this_turn.get('args', {})}\n```\n"
-                f"**Output:**\n```json\n{tool_info_for_this_turn.get('result', {})}\n```"
-            )
-    if tool_info_for_this_turn:
+        tool_area = st.container()
+        answer = st.empty()
+        for namespace, mode, data in steps:
+            if mode == "messages":
+                chunk, meta = data
+                # only token chunks: the node's returned message is emitted again as a whole
+                if meta.get("langgraph_node") != ANSWER_NODE or not isinstance(chunk, AIMessageChunk):
+                    continue
+                if not isinstance(chunk.content, str) or not chunk.content:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                final_reply += chunk.content
+                answer.markdown(final_reply + "▌")
+                continue
+            for node, update in (data or {}).items():
+                if node == "context" and not namespace and update: # the window rolled over
+                    st.session_state["context"] = update
+                msgs = update.get("messages", []) if isinstance(update, dict) else []
+                for msg in msgs:
+                    for tc in getattr(msg, "tool_calls", None) or []:
+                        tool_args[tc["id"]] = tc["args"]
+                    if getattr(msg, "type", None) == "tool": # show each tool as soon as it finishes
+                        if msg.tool_call_id in shown: # repeated in the parent graph's update
+                            continue
+                        shown.add(msg.tool_call_id)
+                        t = {
+                            "name": getattr(msg, "name", ""),
+                            "args": tool_args.get(msg.tool_call_id, {}),
+                            "result": getattr(msg, "content", {}),
+                        }
+                        tools_this_turn.append(t)
+                        with tool_area:
+                            _show_tool(t)
+                    elif node == ANSWER_NODE and not final_reply: # model did not stream
+                        final_reply = msg.content
+        final_reply = final_reply or "Done."
+        answer.markdown(final_reply)
+        if trace is not None:
+            trace.finish()
+            timing = (trace.breakdown(), trace.seconds)
+            _show_timing(*timing)
+    total = time.perf_counter() - started
+    ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+    print(f"[main] turn ttft={ttft_text} total={total:.2f}s tools={len(tools_this_turn)}")
+    st.session_state["messages"].append({"role": "assistant", "content": final_reply})
+    if trace is not None:
+        st.session_state["timings"][len(st.session_state["messages"]) - 1] = timing
+    if tools_this_turn:
         idx = len(st.session_state["messages"]) - 1
-        st.session_state["tool_calls"][idx] = tool_info_for_this_turn
\ No newline at end of file
+        st.session_state["tool_calls"][idx] = tools_this_turn
@@ -0,0 +1,71 @@
+"""Record bodies come from the indexed version of books.json, or a rewrite is detected."""
+import os, json
+import pytest
+from tools import book_agent, book_corpus, book_index
+
+OLD = [{"title": "The Raven", "author": "Edgar Allan Poe", "lines": ["Once upon a midnight dreary"]},
+       {"title": "Ulysses", "author": "James Joyce", "text": "Stately, plump Buck Mulligan"}]
+NEW = [{"title": "Emma", "author": "Jane Austen", "text": "Emma Woodhouse, handsome, clever, and rich"}]
+
+def _write(path, records, mtime_ns=None):
+    with path.open("w", encoding="utf-8") as f: # truncates the same inode, like `cp`
+        json.dump(records, f)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def _corpus(path):
+    corpus = book_corpus.BookCorpus.build(path)
+    corpus.signature = book_index.file_signature(path)
+    return corpus
+
+def test_in_place_rewrite_is_detected(tmp_path):
+    path = tmp_path / "books.json"
+    _write(path, OLD, 1_000_000_000)
+    corpus = _corpus(path)
+    assert corpus.body(1)["author"] == "James Joyce"
+    _write(path, NEW, 2_000_000_000) # shorter: the old spans run past the end
+    with pytest.raises(book_corpus.CorpusChanged):
+        corpus.body(1)
+    corpus.close()
+
+def test_replaced_file_keeps_the_mapped_version(tmp_path):
+    path = tmp_path / "books.json"
+    _write(path, OLD, 1_000_000_000)
+    corpus = _corpus(path)
+    assert corpus.body(0)["title"] == "The Raven" # maps the file
+    fresh = tmp_path / "books.json.new"
+    _write(fresh, NEW, 2_000_000_000)
+    fresh.replace(path) # atomic rename: the mapped inode is untouched
+    assert corpus.body(1)["title"] == "Ulysses"
+    corpus.close()
+
+def test_file_changed_before_first_map(tmp_path):
+    path = tmp_path / "books.json"
+    _write(path, OLD, 1_000_000_000)
+    corpus = _corpus(path)
+    _write(path, NEW, 2_000_000_000)
+    with pytest.raises(book_corpus.CorpusChanged):
+        corpus.body(0)
+    corpus.close()
+
+def test_search_reloads_after_a_rewrite_mid_search(tmp_path, monkeypatch):
+    path = tmp_path / "books.json"
+    _write(path, OLD, 1_000_000_000)
+    monkeypatch.setattr(book_agent, "BOOKS_PATH", path)
+    monkeypatch.setattr(book_agent, "INDEX_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(book_agent, "_BOOKS_CACHE", None)
+    monkeypatch.setattr(book_agent, "_INDEX_CACHE", None)
+    search = book_agent._search_books
+    calls = []
+
+    def rewrite_after_search(query, books, index, k=5):
+        hits = search(query, books, index, k)
+        if not calls: # the first search runs on the old version, then the file changes
+            _write(path, OLD[1:], 2_000_000_000)
+        calls.append(query)
+        return hits
+    monkeypatch.setattr(book_agent, "_search_books", rewrite_after_search)
+    out = book_agent.book_search.invoke({"query": "Ulysses"})
+    assert len(calls) == 2
+    assert "Stately, plump Buck Mulligan" in out
+    book_agent._BOOKS_CACHE.close()
@@ -0,0 +1,42 @@
+"""Pruned BM25 search returns the same top k as scoring every posting."""
+import heapq, random
+import pytest
+from tools import book_index
+
+WEIGHTS = {"title": 5.0, "author": 4.0, "body": 2.0}
+COMMON = ["the", "and", "of", "a"]
+
+def _corpus(n: int, seed: int):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(300)]
+    docs = []
+    for _ in range(n):
+        body = rng.choices(COMMON, k=rng.randint(0, 12)) + rng.choices(vocab, k=rng.randint(1, 30))
+        docs.append({"title": rng.choices(vocab + COMMON, k=rng.randint(1, 4)),
+                     "author": rng.choices(vocab, k=2), "body": body})
+    return book_index.BookIndex.build(docs, WEIGHTS), vocab, rng
+
+def _exhaustive(index, terms, k):
+    scores = {}
+    for f in index.field_weights:
+        for t in set(terms):
+            index._accumulate(f, t, scores)
+    return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pruned_search_is_exact(seed):
+    index, vocab, rng = _corpus(600, seed)
+    for _ in range(200):
+        terms = rng.sample(COMMON, rng.randint(1, 3)) + rng.sample(vocab, rng.randint(0, 3))
+        k = rng.choice([1, 5, 10])
+        got = index.search(terms, k)
+        full = dict(_exhaustive(index, terms, index.n_docs))
+        want = heapq.nlargest(k, full.values())
+        # same scores in the same order (ties may pick different docs), each the doc's full score
+        assert [s for _, s in got] == pytest.approx(want), terms
+        assert all(s == pytest.approx(full[d]) for d, s in got)
+
+def test_only_common_terms_and_empty_index():
+    index, _, _ = _corpus(200, 7)
+    assert [s for _, s in index.search(["the", "of"], 5)] == pytest.approx([s for _, s in _exhaustive(index, ["the", "of"], 5)])
+    assert book_index.BookIndex(WEIGHTS).search(["the"], 5) == []
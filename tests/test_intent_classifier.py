@@ -0,0 +1,36 @@
+"""Local intent routing: confident answers are right, unfamiliar text goes to the LLM."""
+from tools import intent_classifier as ic
+
+def test_routes_known_phrasings():
+    assert ic.classify_agent("What's the weather in Kyoto tomorrow?")[0] == "weather"
+    assert ic.classify_agent("Who wrote The Raven?")[0] == "book"
+    assert ic.classify_agent("How many LEGO sets were released in 2001?")[0] == "sql"
+    assert ic.classify_db("How many passengers survived the Titanic?")[0] == "titanic"
+    assert ic.classify_db("Which country is the happiest?")[0] == "happiness"
+
+def test_words_are_not_matched_inside_other_words():
+    # the old keyword router sent these to book ("line"), weather ("rain") and sql ("top")
+    assert ic.classify_agent("Read me the headline")[1] < ic.INTENT_CONFIDENCE
+    assert ic.classify_agent("How many people live in Bahrain?")[0] == "sql"
+    assert ic.classify_agent("Stop")[1] < ic.INTENT_CONFIDENCE
+    assert ic.classify_agent("Count the lines in Ulysses")[0] == "book"
+
+def test_unseen_text_is_not_confident():
+    assert ic.classify_agent("zqxv blorft")[1] < ic.INTENT_CONFIDENCE
+    assert ic.classify_agent("")[1] == 0.0
+
+def test_threshold_is_exact_on_held_out_examples():
+    # leave-one-out over the training data: everything resolved locally is right
+    examples = ic.load_examples()
+    for key in ("agent", "db"):
+        rows = [e for e in examples if e.get(key)]
+        local = wrong = 0
+        for i, e in enumerate(rows):
+            rest = rows[:i] + rows[i + 1:]
+            model = ic.IntentClassifier().fit([r["text"] for r in rest], [r[key] for r in rest])
+            label, conf = model.predict(e["text"])
+            if conf >= ic.INTENT_CONFIDENCE:
+                local += 1
+                wrong += label != e[key]
+        assert wrong == 0, key
+        assert local / len(rows) >= 0.6, key # more than the keyword router resolved
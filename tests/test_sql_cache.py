@@ -0,0 +1,60 @@
+"""The question cache: keyed per DB, expires, survives a restart, and never keeps failures."""
+import threading
+from tools import sql_agent, sql_cache
+
+def test_same_question_to_another_db_misses():
+    cache = sql_cache.QueryCache()
+    cache.put("How many rows?", "titanic", "SELECT COUNT(*) FROM passenger", "[(1309,)]", "1309")
+    assert cache.get("how many rows", "titanic")["answer"] == "1309"
+    assert cache.get("How many rows?", "lego") is None
+    cache.put("How many rows?", "lego", "SELECT COUNT(*) FROM lego_sets", "[(11673,)]", "11673")
+    assert cache.get("How many rows?", "titanic")["answer"] == "1309"
+    assert cache.get("How many rows?", "lego")["answer"] == "11673"
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sql_cache.time, "time", lambda: now[0])
+    cache = sql_cache.QueryCache(ttl=60)
+    cache.put("q", "lego", "SELECT 1", "[(1,)]", "1")
+    now[0] += 59
+    assert cache.get("q", "lego") is not None
+    now[0] += 2
+    assert cache.get("q", "lego") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 0}
+
+def test_disk_round_trip(tmp_path, monkeypatch):
+    path = str(tmp_path / "sql_cache.db")
+    sql_cache.QueryCache(path=path).put("Top 3 themes?", "lego", "SELECT ...", "[('Star Wars', 2)]", "Star Wars")
+    restarted = sql_cache.QueryCache(path=path) # a new process: empty memory, same file
+    entry = restarted.get("top 3 themes", "lego")
+    assert entry["answer"] == "Star Wars" and entry["sql"] == "SELECT ..."
+    assert restarted.get("top 3 themes", "titanic") is None
+    restarted.invalidate("top 3 themes", "lego")
+    assert sql_cache.QueryCache(path=path).get("top 3 themes", "lego") is None
+    # expired on disk too
+    now = [0.0]
+    monkeypatch.setattr(sql_cache.time, "time", lambda: now[0])
+    sql_cache.QueryCache(path=path, ttl=10).put("q", "lego", "SELECT 1", "[(1,)]", "1")
+    now[0] = 11.0
+    assert sql_cache.QueryCache(path=path, ttl=10).get("q", "lego") is None
+
+def test_counters_are_exact_under_threads():
+    cache = sql_cache.QueryCache()
+    cache.put("q", "lego", "SELECT 1", "[(1,)]", "1")
+
+    def one():
+        for i in range(500):
+            cache.get("q" if i % 2 else "other", "lego")
+    threads = [threading.Thread(target=one) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 2000
+
+def test_failed_queries_are_not_cacheable():
+    assert sql_agent._cacheable("1309 passengers.", "SELECT COUNT(*) FROM passenger", "[(1309,)]")
+    assert not sql_agent._cacheable("There is no such table.", "SELECT * FROM nope", "Error: (sqlite3.OperationalError) no such table: nope")
+    assert not sql_agent._cacheable("1309", "", "") # answered without running a query
+    assert not sql_agent._cacheable("No result returned from database.", "SELECT 1", "")
+    assert not sql_agent._cacheable("NO_DB_ANSWER", "SELECT 1", "[(1,)]")
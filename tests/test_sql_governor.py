@@ -0,0 +1,65 @@
+"""Large results reach the agent as a summary; slow or abandoned statements are stopped."""
+import threading
+import pytest
+from sqlalchemy import create_engine
+from tools import sql_governor
+
+FOREVER = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(sql_governor, "SQL_MAX_ROWS", 50)
+    monkeypatch.setattr(sql_governor, "SQL_RESULT_HEAD", 10)
+    monkeypatch.setattr(sql_governor, "SQL_SCAN_MAX_ROWS", 100_000)
+    monkeypatch.setattr(sql_governor, "SQL_STATEMENT_TIMEOUT", 15)
+    engine = create_engine(f"sqlite:///{tmp_path / 'rows.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (id INTEGER PRIMARY KEY, score REAL, name TEXT)")
+        conn.exec_driver_sql("WITH RECURSIVE s(v) AS (SELECT 1 UNION ALL SELECT v + 1 FROM s WHERE v < 200) "
+                             "INSERT INTO t (id, score, name) SELECT v, v * 0.5, 'n' || v FROM s")
+    yield sql_governor.GovernedSQLDatabase(engine)
+    engine.dispose()
+
+def test_small_results_are_verbatim(db):
+    assert db.run("SELECT id, name FROM t WHERE id <= 3 ORDER BY id") == "[(1, 'n1'), (2, 'n2'), (3, 'n3')]"
+    assert db.run("SELECT id FROM t WHERE id > 1000") == ""
+
+def test_results_over_the_row_cap_are_summarised(db):
+    out = db.run("SELECT id, score, name FROM t ORDER BY id")
+    assert out.startswith("Result truncated: 200 rows, showing the first 10. Columns: id, score, name.")
+    assert "(10, 5.0, 'n10')" in out and "(11, 5.5, 'n11')" not in out
+    assert "id: min=1, max=200, avg=100.5" in out and "name: 200 non-null" in out
+    columns, head = db.fetch("SELECT id FROM t ORDER BY id")
+    assert columns == ["id"] and len(head) == 10
+
+def test_scan_cap_reports_a_lower_bound(db, monkeypatch):
+    monkeypatch.setattr(sql_governor, "SQL_SCAN_MAX_ROWS", 120)
+    assert db.run("SELECT id FROM t").startswith("Result truncated: more than 120 rows")
+    monkeypatch.setattr(sql_governor, "SQL_SCAN_MAX_ROWS", 200) # exactly at the cap: still complete
+    assert db.run("SELECT id FROM t").startswith("Result truncated: 200 rows")
+
+def test_statement_timeout(db, monkeypatch):
+    monkeypatch.setattr(sql_governor, "SQL_STATEMENT_TIMEOUT", 0.2)
+    with pytest.raises(sql_governor.QueryAborted, match="statement timeout"):
+        db.run(FOREVER)
+    assert db.run_no_throw(FOREVER).startswith("Error:")
+    assert db.run("SELECT COUNT(*) FROM t") == "[(200,)]" # the connection is usable again
+
+def test_abandoned_turn_cancels_the_running_statement(db):
+    errors = []
+
+    def turn(scope):
+        sql_governor.bind(scope)
+        try:
+            db.run(FOREVER)
+        except sql_governor.QueryAborted as e:
+            errors.append(str(e))
+
+    scope = sql_governor.CancelScope()
+    worker = threading.Thread(target=turn, args=(scope,))
+    worker.start()
+    worker.join(0.2)
+    scope.cancel()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert errors and "abandoned" in errors[0]
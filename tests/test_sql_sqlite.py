@@ -0,0 +1,21 @@
+"""More threads than pooled connections must share the SQLite pool without errors."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tools import sql_sqlite, sql_governor
+
+THREADS = 24
+
+def test_more_threads_than_pool_size():
+    engine = sql_sqlite.create_sqlite_engine("titanic", pool_size=2, max_overflow=2)
+    db = sql_governor.GovernedSQLDatabase(engine)
+    barrier = threading.Barrier(THREADS)
+
+    def one(i):
+        barrier.wait() # start every query at once
+        return [db.run_no_throw(f"SELECT COUNT(*) FROM passenger WHERE passengerid > {i}") for _ in range(20)]
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(one, range(THREADS)))
+    for i, runs in enumerate(results):
+        assert all(r == f"[({1309 - i},)]" for r in runs), runs[0]
+    engine.dispose()
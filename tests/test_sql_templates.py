@@ -0,0 +1,88 @@
+"""Every SQL template runs against real data, and its summary table gives the same answer."""
+import pytest
+from sqlalchemy import create_engine
+from tools import sql_agent, sql_governor, sql_templates, sqlite_import
+
+QUESTIONS = {
+    "titanic_survivors": "How many passengers survived the Titanic?",
+    "titanic_passengers": "How many passengers were on board the Titanic?",
+    "titanic_sex_count": "How many women were on board the Titanic?",
+    "titanic_survival_by_class": "Survival rate by class",
+    "titanic_survival_by_sex": "Survival rate by sex on the Titanic",
+    "titanic_survivors_in_class": "How many first class passengers survived?",
+    "titanic_survivors_by_sex": "How many women survived?",
+    "titanic_average_age_by_class": "What was the average age of Titanic passengers by class?",
+    "happiness_top_n": "Show the top 5 happiest countries overall.",
+    "happiness_happiest": "Which country had the highest happiness score in 2019?",
+    "happiness_bottom_n": "bottom 3 least happy countries",
+    "happiness_unhappiest": "Which country has the lowest happiness score?",
+    "happiness_country_rank": "What is Japan's happiness rank?",
+    "lego_set_count": "How many LEGO sets exist?",
+    "lego_top_themes": "Top 3 LEGO themes by number of sets",
+    "lego_theme_sets": "How many sets are there in the Star Wars theme?",
+}
+
+# there is no lego dump in init/dumps: a few rows are enough, including an empty theme
+def _lego(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE lego_themes (id INTEGER PRIMARY KEY, name TEXT, parent_id INTEGER)")
+        conn.exec_driver_sql("CREATE TABLE lego_sets (set_num TEXT PRIMARY KEY, name TEXT, year INTEGER, theme_id INTEGER, num_parts INTEGER)")
+        conn.exec_driver_sql("INSERT INTO lego_themes VALUES (1, 'Star Wars', NULL), (2, 'Technic', NULL), (3, 'Duplo', NULL)")
+        conn.exec_driver_sql("INSERT INTO lego_sets VALUES ('a', 'X-wing', 1999, 1, 263), ('b', 'Y-wing', 1999, 1, 410), "
+                             "('c', 'Crane', 2001, 2, 1200)")
+        for stmt in sql_templates.summary_ddl("lego", "sqlite"):
+            conn.exec_driver_sql(stmt)
+    engine.dispose()
+
+@pytest.fixture(scope="module")
+def dbs(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("templates")
+    for dump, name in (("titanic.sql", "titanic.db"), ("happiness_index.sql", "happiness_index.db")):
+        sqlite_import.convert(sqlite_import.INIT_DIR / dump, tmp / name)
+    _lego(tmp / "lego.db")
+    out = {label: sql_governor.GovernedSQLDatabase(create_engine(f"sqlite:///{tmp / name}"))
+           for name, label in sqlite_import.LABELS.items()}
+    yield out
+    for db in out.values():
+        db._engine.dispose()
+
+def test_every_template_has_a_question():
+    assert set(QUESTIONS) == {t.name for t in sql_templates.TEMPLATES}
+
+@pytest.mark.parametrize("name", sorted(QUESTIONS))
+def test_template_sql_and_summary_agree(dbs, name):
+    template, slots = sql_templates.match(QUESTIONS[name])
+    assert template.name == name
+    db = dbs[template.label]
+    _, rows = db.fetch(template.sql, slots)
+    assert rows, name
+    answer = template.answer(rows, slots)
+    assert answer and "n/a" not in answer
+    if template.summary_sql:
+        _, summary_rows = db.fetch(template.summary_sql, slots)
+        assert template.answer(summary_rows, slots) == answer
+
+def test_known_answers(dbs):
+    def ask(name):
+        template, slots = sql_templates.match(QUESTIONS[name])
+        return template.answer(dbs[template.label].fetch(template.sql, slots)[1], slots)
+    assert "1309 passengers" in ask("titanic_passengers")
+    assert "Star Wars theme has 2 LEGO sets" in ask("lego_theme_sets")
+    assert ask("lego_top_themes").splitlines()[1] == "1. Star Wars (2 sets)"
+
+def test_formatters_accept_null():
+    assert sql_templates._average_age([(1, None)], {}).endswith("class 1: n/a years")
+    assert "score n/a" in sql_templates._ranking("happiest countries", "happiest country")([(1, "Finland", None)], {})
+    assert "score of n/a" in sql_templates._country_rank([(9, "Japan", None)], {"country": "japan"})
+    assert "0 of 0 survived (n/a)" in sql_templates._survival("sex")([("female", None, None)], {})
+    assert "has 0 LEGO sets" in sql_templates._theme_sets([("Duplo", None)], {"theme": "duplo"})
+
+def test_formatter_error_falls_through_to_the_agent(monkeypatch):
+    class _DB:
+        def fetch(self, command, parameters=None):
+            return ["rank"], [(1,)] # wrong shape: the formatter cannot unpack it
+    monkeypatch.setattr(sql_templates, "SQL_TEMPLATES_ENABLED", True)
+    monkeypatch.setattr(sql_templates, "SQL_TEMPLATE_SUMMARIES", False)
+    monkeypatch.setattr(sql_agent, "get_sqldb", lambda label: _DB())
+    assert sql_agent._template_answer(QUESTIONS["happiness_country_rank"]) is None
@@ -0,0 +1,33 @@
+"""The weather subgraph answers every city in one tool step, even when the model splits them."""
+import json
+from langchain_core.messages import AIMessage, HumanMessage
+from bench.fakes import ScriptedChatModel
+from bench.weather_stub import WeatherStub
+from tools import weather_agent, weather_client
+
+def _calls(*cities):
+    return AIMessage(content="", tool_calls=[{"name": "get_weather", "args": {"cities": [c]}, "id": f"call_{c}"} for c in cities])
+
+def test_parallel_calls_are_merged_into_one(monkeypatch):
+    stub = WeatherStub().start()
+    monkeypatch.setattr(weather_client, "WEATHER_API_BASE", stub.base_url)
+    monkeypatch.setenv("WEATHER_API_KEY", "stub")
+    weather_client.clear_cache()
+    fake = ScriptedChatModel(respond=lambda msgs: _calls("London", "Paris", "Tokyo"))
+    monkeypatch.setattr(weather_agent, "llm", fake)
+    try:
+        out = weather_agent.weather_graph.invoke({"messages": [HumanMessage(content="Compare London, Paris and Tokyo")]})
+    finally:
+        stub.stop()
+        weather_client.clear_cache()
+    call, tool = out["messages"][-2:]
+    assert [tc["args"] for tc in call.tool_calls] == [{"cities": ["London", "Paris", "Tokyo"]}]
+    assert tool.tool_call_id == call.tool_calls[0]["id"]
+    assert [r["city"] for r in json.loads(tool.content)["results"]] == ["London", "Paris", "Tokyo"]
+    assert fake.calls == 1 and stub.total_requests == 3
+
+def test_single_call_is_unchanged():
+    msg = _calls("Oslo")
+    assert weather_agent._one_call(msg) is msg
+    text = AIMessage(content="Which city?")
+    assert weather_agent._one_call(text) is text
@@ -0,0 +1,45 @@
+"""Concurrent lookups of one city share a single upstream request; errors are shared, not cached."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from bench.weather_stub import WeatherStub
+from tools import weather_client
+
+CALLERS = 16
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = WeatherStub(delay=0.2).start()
+    monkeypatch.setattr(weather_client, "WEATHER_API_BASE", server.base_url)
+    monkeypatch.setenv("WEATHER_API_KEY", "stub")
+    weather_client.clear_cache()
+    yield server
+    weather_client.clear_cache()
+    server.stop()
+
+def test_concurrent_callers_share_one_request(stub):
+    spellings = ["Paris", "paris", " PARIS ", "Paris"] * (CALLERS // 4)
+    with ThreadPoolExecutor(max_workers=CALLERS) as pool:
+        results = list(pool.map(weather_client.fetch_current, spellings))
+    assert stub.total_requests == 1
+    assert all(r["status"] == "ok" and r["city"] == c for r, c in zip(results, spellings))
+    assert len({(r["weather"], r["temperature_c"]) for r in results}) == 1
+    weather_client.fetch_current("Paris") # now cached
+    assert stub.total_requests == 1
+
+def test_async_callers_share_one_request(stub):
+    async def run():
+        return await asyncio.gather(*(weather_client.afetch_current("Kyoto") for _ in range(CALLERS)))
+    results = asyncio.run(run())
+    assert stub.total_requests == 1
+    assert all(r["status"] == "ok" for r in results)
+
+def test_errors_are_shared_but_not_cached(stub):
+    attempts = weather_client.WEATHER_RETRIES + 1
+    stub.fail_first = attempts # every attempt of the first lookup gets a 503
+    with ThreadPoolExecutor(max_workers=CALLERS) as pool:
+        results = list(pool.map(weather_client.fetch_current, ["Oslo"] * CALLERS))
+    assert stub.total_requests == attempts
+    assert all(r["status"] == "error" for r in results)
+    assert weather_client.fetch_current("Oslo")["status"] == "ok"
+    assert stub.total_requests == attempts + 1
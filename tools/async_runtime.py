@@ -0,0 +1,49 @@
+import asyncio, threading, queue
+from typing import Any, AsyncIterator, Awaitable, Iterator
+
+# One event loop per process, running in a daemon thread. Every Streamlit session
+# submits its turn here, so async clients (HTTP pools, LLM clients) are shared
+# and many conversations are multiplexed on a single thread.
+_LOOP: asyncio.AbstractEventLoop | None = None
+_LOCK = threading.Lock()
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    if _LOOP is None:
+        with _LOCK:
+            if _LOOP is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-runtime", daemon=True).start()
+                _LOOP = loop
+    return _LOOP
+
+# Run a coroutine on the shared loop and wait for its result (from a non-loop thread)
+def run(coro: Awaitable[Any]) -> Any:
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+_DONE = object()
+
+# Consume an async iterator on the shared loop, yielding its items to a sync caller
+def iterate(agen: AsyncIterator[Any]) -> Iterator[Any]:
+    q: "queue.Queue[Any]" = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in agen:
+                q.put(item)
+        except BaseException as e: # re-raised in the caller's thread
+            q.put(e)
+        finally:
+            q.put(_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_loop())
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        future.cancel() # caller stopped early (e.g. the session was closed)
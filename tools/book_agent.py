@@ -1,35 +1,66 @@
-import os, json, re
+import os, re, threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List
-from dotenv import load_dotenv
-
-from langchain_openai import ChatOpenAI
+from typing import Any, Dict, Iterator, List, Tuple
 from langchain.tools import tool
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
-from langgraph.graph import START, END, StateGraph, MessagesState
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import START, END, StateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
+from tools import book_index, book_corpus, context_window, llm_registry
+from tools.context_window import ConversationState
 
-load_dotenv()
-llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0)
+llm_registry.load_env()
 
 # Path to books.json
 DEFAULT_PATH = Path(__file__).resolve().parents[1] / "data" / "books.json"
 BOOKS_PATH = Path(os.getenv("BOOKS_PATH", str(DEFAULT_PATH)))
 
-# to cache loaded books for current session
-_BOOKS_CACHE: List[Dict[str, Any]] | None = None
-
-# Load books.json if not already loaded
-def _load_books() -> List[Dict[str, Any]]:
-    global _BOOKS_CACHE 
-    if _BOOKS_CACHE is None:
-        if not BOOKS_PATH.exists():
-            raise FileNotFoundError(f"[book_agent] books.json not found: {BOOKS_PATH}") 
-        with BOOKS_PATH.open("r", encoding="utf-8") as f:
-            _BOOKS_CACHE = json.load(f)
-        print(f"[book_agent] loaded {len(_BOOKS_CACHE)} records from {BOOKS_PATH}") # for debug
+# where the corpus columns and search index are persisted: next to books.json, or the cache dir if data/ is read-only
+INDEX_CACHE_DIR = Path(os.getenv("BOOKS_INDEX_DIR", str(Path(__file__).resolve().parents[1] / ".cache" / "books")))
+
+# to cache loaded books (compact columns + search index) for the current process
+_BOOKS_CACHE: book_corpus.BookCorpus | None = None
+_INDEX_CACHE: book_index.BookIndex | None = None
+_LOAD_LOCK = threading.Lock()
+
+# candidate locations for a persisted file derived from books.json
+def _cache_paths(suffix: str) -> List[Path]:
+    name = BOOKS_PATH.name + suffix
+    return [BOOKS_PATH.with_name(name), INDEX_CACHE_DIR / name]
+
+# Load books.json if not already loaded, or reload it when its size/mtime changed
+def _load_books() -> book_corpus.BookCorpus:
+    global _BOOKS_CACHE, _INDEX_CACHE
+    if not BOOKS_PATH.exists():
+        raise FileNotFoundError(f"[book_agent] books.json not found: {BOOKS_PATH}") 
+    sig = book_index.file_signature(BOOKS_PATH)
+    if _BOOKS_CACHE is not None and _BOOKS_CACHE.signature == sig:
+        return _BOOKS_CACHE
+    with _LOAD_LOCK: # one session (re)loads, the others wait for it
+        if _BOOKS_CACHE is None or _BOOKS_CACHE.signature != sig:
+            old = _BOOKS_CACHE
+            _BOOKS_CACHE, _INDEX_CACHE = _open_books(sig)
+            print(f"[book_agent] loaded {len(_BOOKS_CACHE)} records from {BOOKS_PATH}") # for debug
+            if old is not None:
+                old.retire() # its file and mmap are closed once no search holds it
     return _BOOKS_CACHE
 
+# The loaded corpus and its index, held for one search + render: a reload meanwhile
+# doesn't close the corpus under it, and record bodies come from the version searched
+@contextmanager
+def _books_snapshot() -> Iterator[Tuple[book_corpus.BookCorpus, book_index.BookIndex]]:
+    while True:
+        books = _load_books()
+        index = _INDEX_CACHE
+        # retried if a reload swapped the pair between the two reads
+        if index is not None and index.signature == books.signature and books.acquire():
+            break
+    try:
+        yield books, index
+    finally:
+        books.release()
+
 # keyword search helpers
 _META_FIELDS = ["title", "author", "genre", "chapter", "section", "stanza", "act", "scene", "book"]
 _TEXT_FIELDS = ["text", "paragraph", "excerpt"]
@@ -41,7 +72,7 @@ def _norm(s: str) -> str:
 
 # Simple tokenizer (split on whitespace and punctuation)
 def _tokenise(q: str) -> List[str]:
-    return [t for t in re.split(r"[\s、。.,;:!?（）()\\[\\]{}\"'’”“\\-_/]+", q) if t]
+    return [t for t in re.split(r"[\s、。.,;:!?（）()\[\]{}\"'’”“\-_/—]+", q) if t]
 
 # Extract text from relevant fields for scoring
 def _field_to_text(rec: Dict[str, Any]) -> str: # rec=1 book record
@@ -56,30 +87,49 @@ def _field_to_text(rec: Dict[str, Any]) -> str: # rec=1 book record
             chunks.extend([str(x) for x in v]) 
     return _norm(" ".join(chunks)) 
 
-# Score a record based on presence of terms
-def _score_record(rec: Dict[str, Any], terms: List[str]) -> int:
-    score = 0
-    title = _norm(str(rec.get("title", "")))
-    author = _norm(str(rec.get("author", "")))
-    body = _field_to_text(rec)
-    for t in terms:
-        if not t:
-            continue
-        if t in title:  score += 5
-        if t in author: score += 4
-        if t in body:   score += 2
-    return score
+# per-field weights for BM25 scoring (title > author > everything else)
+_FIELD_WEIGHTS = {"title": 5.0, "author": 4.0, "body": 2.0}
+
+# Tokens of one record per indexed field
+def _doc_tokens(rec: Dict[str, Any]) -> Dict[str, List[str]]:
+    return {
+        "title": _tokenise(_norm(str(rec.get("title", "")))),
+        "author": _tokenise(_norm(str(rec.get("author", "")))),
+        "body": _tokenise(_field_to_text(rec)),
+    }
+
+# Open persisted corpus + index for this file version, or stream the JSON once to build both
+def _open_books(sig: tuple) -> tuple:
+    pairs = list(zip(_cache_paths(".corpus.pkl"), _cache_paths(".index.pkl")))
+    for corpus_path, index_path in pairs:
+        corpus = book_corpus.BookCorpus.load(corpus_path, BOOKS_PATH, sig)
+        index = book_index.BookIndex.load(index_path, sig, _FIELD_WEIGHTS) if corpus else None
+        if corpus and index:
+            return corpus, index
+    index = book_index.BookIndex(_FIELD_WEIGHTS)
+    corpus = book_corpus.BookCorpus.build(BOOKS_PATH, lambda rec: index.add(_doc_tokens(rec)))
+    corpus.signature = index.signature = sig
+    for corpus_path, index_path in pairs: # next to the JSON if writable, else the cache dir
+        try:
+            corpus_path.parent.mkdir(parents=True, exist_ok=True)
+            corpus.save(corpus_path)
+            index.save(index_path)
+            break
+        except OSError as e:
+            print(f"[book_agent] could not save index to {corpus_path.parent}: {e}")
+    return corpus, index
 
 # Render a single hit as Markdown
 #OUTPUT:  - **The Raven** by Edgar Allan Poe (published 1845) — Poetry
 #         › Once upon a midnight dreary... / Over many a quaint and curious volume...
-def _render_hit(rec: Dict[str, Any]) -> str:
+def _render_hit(hit: book_corpus.BookRecord, books: book_corpus.BookCorpus) -> str:
     parts = []
-    parts.append(f"- **{rec.get('title','(no title)')}** by {rec.get('author','(unknown)')}")
-    if 'published_year' in rec:
-        parts.append(f" (published {rec['published_year']})")
-    if 'genre' in rec:
-        parts.append(f" — {rec['genre']}")
+    parts.append(f"- **{hit.title or '(no title)'}** by {hit.author or '(unknown)'}")
+    if hit.published_year is not None:
+        parts.append(f" (published {hit.published_year})")
+    if hit.genre:
+        parts.append(f" — {hit.genre}")
+    rec = books.body(hit.doc) # full record read from the mapped file only now
     snippet = None
     if rec.get("lines"):
         snippet = " / ".join(rec["lines"][:2]) # show up to 2 lines
@@ -88,18 +138,21 @@ def _render_hit(rec: Dict[str, Any]) -> str:
         parts.append(f"\n  › {snippet}")
     return "".join(parts)
 
-# MAIN: Search books.json for top 5 matches to query
-def _search_books(query: str, k: int = 5) -> List[Dict[str, Any]]: # return dict list
-    books = _load_books()
+# MAIN: Search a books snapshot for top 5 matches to query
+def _search_books(query: str, books: book_corpus.BookCorpus, index: book_index.BookIndex, k: int = 5) -> List[book_corpus.BookRecord]: # return record list
     terms = _tokenise(_norm(query))
     if not terms:
         return []
-    scored = [(rec, _score_record(rec, terms)) for rec in books] # list of (rec, score)
-    scored = [x for x in scored if x[1] > 0] # remove zero-score
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return [rec for rec, _ in scored[:k]] # only return top k records
+    hits = index.search(terms, k=k) # BM25 top-k as (doc id, score)
+    return [books[doc] for doc, _ in hits]
 
 # Finalise as a LangChain tool
+# search one snapshot and render its hits; "" when nothing matches
+def _search_and_render(query: str, k: int) -> str:
+    with _books_snapshot() as (books, index):
+        hits = _search_books(query, books, index, k=k)
+        return "\n".join(_render_hit(h, books) for h in hits) # render as markdown
+
 @tool("book_search", return_direct=False)
 def book_search(query: str, k: int = 5) -> str: # return 5 top matches as markdown
     # docstring
@@ -112,10 +165,13 @@ def book_search(query: str, k: int = 5) -> str: # return 5 top matches as markdo
         Markdown summary of top matches (title/author/year/genre/snippet)
     """
     print("[book_agent] book_search CALLED with:", query) # for debug
-    hits = _search_books(query, k=k) 
-    if not hits:
+    try:
+        body = _search_and_render(query, k)
+    except book_corpus.CorpusChanged as e: # rewritten in place mid-search: reload and search again
+        print(f"[book_agent] {e}; reloading")
+        body = _search_and_render(query, k)
+    if not body:
         return "No match. Try specifying a title, author, or a distinctive quote."
-    body = "\n".join(_render_hit(h) for h in hits) # render as markdown
     return f"Top matches from books.json:\n{body}" # return markdown
 # OUTPUT: Top matches from books.json:
 #         - **The Raven** by Edgar Allan Poe (published 1845) — Poetry
@@ -131,21 +187,35 @@ SYS = """You are a helpful book-RAG agent.
 - Always call `book_search` for book queries and answer ONLY from its results.
 """
 
-# Bind LLM with tools 
-llm_with_tools = llm.bind_tools(tools)
+# Bind LLM with tools (on first use; benches assign a fake)
+llm_with_tools = None
+
+def _llm_with_tools():
+    global llm_with_tools
+    if llm_with_tools is None:
+        llm_with_tools = llm_registry.get("gpt-4.1-mini").bind_tools(tools)
+    return llm_with_tools
 
 # Agent node function
-def _agent_node(state: MessagesState) -> Dict[str, Any]:
-    msgs = [SystemMessage(content=SYS)] + state["messages"] # prepend system prompt + user msgs
-    ai = llm_with_tools.invoke(msgs) 
+def _agent_node(state: ConversationState) -> Dict[str, Any]:
+    msgs = [SystemMessage(content=SYS)] + context_window.window(state) # prepend system prompt + summary + recent msgs
+    context_window.track("book.agent", msgs)
+    ai = _llm_with_tools().invoke(msgs) 
+    return {"messages": [ai]}
+
+# async agent node (used when the graph runs through ainvoke/astream)
+async def _aagent_node(state: ConversationState) -> Dict[str, Any]:
+    msgs = [SystemMessage(content=SYS)] + context_window.window(state)
+    context_window.track("book.agent", msgs)
+    ai = await _llm_with_tools().ainvoke(msgs)
     return {"messages": [ai]}
 
 # ToolNode for the tools
 tool_node = ToolNode(tools)
 
 # Build the StateGraph
-graph = StateGraph(MessagesState)
-graph.add_node("agent", _agent_node)
+graph = StateGraph(ConversationState)
+graph.add_node("agent", RunnableLambda(_agent_node, afunc=_aagent_node))
 graph.add_node("tools", tool_node)
 
 graph.add_edge(START, "agent")
@@ -0,0 +1,206 @@
+import os, re, sys, json, mmap, codecs, pickle, threading
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+# bump when the on-disk layout changes so stale files are rebuilt
+CORPUS_VERSION = 1
+# published_year placeholder for records without one
+NO_YEAR = -(2 ** 31)
+
+# whitespace, commas and the opening bracket between top-level records
+_SEPARATORS = re.compile(r"[\s,\[]*")
+
+# Stream (start_byte, end_byte, record) for each object in a top-level JSON array.
+# Reads fixed-size chunks, so memory is bounded by the largest record, not the file.
+def iter_records(path: Path, chunk_size: int = 1 << 20) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    with path.open("rb") as f:
+        bom = f.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8
+        f.seek(len(codecs.BOM_UTF8) if bom else 0)
+        buf, pos, eof = "", 0, False
+        offset = f.tell() # byte offset of buf[pos]
+        while True:
+            end = _SEPARATORS.match(buf, pos).end()
+            offset += len(buf[pos:end].encode("utf-8"))
+            pos = end
+            if pos < len(buf):
+                if buf[pos] == "]": # end of the top-level array
+                    return
+                try:
+                    rec, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    rec = None # record continues in the next chunk
+                if rec is not None:
+                    size = len(buf[pos:end].encode("utf-8"))
+                    yield offset, offset + size, rec
+                    offset += size
+                    pos = end
+                    continue
+            elif eof:
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + utf8.decode(chunk, final=eof)
+            pos = 0
+
+class CorpusChanged(RuntimeError):
+    """The source file was rewritten in place: the stored byte spans no longer match it."""
+
+class BookRecord:
+    """Lightweight view of one record: metadata only, the body stays in the file."""
+    __slots__ = ("doc", "title", "author", "genre", "published_year")
+
+    def __init__(self, doc: int, title: str, author: str, genre: str, published_year: int | None):
+        self.doc = doc
+        self.title = title
+        self.author = author
+        self.genre = genre
+        self.published_year = published_year
+
+class BookCorpus:
+    """
+    Columnar, memory-mapped view of a books.json array.
+    Titles, authors and genres are interned into one string table and stored as
+    indexes; each record's full JSON is kept as a byte span into the mmap and only
+    parsed when body() is called.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.strings: List[str] = [""]
+        self._string_ids: Dict[str, int] = {"": 0}
+        self.titles = array("I")
+        self.authors = array("I")
+        self.genres = array("I")
+        self.years = array("i")
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.signature: tuple = ()
+        self._file = None
+        self._mm = None
+        self._map_lock = threading.Lock()
+        self._readers = 0 # searches holding this corpus (acquire / release)
+        self._retired = False
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, doc: int) -> BookRecord:
+        year = self.years[doc]
+        return BookRecord(
+            doc,
+            self.strings[self.titles[doc]],
+            self.strings[self.authors[doc]],
+            self.strings[self.genres[doc]],
+            None if year == NO_YEAR else year,
+        )
+
+    def _intern(self, value: Any) -> int:
+        s = sys.intern(str(value)) if value is not None else ""
+        sid = self._string_ids.get(s)
+        if sid is None:
+            sid = self._string_ids[s] = len(self.strings)
+            self.strings.append(s)
+        return sid
+
+    def _append(self, rec: Dict[str, Any], start: int, end: int) -> None:
+        self.titles.append(self._intern(rec.get("title")))
+        self.authors.append(self._intern(rec.get("author")))
+        self.genres.append(self._intern(rec.get("genre")))
+        year = rec.get("published_year")
+        self.years.append(year if isinstance(year, int) and abs(year) < 2 ** 31 - 1 else NO_YEAR)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    # The open file must still be the version the spans were read from (size and mtime
+    # from the signature). A file replaced by rename keeps the old inode behind our fd;
+    # one rewritten in place (cp new.json books.json) changes under the map.
+    def _check(self) -> None:
+        if not self.signature:
+            return
+        st = os.fstat(self._file.fileno())
+        if (st.st_size, st.st_mtime_ns) != self.signature[1:]:
+            raise CorpusChanged(f"{self.path} changed since it was indexed")
+
+    def _map(self):
+        with self._map_lock:
+            if self._file is None:
+                self._file = self.path.open("rb")
+            self._check() # before touching pages that a truncation may have removed
+            if self._mm is None:
+                self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mm
+
+    # Full record dict, parsed from the mapped file on demand
+    def body(self, doc: int) -> Dict[str, Any]:
+        data = self._map()[self.starts[doc]:self.ends[doc]]
+        with self._map_lock:
+            self._check() # a rewrite during the slice: the bytes may be from either version
+        return json.loads(data)
+
+    def close(self) -> None:
+        with self._map_lock:
+            if self._mm is not None:
+                self._mm.close()
+            if self._file is not None:
+                self._file.close()
+            self._mm = self._file = None
+
+    # Hold the corpus while reading bodies; False once it has been retired
+    def acquire(self) -> bool:
+        with self._map_lock:
+            if self._retired:
+                return False
+            self._readers += 1
+            return True
+
+    def release(self) -> None:
+        with self._map_lock:
+            self._readers -= 1
+            done = self._retired and self._readers == 0
+        if done:
+            self.close()
+
+    # Replaced by a newer version of the file: close now, or when the last reader releases it
+    def retire(self) -> None:
+        with self._map_lock:
+            self._retired = True
+            done = self._readers == 0
+        if done:
+            self.close()
+
+    # Stream the file once, calling on_record(rec) for each record as it is read
+    @classmethod
+    def build(cls, path: Path, on_record: Callable[[Dict[str, Any]], None] | None = None) -> "BookCorpus":
+        corpus = cls(path)
+        for start, end, rec in iter_records(path):
+            corpus._append(rec, start, end)
+            if on_record is not None:
+                on_record(rec)
+        corpus._string_ids = {} # only needed while building
+        return corpus
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        columns = (self.strings, self.titles, self.authors, self.genres, self.years, self.starts, self.ends)
+        with tmp.open("wb") as f:
+            pickle.dump((CORPUS_VERSION, self.signature, columns), f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path) # atomic swap
+
+    # Load saved columns for `source`; None if missing, stale or written by another version
+    @classmethod
+    def load(cls, path: Path, source: Path, signature: tuple) -> "BookCorpus | None":
+        try:
+            with path.open("rb") as f:
+                version, sig, columns = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if version != CORPUS_VERSION or sig != signature:
+            return None
+        corpus = cls(source)
+        corpus.strings, corpus.titles, corpus.authors, corpus.genres, corpus.years, corpus.starts, corpus.ends = columns
+        corpus.signature = sig
+        return corpus
@@ -0,0 +1,177 @@
+import math, heapq, pickle
+from bisect import bisect_left
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# terms in more than this share of docs are first scored only on docs matched by rarer
+# terms (the full postings are walked only when that could change the top k)
+COMMON_DF_RATIO = 0.2
+# bump when the on-disk layout changes so stale files are rebuilt
+INDEX_VERSION = 1
+
+class BookIndex:
+    """
+    Token-level inverted index with one postings list per field.
+    Each posting list is a pair of arrays (doc ids, term frequencies) so large
+    corpora stay compact. Scores are BM25 per field, weighted per field and summed.
+    """
+    def __init__(self, field_weights: Dict[str, float]):
+        self.field_weights = dict(field_weights)
+        self.postings: Dict[str, Dict[str, Tuple[array, array]]] = {f: {} for f in field_weights}
+        self.lengths: Dict[str, array] = {f: array("I") for f in field_weights}
+        self.total_lengths: Dict[str, int] = {f: 0 for f in field_weights}
+        self.n_docs = 0
+        self.signature: tuple = ()
+        self._norms: Dict[str, array] = {} # per-doc BM25 length norms, rebuilt after adds
+        self._max_contrib: Dict[Tuple[str, str], float] = {} # (field, common term) -> best score it adds to a doc
+
+    # Add the next document (ids are assigned in insertion order)
+    def add(self, field_tokens: Dict[str, List[str]]) -> int:
+        doc = self.n_docs
+        for f in self.field_weights:
+            tokens = field_tokens.get(f) or []
+            self.lengths[f].append(len(tokens))
+            self.total_lengths[f] += len(tokens)
+            postings = self.postings[f]
+            for term, tf in Counter(tokens).items():
+                plist = postings.get(term)
+                if plist is None:
+                    plist = postings[term] = (array("I"), array("I"))
+                plist[0].append(doc)
+                plist[1].append(tf)
+        self.n_docs += 1
+        self._norms = {}
+        self._max_contrib = {}
+        return doc
+
+    # K1 * (1 - B + B * len / avg_len) for every doc of a field
+    def _field_norms(self, f: str) -> array:
+        norms = self._norms.get(f)
+        if norms is None:
+            avg = (self.total_lengths[f] / self.n_docs) or 1.0
+            a, b = K1 * (1 - B), K1 * B / avg
+            norms = self._norms[f] = array("d", (a + b * n for n in self.lengths[f]))
+        return norms
+
+    # Build from an iterable of token dicts
+    @classmethod
+    def build(cls, docs: Iterable[Dict[str, List[str]]], field_weights: Dict[str, float]) -> "BookIndex":
+        index = cls(field_weights)
+        for d in docs:
+            index.add(d)
+        return index
+
+    # Return the top-k (doc id, score) pairs for the query terms. Exact: common terms
+    # re-score only the rare terms' candidates when no other doc can reach the k-th score
+    def search(self, terms: List[str], k: int = 5) -> List[Tuple[int, float]]:
+        if not self.n_docs:
+            return []
+        terms = set(terms)
+        limit = COMMON_DF_RATIO * self.n_docs
+        df = {t: max(len(self.postings[f].get(t, ((),))[0]) for f in self.field_weights) for t in terms}
+        rare = [t for t in terms if df[t] <= limit]
+        common = [t for t in terms if df[t] > limit]
+        scores: Dict[int, float] = {}
+        for f in self.field_weights:
+            for t in rare:
+                self._accumulate(f, t, scores)
+        if common and 0 < k <= len(scores):
+            # very common terms (e.g. "the") first re-score the candidates instead of
+            # walking postings that cover most of the corpus
+            pairs = sorted((self._max_contrib_of(f, t), f, t) for f in self.field_weights for t in common)
+            rescored = dict(scores)
+            for _, f, t in pairs:
+                self._accumulate_candidates(f, t, rescored)
+            kth = heapq.nlargest(k, rescored.values())[-1]
+            # (field, term) pairs that together add less than the k-th score can't lift a doc
+            # without rarer terms into the top k: only the other pairs' postings are walked
+            skip, bound = 0, 0.0
+            while skip < len(pairs) and bound + pairs[skip][0] < kth:
+                bound += pairs[skip][0]
+                skip += 1
+            if skip == len(pairs):
+                return heapq.nlargest(k, rescored.items(), key=lambda x: x[1]) # no full sort
+            for _, f, t in pairs[skip:]:
+                self._accumulate(f, t, scores)
+            for _, f, t in pairs[:skip]:
+                self._accumulate_candidates(f, t, scores)
+            return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+        for f in self.field_weights:
+            for t in common:
+                self._accumulate(f, t, scores)
+        return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+    def _term_weight(self, docs: array, f: str) -> float:
+        idf = math.log(1 + (self.n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+        return self.field_weights[f] * idf * (K1 + 1)
+
+    # most that (field, term) adds to any one doc's score; measured over its postings once
+    # and kept, which only pays off for the few common terms it is used on
+    def _max_contrib_of(self, f: str, term: str) -> float:
+        best = self._max_contrib.get((f, term))
+        if best is None:
+            plist = self.postings[f].get(term)
+            best = 0.0
+            if plist is not None:
+                docs, tfs = plist
+                norms = self._field_norms(f)
+                best = self._term_weight(docs, f) * max(tf / (tf + norms[doc]) for doc, tf in zip(docs, tfs))
+            self._max_contrib[(f, term)] = best
+        return best
+
+    # add the BM25 contribution of (field, term) for every doc in its postings
+    def _accumulate(self, f: str, term: str, scores: Dict[int, float]) -> None:
+        plist = self.postings[f].get(term)
+        if plist is None:
+            return
+        docs, tfs = plist
+        w = self._term_weight(docs, f)
+        norms = self._field_norms(f)
+        get = scores.get
+        for doc, tf in zip(docs, tfs):
+            scores[doc] = get(doc, 0.0) + w * tf / (tf + norms[doc])
+
+    # add the contribution of (field, term) only for docs already in scores
+    def _accumulate_candidates(self, f: str, term: str, scores: Dict[int, float]) -> None:
+        plist = self.postings[f].get(term)
+        if plist is None:
+            return
+        docs, tfs = plist
+        w = self._term_weight(docs, f)
+        norms = self._field_norms(f)
+        for doc in scores:
+            i = bisect_left(docs, doc) # postings are sorted by doc id
+            if i < len(docs) and docs[i] == doc:
+                tf = tfs[i]
+                scores[doc] += w * tf / (tf + norms[doc])
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump((INDEX_VERSION, self.signature, self.field_weights, self.postings, self.lengths, self.total_lengths, self.n_docs), f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path) # atomic swap
+
+    # Load a saved index; None if missing, stale or written by another version
+    @classmethod
+    def load(cls, path: Path, signature: tuple, field_weights: Dict[str, float]) -> "BookIndex | None":
+        try:
+            with path.open("rb") as f:
+                version, sig, weights, postings, lengths, totals, n_docs = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if version != INDEX_VERSION or sig != signature or weights != field_weights:
+            return None
+        index = cls(weights)
+        index.postings, index.lengths, index.total_lengths = postings, lengths, totals
+        index.n_docs, index.signature = n_docs, sig
+        return index
+
+# Signature of the source file: the index is rebuilt whenever it changes
+def file_signature(path: Path) -> tuple:
+    st = path.stat()
+    return (str(path.resolve()), st.st_size, st.st_mtime_ns)
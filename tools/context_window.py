@@ -0,0 +1,113 @@
+import os, threading
+from typing import Any, Dict, List
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langgraph.graph import MessagesState
+
+from tools import llm_registry
+
+llm_registry.load_env()
+
+# prompt budget for the recent-history window (summary excluded)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# when the window overflows, fold old turns until it is back under this share of the budget,
+# so the summary is recomputed once per roll-over rather than on every turn
+CONTEXT_KEEP_RATIO = float(os.getenv("CONTEXT_KEEP_RATIO", "0.5"))
+SUMMARY_MAX_WORDS = int(os.getenv("CONTEXT_SUMMARY_MAX_WORDS", "150"))
+
+summary_llm = None # set on first use (benches assign a fake)
+
+def _summary_llm():
+    global summary_llm
+    if summary_llm is None:
+        summary_llm = llm_registry.get(os.getenv("CONTEXT_SUMMARY_MODEL", "gpt-4.1-mini"))
+    return summary_llm
+
+class ConversationState(MessagesState):
+    """MessagesState plus the rolling summary of turns that left the window."""
+    summary: str
+    summarised: int # number of leading messages already folded into the summary
+
+SUMMARY_SYS = SystemMessage(content=(
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the summary with the new turns. Keep names, places, book titles, databases, numbers "
+    f"and open questions the user may refer back to. At most {SUMMARY_MAX_WORDS} words. "
+    "Return ONLY the summary."
+))
+
+# Approximate token count (about 4 characters per token plus per-message overhead);
+# runs offline and is only used for budgeting, not billing
+def count_tokens(messages: List[Any]) -> int:
+    total = 0
+    for m in messages:
+        content = m.content if hasattr(m, "content") else m.get("content", "")
+        total += 4 + len(content if isinstance(content, str) else str(content)) // 4
+    return total
+
+# index of the first message of each turn (a turn starts at a user message)
+def _turn_starts(messages: List[BaseMessage], start: int) -> List[int]:
+    return [i for i in range(start, len(messages)) if getattr(messages[i], "type", None) == "human"]
+
+# how many leading messages to fold so the window fits the budget (0 = no roll-over)
+def _fold_upto(messages: List[BaseMessage], summarised: int) -> int:
+    if count_tokens(messages[summarised:]) <= CONTEXT_TOKEN_BUDGET:
+        return summarised
+    target = CONTEXT_TOKEN_BUDGET * CONTEXT_KEEP_RATIO
+    starts = _turn_starts(messages, summarised)
+    upto = summarised
+    for start in starts[1:]: # never fold the current (last) turn
+        upto = start
+        if count_tokens(messages[upto:]) <= target:
+            break
+    return upto
+
+def _summary_request(summary: str, folded: List[BaseMessage]) -> List[BaseMessage]:
+    lines = [f"{getattr(m, 'type', 'message')}: {m.content}" for m in folded if isinstance(m.content, str) and m.content]
+    return [SUMMARY_SYS, HumanMessage(content=(
+        f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n" + "\n".join(lines)
+    ))]
+
+# Context node: fold turns that left the window into the summary (only on roll-over)
+def update_context(state: ConversationState) -> Dict[str, Any]:
+    messages = state["messages"]
+    summarised = min(state.get("summarised", 0), len(messages))
+    upto = _fold_upto(messages, summarised)
+    if upto == summarised:
+        return {}
+    resp = _summary_llm().invoke(_summary_request(state.get("summary", ""), messages[summarised:upto]))
+    print(f"[context] folded {upto - summarised} messages into the summary")
+    return {"summary": resp.content.strip(), "summarised": upto}
+
+async def aupdate_context(state: ConversationState) -> Dict[str, Any]:
+    messages = state["messages"]
+    summarised = min(state.get("summarised", 0), len(messages))
+    upto = _fold_upto(messages, summarised)
+    if upto == summarised:
+        return {}
+    resp = await _summary_llm().ainvoke(_summary_request(state.get("summary", ""), messages[summarised:upto]))
+    print(f"[context] folded {upto - summarised} messages into the summary")
+    return {"summary": resp.content.strip(), "summarised": upto}
+
+# The history a node should send to its LLM: summary + the recent window
+def window(state: ConversationState) -> List[BaseMessage]:
+    messages = state["messages"]
+    recent = messages[min(state.get("summarised", 0), len(messages)):]
+    summary = state.get("summary", "")
+    if not summary:
+        return list(recent)
+    return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + list(recent)
+
+# per-node prompt size counters: calls, last, max, total (approximate tokens)
+PROMPT_TOKENS: Dict[str, Dict[str, int]] = {}
+_STATS_LOCK = threading.Lock()
+
+# Record the prompt a node is about to send and return it unchanged
+def track(node: str, prompt: List[Any]) -> List[Any]:
+    n = count_tokens(prompt)
+    with _STATS_LOCK:
+        st = PROMPT_TOKENS.setdefault(node, {"calls": 0, "last": 0, "max": 0, "total": 0})
+        st["calls"] += 1
+        st["last"] = n
+        st["max"] = max(st["max"], n)
+        st["total"] += n
+    print(f"[context] {node} prompt_tokens~{n}")
+    return prompt
@@ -0,0 +1,137 @@
+import os, re, json, math, threading, unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+# Labeled examples: one JSON object per line {"text", "agent", "db" (sql only)}
+DEFAULT_PATH = Path(__file__).resolve().parents[1] / "data" / "intent_examples.jsonl"
+INTENT_EXAMPLES_PATH = Path(os.getenv("INTENT_EXAMPLES_PATH", str(DEFAULT_PATH)))
+# below this confidence the caller falls back to the LLM
+INTENT_CONFIDENCE = float(os.getenv("INTENT_CONFIDENCE", "0.75"))
+
+# feature weights: whole words carry more evidence than character n-grams
+WORD_WEIGHT = 2.0
+BIGRAM_WEIGHT = 1.0
+CHAR_WEIGHT = 0.25
+# sharpness of the confidence (scores are averaged per unit of feature weight)
+TEMPERATURE = 8.0
+# inputs with less feature weight than this (a single short word) get proportionally less
+# confidence: one familiar word is not enough evidence
+MIN_EVIDENCE = 6.0
+
+# latin words/numbers, or runs of one Japanese script (hiragana, katakana, kanji)
+_TOKEN_RE = re.compile(r"[\u3040-\u309f]+|[\u30a0-\u30ff]+|[\u4e00-\u9fff]+|[^\W_\u3040-\u30ff\u4e00-\u9fff]+")
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text)
+
+def _normalise(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+# Weighted features: word unigrams/bigrams + char 3-grams, plus char 2-grams for
+# non-ASCII words (covers Japanese without a tokenizer)
+def featurise(text: str) -> Dict[str, float]:
+    t = _normalise(text)
+    feats: Dict[str, float] = defaultdict(float)
+    words = _tokens(t)
+    for w in words:
+        feats["w:" + w] += WORD_WEIGHT
+    for a, b in zip(words, words[1:]):
+        feats[f"b:{a} {b}"] += BIGRAM_WEIGHT
+    for w in words:
+        padded = f" {w} "
+        for n in ((3,) if w.isascii() else (2, 3)):
+            for i in range(len(padded) - n + 1):
+                feats[f"c:{padded[i:i + n]}"] += CHAR_WEIGHT
+    return feats
+
+class IntentClassifier:
+    """
+    Multinomial naive Bayes over weighted word and char n-gram features.
+    predict() returns (label, confidence): the posterior of the best label after
+    length-normalising the log scores, scaled by the share of the input's
+    features seen in training (so gibberish never scores as confident) and
+    by MIN_EVIDENCE for very short inputs.
+    """
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.labels: List[str] = []
+        self._prior: Dict[str, float] = {}
+        self._loglik: Dict[str, Dict[str, float]] = {}
+        self._unseen: Dict[str, float] = {}
+
+    def fit(self, texts: Iterable[str], labels: Iterable[str]) -> "IntentClassifier":
+        counts: Dict[str, Counter] = defaultdict(Counter)
+        docs = Counter()
+        for text, label in zip(texts, labels):
+            docs[label] += 1
+            counts[label].update(featurise(text))
+        vocab = set().union(*counts.values()) if counts else set()
+        total_docs = sum(docs.values())
+        self.labels = sorted(docs)
+        for label in self.labels:
+            total = sum(counts[label].values()) + self.alpha * (len(vocab) + 1)
+            self._prior[label] = math.log(docs[label] / total_docs)
+            self._loglik[label] = {f: math.log((c + self.alpha) / total) for f, c in counts[label].items()}
+            self._unseen[label] = math.log(self.alpha / total)
+        self._vocab = vocab
+        return self
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        all_feats = featurise(text)
+        feats = {f: w for f, w in all_feats.items() if f in self._vocab}
+        weight = sum(feats.values())
+        if not self.labels:
+            return "", 0.0
+        if not weight: # nothing we have seen before: no evidence either way
+            return self.labels[0], 0.0
+        scores = {}
+        for label in self.labels:
+            ll = self._loglik[label]
+            unseen = self._unseen[label]
+            s = sum(w * ll.get(f, unseen) for f, w in feats.items())
+            scores[label] = self._prior[label] / weight + s / weight
+        best = max(scores, key=scores.get)
+        z = sum(math.exp(TEMPERATURE * (v - scores[best])) for v in scores.values())
+        total = sum(all_feats.values())
+        coverage = math.sqrt(weight / total) * min(1.0, total / MIN_EVIDENCE)
+        return best, coverage / z
+
+def load_examples(path: Path = INTENT_EXAMPLES_PATH) -> List[Dict[str, str]]:
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# trained models, built once on first use
+_MODELS: Dict[str, IntentClassifier] = {}
+_LOCK = threading.Lock()
+
+def _model(kind: str) -> IntentClassifier:
+    model = _MODELS.get(kind)
+    if model is None:
+        with _LOCK:
+            if not _MODELS:
+                examples = load_examples()
+                _MODELS["agent"] = IntentClassifier().fit(
+                    [e["text"] for e in examples], [e["agent"] for e in examples]
+                )
+                sql = [e for e in examples if e.get("db")]
+                _MODELS["db"] = IntentClassifier().fit([e["text"] for e in sql], [e["db"] for e in sql])
+                print(f"[intent] trained on {len(examples)} examples from {INTENT_EXAMPLES_PATH}")
+            model = _MODELS[kind]
+    return model
+
+# 'book' | 'weather' | 'sql' with confidence
+def classify_agent(text: str) -> Tuple[str, float]:
+    return _model("agent").predict(text)
+
+# clause boundaries in compound questions ("weather in X, and how many ...")
+_CLAUSE_RE = re.compile(r"\s*(?:[,;?!]|\b(?:and|also|plus|then)\b)\s*", re.I)
+
+# (clause, agent, confidence) for each clause of two or more words
+def classify_agent_clauses(text: str) -> List[Tuple[str, str, float]]:
+    clauses = [c for c in _CLAUSE_RE.split(text) if len(c.split()) >= 2]
+    return [(c, *classify_agent(c)) for c in clauses]
+
+# 'titanic' | 'happiness' | 'lego' with confidence
+def classify_db(text: str) -> Tuple[str, float]:
+    return _model("db").predict(text)
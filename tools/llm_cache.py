@@ -0,0 +1,204 @@
+"""
+Persistent response cache in front of every chat model from llm_registry.
+
+LangChain computes the key inputs: the serialised model (name, temperature, ...)
+plus call parameters, including bound tools, and the prompt messages with their
+ids removed. Entries live in one SQLite file (WAL) shared by all worker
+processes and are evicted least-recently-used once the file's payload exceeds
+LLM_CACHE_MAX_MB.
+
+    python -m tools.llm_cache            # entries and size on disk
+    python -m tools.llm_cache --clear
+"""
+import os, json, time, uuid, sqlite3, hashlib, argparse, threading, contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from langchain_core.caches import BaseCache
+from langchain_core.messages import AIMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+from tools import tracing
+
+# cache settings
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(Path(__file__).resolve().parents[1] / ".cache" / "llm_cache.db"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))    # LRU bound on stored payload
+# 1 = skip lookups but still store fresh responses (debugging / refreshing entries)
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+# recency updates on hits are skipped when the entry was used this recently (saves a write per hit)
+_TOUCH_SECONDS = 60
+
+_BYPASS: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+# Skip cache lookups for the calls made inside this block
+@contextmanager
+def bypass():
+    token = _BYPASS.set(True)
+    try:
+        yield
+    finally:
+        _BYPASS.reset(token)
+
+class SQLiteLRUCache(BaseCache):
+    """
+    LangChain cache backed by SQLite: key -> serialised generations, with the
+    payload size and last use of each entry for LRU eviction.
+    """
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache (used_at, size)") # covers the size total and eviction scan
+
+    # short-lived connection: commits on success, always closed
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL") # concurrent readers across processes
+            conn.execute("PRAGMA synchronous=NORMAL") # a lost entry after a power cut is just a miss
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def _count(self, result: str) -> None:
+        with self._lock:
+            if result == "hit":
+                self.hits += 1
+            else:
+                self.misses += 1
+        tracing.event("cache", "llm", result=result)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[List[Generation]]:
+        if LLM_CACHE_BYPASS or _BYPASS.get():
+            self._count("bypass")
+            return None
+        key = self._key(prompt, llm_string)
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value, used_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                now = time.time()
+                if row is not None and now - row[1] > _TOUCH_SECONDS:
+                    conn.execute("UPDATE llm_cache SET used_at = ? WHERE key = ?", (now, key))
+        except (OSError, sqlite3.Error) as e:
+            print(f"[llm_cache] read failed: {e}")
+            row = None
+        if row is None:
+            self._count("miss")
+            return None
+        self._count("hit")
+        return _decode(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: List[Generation]) -> None:
+        value = _encode(return_val)
+        if value is None:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                    (self._key(prompt, llm_string), value, len(value), now, now),
+                )
+                # keep the most recently used entries that fit in max_bytes
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+                if total > self.max_bytes:
+                    conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN ("
+                        " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY used_at DESC, key) AS kept FROM llm_cache)"
+                        " WHERE kept > ?)",
+                        (self.max_bytes,),
+                    )
+            with self._lock:
+                self.writes += 1
+        except (OSError, sqlite3.Error) as e:
+            print(f"[llm_cache] write failed: {e}")
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "entries": entries,
+                "bytes": size, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+# generations -> JSON; None when something in them can't be stored
+def _encode(generations: List[Generation]) -> Optional[str]:
+    out = []
+    for g in generations:
+        if not isinstance(g, ChatGeneration):
+            return None
+        out.append({"message": message_to_dict(g.message), "info": g.generation_info})
+    return json.dumps(out, ensure_ascii=False)
+
+# JSON -> generations with fresh message / tool call ids (a replayed message must not
+# replace an earlier one in the graph state or reuse a tool call id from history)
+# and no token usage
+def _decode(value: str) -> List[Generation]:
+    items = json.loads(value)
+    messages = messages_from_dict([i["message"] for i in items])
+    generations = []
+    for item, msg in zip(items, messages):
+        msg.id = None
+        if isinstance(msg, AIMessage):
+            msg.usage_metadata = None # a hit spends no tokens
+        if isinstance(msg, AIMessage) and msg.tool_calls:
+            ids = {}
+            for tc in msg.tool_calls:
+                fresh = f"call_{uuid.uuid4().hex[:24]}"
+                ids[tc["id"]] = fresh
+                tc["id"] = fresh
+            for raw in msg.additional_kwargs.get("tool_calls", []):
+                raw["id"] = ids.get(raw.get("id"), raw.get("id"))
+        generations.append(ChatGeneration(message=msg, generation_info=item["info"]))
+    return generations
+
+_CACHE: SQLiteLRUCache | None = None
+_CACHE_FAILED = False
+_CACHE_LOCK = threading.Lock()
+
+# The process-wide cache, or None with LLM_CACHE=0 or when the file can't be created
+def get_cache() -> Optional[SQLiteLRUCache]:
+    global _CACHE, _CACHE_FAILED
+    if not LLM_CACHE_ENABLED or _CACHE_FAILED:
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None and not _CACHE_FAILED:
+                try:
+                    _CACHE = SQLiteLRUCache(LLM_CACHE_PATH, int(LLM_CACHE_MAX_MB * 1024 * 1024))
+                except (OSError, sqlite3.Error) as e: # e.g. read-only app directory: run without the cache
+                    print(f"[llm_cache] cache disabled, cannot open {LLM_CACHE_PATH}: {e}")
+                    _CACHE_FAILED = True
+    return _CACHE
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Inspect or clear the LLM response cache")
+    ap.add_argument("--clear", action="store_true", help="delete every entry")
+    args = ap.parse_args(argv)
+    cache = SQLiteLRUCache(LLM_CACHE_PATH, int(LLM_CACHE_MAX_MB * 1024 * 1024))
+    if args.clear:
+        cache.clear()
+    s = cache.stats()
+    print(f"{LLM_CACHE_PATH}: {s['entries']} entries, {s['bytes'] / 1024 / 1024:.1f} MB of {LLM_CACHE_MAX_MB:g} MB")
+
+if __name__ == "__main__":
+    main()
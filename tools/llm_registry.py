@@ -0,0 +1,49 @@
+"""
+Shared chat model clients, created on first use.
+
+Agents ask the registry for a model instead of constructing their own
+ChatOpenAI, so importing an agent does not import langchain_openai / openai, and
+every caller with the same settings gets the same client. langchain_openai keeps
+one pooled httpx client per base URL, so all of them share keep-alive connections.
+Each client answers repeated calls from the persistent response cache
+(tools/llm_cache.py) unless LLM_CACHE=0.
+"""
+import threading
+from typing import Any, Dict, Tuple
+
+_ENV_LOADED = False
+_CLIENTS: Dict[Tuple, Any] = {}
+_LOCK = threading.Lock()
+_RATE_LIMITER = None # tools.llm_scheduler.RateLimiter shared by every client, if set
+
+# read .env once per process; every entry point and agent module calls this
+def load_env() -> None:
+    global _ENV_LOADED
+    if _ENV_LOADED:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _ENV_LOADED = True
+
+# the shared client for these settings
+def get(model: str = "gpt-4.1-mini", temperature: float = 0, stream_usage: bool = False):
+    key = (model, temperature, stream_usage)
+    client = _CLIENTS.get(key)
+    if client is None:
+        with _LOCK:
+            client = _CLIENTS.get(key)
+            if client is None:
+                load_env()
+                from langchain_openai import ChatOpenAI # ~1 s of imports, paid on first use only
+                from tools import llm_cache
+                client = _CLIENTS[key] = ChatOpenAI(model=model, temperature=temperature, stream_usage=stream_usage,
+                                                    cache=llm_cache.get_cache(), rate_limiter=_RATE_LIMITER)
+    return client
+
+# Put one request / token budget on every client, present and future (None removes it)
+def set_rate_limiter(limiter) -> None:
+    global _RATE_LIMITER
+    with _LOCK:
+        _RATE_LIMITER = limiter
+        for client in _CLIENTS.values():
+            client.rate_limiter = limiter
@@ -0,0 +1,157 @@
+"""
+Process-wide request / token budget for chat model calls.
+
+RateLimiter plugs into LangChain's `rate_limiter` hook (llm_registry.set_rate_limiter
+puts it on every shared client), so it is consulted after the response cache:
+cache hits cost no budget. Both budgets are token buckets refilled continuously
+at limit/60 per second; they start empty, and the granted calls of the last 60
+seconds are kept so no 60-second window holds more than rpm calls, even after an
+idle spell refilled the burst. The token cost of a call is not known before it runs,
+so each call reserves the running average and UsageHandler settles the
+difference from the reported usage when it ends. A 429 pauses every caller
+for the backoff delay instead of letting them all hit the limit again.
+"""
+import time, random, asyncio, threading
+from collections import deque
+from typing import Any, Dict
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+# at most this many seconds of budget can be spent in one burst (providers enforce
+# per-minute limits over shorter windows too)
+_BURST_SECONDS = 1
+_RETRYABLE = {"RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError"}
+
+class RateLimiter(BaseRateLimiter):
+    """Requests-per-minute and tokens-per-minute buckets shared by all callers (0 = no limit)."""
+    def __init__(self, rpm: float = 0, tpm: float = 0, token_estimate: float = 1000):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.estimate = token_estimate # running average of tokens per call
+        self._request_burst = max(1.0, rpm * _BURST_SECONDS / 60)
+        self._token_burst = tpm * _BURST_SECONDS / 60
+        # empty at start: a full bucket let the first minute take rpm + one burst
+        self._requests = self._tokens = 0.0
+        self._window: deque = deque() # grant times within the last 60 s (rpm only)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.waited = 0.0 # seconds callers spent waiting for budget
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self._request_burst, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self._token_burst, self._tokens + elapsed * self.tpm / 60)
+
+    # take budget for one call; returns 0 when granted, else the seconds to wait before asking again
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+            wait = 0.0
+            if self.rpm and self._requests < 1:
+                wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if self.rpm and len(self._window) >= max(1, int(self.rpm)):
+                wait = max(wait, self._window[0] + 60 - now)
+            # a call never needs more than one burst, or a large estimate could wait forever
+            need = min(self.estimate, self._token_burst)
+            if self.tpm and self._tokens < need:
+                wait = max(wait, (need - self._tokens) * 60 / self.tpm)
+            if wait:
+                return wait
+            if self.rpm:
+                self._requests -= 1
+                self._window.append(now)
+            if self.tpm:
+                self._tokens -= self.estimate
+            self.granted += 1
+            return 0.0
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        while (wait := self._reserve()) > 0:
+            if not blocking:
+                return False
+            self.waited += wait
+            time.sleep(wait)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        while (wait := self._reserve()) > 0:
+            if not blocking:
+                return False
+            self.waited += wait
+            await asyncio.sleep(wait)
+        return True
+
+    # a call finished: charge the tokens it used beyond (or below) its reservation
+    def settle(self, tokens: int) -> None:
+        with self._lock:
+            if self.tpm:
+                self._tokens -= tokens - self.estimate
+            self.estimate = 0.8 * self.estimate + 0.2 * tokens
+
+    # stop granting calls for `seconds` (after a 429)
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"granted": self.granted, "waited_seconds": round(self.waited, 2), "token_estimate": round(self.estimate)}
+
+def is_rate_limit(error: BaseException) -> bool:
+    return type(error).__name__ == "RateLimitError" or getattr(error, "status_code", None) == 429
+
+# errors worth retrying the turn for: rate limits, timeouts, connection drops, 5xx
+def is_retryable(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None)
+    return type(error).__name__ in _RETRYABLE or status == 429 or (isinstance(status, int) and status >= 500)
+
+# exponential backoff with jitter; honours the server's Retry-After when there is one
+def backoff_delay(attempt: int, error: BaseException | None = None, base: float = 1.0, cap: float = 60.0) -> float:
+    response = getattr(error, "response", None)
+    retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        floor = float(retry_after) if retry_after else 0.0
+    except ValueError:
+        floor = 0.0
+    delay = min(cap, base * 2 ** attempt)
+    return max(floor, random.uniform(delay / 2, delay))
+
+class UsageHandler(BaseCallbackHandler):
+    """Per-conversation LLM calls, tokens and rate-limit errors; settles token use with the limiter."""
+    run_inline = True
+
+    def __init__(self, limiter: RateLimiter | None = None):
+        self.limiter = limiter
+        self.llm_calls = 0
+        self.tokens = 0
+        self.rate_limited: BaseException | None = None
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        tokens = 0
+        for gens in response.generations or []:
+            for g in gens:
+                usage = getattr(getattr(g, "message", None), "usage_metadata", None) or {}
+                tokens += usage.get("total_tokens", 0)
+        with self._lock:
+            self.tokens += tokens
+        if self.limiter is not None and tokens:
+            self.limiter.settle(tokens)
+
+    # a 429 the agent may have swallowed: remember it so the turn is retried
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        if is_rate_limit(error):
+            self.rate_limited = error
@@ -1,16 +1,40 @@
 import os
+import asyncio
+import threading
+import contextvars
 from typing import Dict, Any
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits import create_sql_agent
+from langchain_community.agent_toolkits.sql.prompt import SQL_PREFIX
+from tools import sql_schema
+from tools import sql_cache
+from tools import intent_classifier
+from tools import tracing
+from tools import sql_sqlite
+from tools import sql_governor
+from tools import sql_templates
+from tools import llm_registry
 
-load_dotenv()
+llm_registry.load_env()
 
-# LLM
-CLF_LLM = ChatOpenAI(model="gpt-4.1-mini", temperature=0)       # for routing
-SQL_LLM = ChatOpenAI(model="gpt-4.1-mini", temperature=0)       # for SQL agent
+# LLM (set on first use; benches assign a fake)
+CLF_LLM = None # for routing
+SQL_LLM = None # for SQL agent
+
+def _clf_llm():
+    global CLF_LLM
+    if CLF_LLM is None:
+        CLF_LLM = llm_registry.get("gpt-4.1-mini")
+    return CLF_LLM
+
+def _sql_llm():
+    global SQL_LLM
+    if SQL_LLM is None:
+        SQL_LLM = llm_registry.get("gpt-4.1-mini")
+    return SQL_LLM
 
 # System prompt for the agent
 CLASSIFIER_SYS = SystemMessage(content=(
@@ -19,11 +43,19 @@ CLASSIFIER_SYS = SystemMessage(content=(
     "Pick the most plausible based on wording. Respond with ONLY the one word."
 ))
 
-# classify titanic or hapinness
-def _classify_db(question: str) -> str: # question = user query
-    """Return 'titanic', 'happiness' or 'lego'."""
-    resp = CLF_LLM.invoke([CLASSIFIER_SYS, HumanMessage(content=question)]) # pass system prompt + user question to LLM
-    label = resp.content.strip().lower() # get response text from LLM and normalise 
+# local classifier verdict, or None when the LLM has to decide
+def _classify_local(question: str) -> str | None:
+    label, conf = intent_classifier.classify_db(question)
+    if conf >= intent_classifier.INTENT_CONFIDENCE:
+        print("[sql_agent]", label, f"(local, confidence={conf:.2f})")
+        tracing.event("classify", "db", source="local", label=label, confidence=round(conf, 3))
+        return label
+    tracing.event("classify", "db", source="llm", confidence=round(conf, 3))
+    return None
+
+# normalise the LLM classifier reply
+def _parse_db_label(content: str, question: str) -> str:
+    label = content.strip().lower() # get response text from LLM and normalise 
     print("[sql_agent]", label)
     if label not in {"titanic", "happiness", "lego"}:
         if "lego" in question.lower():
@@ -32,6 +64,22 @@ def _classify_db(question: str) -> str: # question = user query
             label = "happiness"
     return label
 
+# classify titanic or hapinness
+def _classify_db(question: str) -> str: # question = user query
+    """Return 'titanic', 'happiness' or 'lego'."""
+    label = _classify_local(question) # local model first
+    if label:
+        return label
+    resp = _clf_llm().invoke([CLASSIFIER_SYS, HumanMessage(content=question)]) # pass system prompt + user question to LLM
+    return _parse_db_label(resp.content, question)
+
+async def _aclassify_db(question: str) -> str:
+    label = _classify_local(question)
+    if label:
+        return label
+    resp = await _clf_llm().ainvoke([CLASSIFIER_SYS, HumanMessage(content=question)])
+    return _parse_db_label(resp.content, question)
+
 # get the correct DB URI from .env
 def _get_db_uri(label: str) -> str:
     env_map = {
@@ -45,51 +93,294 @@ def _get_db_uri(label: str) -> str:
         raise RuntimeError(f"Missing DB URI for '{label}'. Set {env_key} in .env")
     return uri
 
-# load the SQLDatabase
+# tables exposed to the agent for each database
+_INCLUDE_TABLES = {
+    "happiness": ["happiness_2019"],
+    "titanic": ["passenger"],
+    "lego": ["lego_sets", "lego_themes", "lego_colors", "lego_parts", "lego_part_categories", "lego_inventory_sets", "lego_inventory_parts"],
+}
+
+# connection pool settings (shared by every engine in the registry)
+POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("SQL_POOL_MAX_OVERFLOW", "5"))
+POOL_RECYCLE = int(os.getenv("SQL_POOL_RECYCLE", "1800"))   # seconds before a connection is replaced
+POOL_PRE_PING = os.getenv("SQL_POOL_PRE_PING", "1") != "0"  # check liveness on checkout
+
+# process-wide registry: one pooled engine + reflected SQLDatabase per label
+_ENGINES: Dict[str, Engine] = {}
+_SQLDBS: Dict[str, SQLDatabase] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+# per-run count of SQL statements sent to the DB (used for run stats); a context
+# variable so the count follows tool calls the async agent runs on executor threads
+_QUERY_COUNTER: contextvars.ContextVar[list | None] = contextvars.ContextVar("sql_query_counter", default=None)
+
+def _count_query(*_args, **_kwargs) -> None:
+    counter = _QUERY_COUNTER.get()
+    if counter is not None:
+        counter[0] += 1
+
+# 'postgres' = DB URIs from .env, 'sqlite' = embedded read-only files (see tools/sql_sqlite.py)
+SQL_BACKEND = os.getenv("SQL_BACKEND", "postgres").strip().lower()
+
+# create a pooled engine for the label
+def _create_engine(label: str) -> Engine:
+    if SQL_BACKEND == "sqlite":
+        engine = sql_sqlite.create_sqlite_engine(label, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW)
+    else:
+        engine = create_engine(
+            _get_db_uri(label),
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=POOL_PRE_PING,
+        )
+    event.listen(engine, "before_cursor_execute", _count_query)
+    tracing.instrument_engine(engine, label)
+    return engine
+
+# load the SQLDatabase (reflects the schema once per engine); its run() is row-capped
+# and time-limited, see tools/sql_governor.py
 def _load_sqldb(which: str) -> SQLDatabase:
-    uri = _get_db_uri(which)
-    include = None
-    if which == "happiness":
-        include = ["happiness_2019"] 
-    elif which == "titanic":
-        include = ["passenger"]        
-    elif which == "lego":
-        include = ["lego_sets", "lego_themes", "lego_colors", "lego_parts", "lego_part_categories", "lego_inventory_sets", "lego_inventory_parts"]
-    return SQLDatabase.from_uri(
-        uri,
+    engine = _ENGINES.get(which)
+    if engine is None:
+        engine = _ENGINES[which] = _create_engine(which)
+    return sql_governor.GovernedSQLDatabase(
+        engine,
         sample_rows_in_table_info=3,
-        include_tables=include
+        include_tables=_INCLUDE_TABLES.get(which)
     )
 
+# get the shared SQLDatabase for the label, building it on first use
+def get_sqldb(label: str) -> SQLDatabase:
+    db = _SQLDBS.get(label)
+    if db is not None:
+        return db
+    with _REGISTRY_LOCK: # only one session reflects the schema
+        db = _SQLDBS.get(label)
+        if db is None:
+            db = _SQLDBS[label] = _load_sqldb(label)
+            print(f"[sql_agent] registered engine for {label}")
+    return db
+
+# build engines for every configured DB at startup; returns label -> error for failures
+def warm_up(labels=None) -> Dict[str, str]:
+    errors = {}
+    for label in labels or _INCLUDE_TABLES:
+        try:
+            get_sqldb(label)
+        except Exception as e: # a missing DB must not stop the app from starting
+            errors[label] = str(e)
+            print(f"[sql_agent] warm-up failed for {label}: {e}")
+    return errors
+
+# drop all engines and their pooled connections (e.g. after a DB reload)
+def dispose_all() -> None:
+    with _REGISTRY_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+        _SQLDBS.clear()
+        _SUMMARY_TABLES.clear()
+
 STRICT_PREFIX = (
     "You must answer ONLY by generating and running SQL on the connected database. "
     "Do not use general knowledge. If the schema does not support the question, "
     "reply EXACTLY with: NO_DB_ANSWER."
 )
 
-# run the SQL agent with retries
-def _run_sql_agent(question: str, db: SQLDatabase) -> str:
-    agent = create_sql_agent(
-        llm=SQL_LLM,
+# inject the cached schema snapshot into the agent prompt (set SQL_SCHEMA_SNAPSHOT=0 to disable)
+USE_SCHEMA_SNAPSHOT = os.getenv("SQL_SCHEMA_SNAPSHOT", "1") != "0"
+
+SNAPSHOT_SUFFIX = (
+    "I already have the tables, schema, sample rows and column statistics above. "
+    "I should write the query directly and only call sql_db_list_tables or sql_db_schema "
+    "if a table or column I need is missing."
+)
+
+# tools the agent uses to discover the schema (skipped when the snapshot is injected)
+_SCHEMA_TOOLS = {"sql_db_list_tables", "sql_db_schema"}
+
+# stats of the most recent agent run in this process
+LAST_RUN_STATS: Dict[str, Any] = {}
+
+# build the prompt prefix; braces in the snapshot are escaped for prefix.format()
+def _agent_prefix(label: str, db: SQLDatabase) -> str | None:
+    if not USE_SCHEMA_SNAPSHOT:
+        return None
+    try:
+        snap = sql_schema.get_snapshot(label, db)
+    except Exception as e: # fall back to the agent discovering the schema itself
+        print(f"[sql_agent] schema snapshot unavailable for {label}: {e}")
+        return None
+    schema = sql_schema.render_snapshot(snap).replace("{", "{{").replace("}", "}}")
+    return (
+        f"{SQL_PREFIX}\n"
+        f"The database schema (DDL with sample rows) is:\n\n{schema}\n"
+    )
+
+# count agent iterations and schema-discovery calls in one agent result
+def _run_stats(result: Dict[str, Any], queries: int, snapshot: bool) -> Dict[str, Any]:
+    steps = result.get("intermediate_steps") or []
+    names = [getattr(action, "tool", "") for action, _ in steps]
+    schema_calls = sum(1 for n in names if n in _SCHEMA_TOOLS)
+    return {
+        "snapshot": snapshot,
+        "iterations": len(steps) + 1, # +1 for the final answer turn
+        "schema_tool_calls": schema_calls, # compare against SQL_SCHEMA_SNAPSHOT=0: bench/bench_schema_snapshot.py
+        "db_queries": queries,
+    }
+
+# last SQL statement the agent executed and its raw result ("" if none)
+def _last_query(result: Dict[str, Any]) -> tuple:
+    for action, observation in reversed(result.get("intermediate_steps") or []):
+        if getattr(action, "tool", "") == "sql_db_query":
+            tool_input = action.tool_input
+            sql = tool_input.get("query", "") if isinstance(tool_input, dict) else str(tool_input)
+            return sql, str(observation)
+    return "", ""
+
+# build the SQL agent executor for a DB (prefix is None without a snapshot)
+def _build_agent(db: SQLDatabase, prefix: str | None):
+    return create_sql_agent(
+        llm=_sql_llm(),
         db=db,
         agent_type="openai-tools", 
         verbose=True, # show reasoning steps
         top_k=5, # use top 5 relevant tables
         use_query_checker=True, # enable SQL query checking
+        prefix=prefix,
+        suffix=SNAPSHOT_SUFFIX if prefix else None,
+        agent_executor_kwargs={"return_intermediate_steps": True},
+    )
+
+# second attempt when the agent returned nothing
+def _retry_question(question: str) -> str:
+    return (
+        f"{question}\n\n"
+        "IMPORTANT: Use ONLY the SQL tool and return the query result. "
+        "Do NOT rely on general knowledge."
     )
+
+# record run stats and unpack the agent result into (answer, sql, rows)
+def _finish_run(result: Dict[str, Any], out: str, queries: int, snapshot: bool) -> tuple:
+    stats = _run_stats(result, queries, snapshot)
+    tracing.event("sql_agent", "run", **stats)
+    LAST_RUN_STATS.clear()
+    LAST_RUN_STATS.update(stats)
+    print(f"[sql_agent] run stats {stats}")
+    sql, rows = _last_query(result)
+    return out or "No result returned from database.", sql, rows
+
+# run the SQL agent with retries; returns (answer, sql, rows)
+def _run_sql_agent(question: str, db: SQLDatabase, label: str = "") -> tuple:
+    prefix = _agent_prefix(label, db) if label else None
+    agent = _build_agent(db, prefix)
+    counter = [0]
+    _QUERY_COUNTER.set(counter)
     # First attempt
     result = agent.invoke({"input": question}) 
     out = (result.get("output") or "").strip()
-    if out:
-        return out
-    retry_q = (
-            f"{question}\n\n"
-            "IMPORTANT: Use ONLY the SQL tool and return the query result. "
-            "Do NOT rely on general knowledge."
-        )
-    result = agent.invoke({"input": retry_q})
+    if not out:
+        tracing.event("sql_agent", "retry")
+        result = agent.invoke({"input": _retry_question(question)})
+        out = (result.get("output") or "").strip()
+    return _finish_run(result, out, counter[0], prefix is not None)
+
+# async variant: LLM calls are awaited, the sync SQL tools run on executor threads
+async def _arun_sql_agent(question: str, db: SQLDatabase, label: str = "") -> tuple:
+    prefix = await asyncio.to_thread(_agent_prefix, label, db) if label else None
+    agent = _build_agent(db, prefix)
+    counter = [0]
+    _QUERY_COUNTER.set(counter)
+    result = await agent.ainvoke({"input": question})
     out = (result.get("output") or "").strip()
-    return out or "No result returned from database."
+    if not out:
+        tracing.event("sql_agent", "retry")
+        result = await agent.ainvoke({"input": _retry_question(question)})
+        out = (result.get("output") or "").strip()
+    return _finish_run(result, out, counter[0], prefix is not None)
+
+# question -> SQL/rows/answer cache in front of the agent loop
+QUERY_CACHE = sql_cache.QueryCache(
+    max_entries=sql_cache.SQL_CACHE_MAX_ENTRIES,
+    ttl=sql_cache.SQL_CACHE_TTL,
+    path=sql_cache.SQL_CACHE_PATH,
+)
+
+# answer a repeated question to the same DB from the cache; returns the answer or None
+def _cached_answer(question: str, label: str) -> str | None:
+    if not sql_cache.SQL_CACHE_ENABLED:
+        return None
+    entry = QUERY_CACHE.get(question, label)
+    if entry is None:
+        tracing.event("cache", "sql_answer", result="miss")
+        return None
+    if sql_cache.SQL_CACHE_MODE == "rerun": # only re-execute the stored SQL, no LLM
+        try:
+            rows = get_sqldb(label).run_no_throw(entry["sql"])
+        except Exception as e:
+            print(f"[sql_agent] cached SQL failed: {e}")
+            rows = None
+        if rows != entry["rows"]: # data changed: let the agent answer again
+            QUERY_CACHE.invalidate(question, label)
+            tracing.event("cache", "sql_answer", result="stale")
+            return None
+    print(f"[sql_agent] cache hit target_db={label}")
+    tracing.event("cache", "sql_answer", result="hit")
+    return entry["answer"]
+
+# summary tables found in each database (checked once per engine)
+_SUMMARY_TABLES: Dict[str, set] = {}
+
+def _has_summaries(label: str, names) -> bool:
+    present = _SUMMARY_TABLES.get(label)
+    if present is None:
+        insp = inspect(_ENGINES[label])
+        present = _SUMMARY_TABLES[label] = {n for n in sql_templates.SUMMARIES.get(label, {}) if insp.has_table(n)}
+    return all(n in present for n in names)
+
+# answer a known question shape with its vetted SQL template (one query, no LLM);
+# returns (label, answer) or None to fall through to the agent
+def _template_answer(question: str) -> tuple | None:
+    if not sql_templates.SQL_TEMPLATES_ENABLED:
+        return None
+    hit = sql_templates.match(question)
+    answer = None
+    if hit is not None:
+        template, slots = hit
+        try:
+            db = get_sqldb(template.label)
+            summary = sql_templates.SQL_TEMPLATE_SUMMARIES and template.summaries and _has_summaries(template.label, template.summaries)
+            _, rows = db.fetch(template.summary_sql if summary else template.sql, slots)
+            if rows: # no rows: an unknown country / theme
+                answer = template.answer(rows, slots)
+        except Exception as e: # the agent can still answer
+            print(f"[sql_agent] template {template.name} failed: {e}")
+    if answer is None:
+        sql_templates.record(None)
+        tracing.event("cache", "sql_template", result="miss")
+        return None
+    sql_templates.record(template.name)
+    tracing.event("cache", "sql_template", result="hit", template=template.name)
+    print(f"[sql_agent] template {template.name} {slots} target_db={template.label} "
+          f"(hit rate {sql_templates.hit_rate():.0%})")
+    return template.label, answer
+
+# only cache answers that came from a real query that succeeded (the SQL tool reports
+# failures as an "Error: ..." observation)
+def _cacheable(answer: str, sql: str, rows: str) -> bool:
+    return (bool(sql) and not rows.lstrip().startswith("Error:")
+            and answer != "No result returned from database." and "NO_DB_ANSWER" not in answer)
+
+# Pull the latest user query (fallback to empty string)
+def _latest_question(state) -> str:
+    for m in reversed(state.get("messages", [])): # pick up the latest HumanMessage
+        if isinstance(m, HumanMessage):
+            return m.content
+        if hasattr(m, "type") and m.type == "human" and hasattr(m, "content"): # support dict-like messages
+            return m.content
+    return ""
 
 # LangGraph Node function
 def sql_graph(state) -> Dict[str, Any]:
@@ -98,23 +389,61 @@ def sql_graph(state) -> Dict[str, Any]:
     Reads the latest user message, routes to the correct DB, runs the SQL agent,
     and returns an AIMessage that the coordinator's 'finalise' node will read.
     """
-    # Pull the latest user query (fallback to empty string)
-    user_msg = ""
-    for m in reversed(state.get("messages", [])): # pick up the latest HumanMessage
-        if isinstance(m, HumanMessage):
-            user_msg = m.content
-            break
-        if hasattr(m, "type") and m.type == "human" and hasattr(m, "content"): # support dict-like messages
-            user_msg = m.content
-            break
+    user_msg = _latest_question(state)
     if not user_msg:
         return {"messages": [AIMessage(content="I didn’t receive a question.")]}
     # MAIN LOGIC
+    templated = _template_answer(user_msg)
+    if templated:
+        label, answer = templated
+        return {"messages": [AIMessage(content=f"[database: {label}]\n{answer}")]}
     label = _classify_db(user_msg)
     print(f"[sql_agent] target_db={label}")
+    cached = _cached_answer(user_msg, label)
+    if cached:
+        return {"messages": [AIMessage(content=f"[database: {label}]\n{cached}")]}
+    try:
+        db = get_sqldb(label)
+        answer, sql, rows = _run_sql_agent(user_msg, db, label)
+        if sql_cache.SQL_CACHE_ENABLED and _cacheable(answer, sql, rows):
+            QUERY_CACHE.put(user_msg, label, sql, rows, answer)
+        prefix = f"[database: {label}]\n"
+        return {"messages": [AIMessage(content=prefix + answer)]}
+    except Exception as e:
+        return {"messages": [AIMessage(content=f"SQL agent error: {e}")]}
+
+# async node for the 'sql' step (used when the coordinator runs through ainvoke/astream).
+# SQLDatabase is sync-only, so cache lookups and DB work go to executor threads.
+# If the turn is abandoned (task cancelled) the statements still running on those
+# threads are cancelled too.
+async def asql_graph(state) -> Dict[str, Any]:
+    scope = sql_governor.CancelScope()
+    sql_governor.bind(scope)
+    try:
+        return await _asql_turn(state)
+    except asyncio.CancelledError:
+        scope.cancel()
+        print("[sql_agent] turn abandoned, cancelled running queries")
+        raise
+
+async def _asql_turn(state) -> Dict[str, Any]:
+    user_msg = _latest_question(state)
+    if not user_msg:
+        return {"messages": [AIMessage(content="I didn’t receive a question.")]}
+    templated = await asyncio.to_thread(_template_answer, user_msg)
+    if templated:
+        label, answer = templated
+        return {"messages": [AIMessage(content=f"[database: {label}]\n{answer}")]}
+    label = await _aclassify_db(user_msg)
+    print(f"[sql_agent] target_db={label}")
+    cached = await asyncio.to_thread(_cached_answer, user_msg, label)
+    if cached:
+        return {"messages": [AIMessage(content=f"[database: {label}]\n{cached}")]}
     try:
-        db = _load_sqldb(label)
-        answer = _run_sql_agent(user_msg, db)
+        db = await asyncio.to_thread(get_sqldb, label)
+        answer, sql, rows = await _arun_sql_agent(user_msg, db, label)
+        if sql_cache.SQL_CACHE_ENABLED and _cacheable(answer, sql, rows):
+            await asyncio.to_thread(QUERY_CACHE.put, user_msg, label, sql, rows, answer)
         prefix = f"[database: {label}]\n"
         return {"messages": [AIMessage(content=prefix + answer)]}
     except Exception as e:
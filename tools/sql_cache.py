@@ -0,0 +1,150 @@
+import os, re, json, time, sqlite3, threading, unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+# cache settings
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE", "1") != "0"
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "512"))   # LRU bound
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "3600"))                # seconds
+SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH", "")                         # SQLite file; empty = memory only
+# 'answer' = return the stored answer; 'rerun' = re-execute the stored SQL and
+# only reuse the answer if the rows are unchanged
+SQL_CACHE_MODE = os.getenv("SQL_CACHE_MODE", "answer")
+
+# Normalise a question so trivial variations share one cache entry
+def normalise_question(q: str) -> str:
+    q = unicodedata.normalize("NFKC", q).lower()
+    q = re.sub(r"[^\w\s]", " ", q) # drop punctuation (keeps CJK word chars)
+    return " ".join(q.split())
+
+# Cache key: the target DB plus the normalised question, so the same wording asked
+# of two databases never shares an answer
+def cache_key(question: str, label: str) -> str:
+    return f"{label}\t{normalise_question(question)}"
+
+class QueryCache:
+    """
+    LRU + TTL cache of (DB label, normalised question) -> {label, sql, rows, answer}.
+    With a path, entries are also written to SQLite so they survive restarts and
+    are shared between worker processes.
+    """
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, path: str = ""):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS sql_cache ("
+                    " question TEXT PRIMARY KEY, label TEXT NOT NULL, entry TEXT NOT NULL,"
+                    " created_at REAL NOT NULL, used_at REAL NOT NULL)"
+                )
+
+    # short-lived connection: commits on success, always closed
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL") # concurrent readers across processes
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry["created_at"] > self.ttl
+
+    # Look up a question asked of one DB; returns the entry or None
+    def get(self, question: str, label: str) -> Optional[Dict[str, Any]]:
+        key = cache_key(question, label)
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._mem[key]
+                entry = None
+            if entry is not None:
+                self._mem.move_to_end(key)
+        if entry is None and self.path:
+            entry = self._disk_get(key, now)
+            if entry is not None:
+                self._remember(key, entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    # Store the SQL, result rows and answer for a question
+    def put(self, question: str, label: str, sql: str, rows: str, answer: str) -> None:
+        key = cache_key(question, label)
+        entry = {"label": label, "sql": sql, "rows": rows, "answer": answer, "created_at": time.time()}
+        self._remember(key, entry)
+        if self.path:
+            self._disk_put(key, entry)
+
+    # Remove one question of one DB (e.g. when its rows changed) or everything
+    def invalidate(self, question: str | None = None, label: str = "") -> None:
+        key = cache_key(question, label) if question is not None else None
+        with self._lock:
+            if key is None:
+                self._mem.clear()
+            else:
+                self._mem.pop(key, None)
+        if self.path:
+            with self._connect() as conn:
+                if key is None:
+                    conn.execute("DELETE FROM sql_cache")
+                else:
+                    conn.execute("DELETE FROM sql_cache WHERE question = ?", (key,))
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._mem[key] = entry
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries: # evict least recently used
+                self._mem.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT entry, created_at FROM sql_cache WHERE question = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM sql_cache WHERE question = ?", (key,))
+                    return None
+                conn.execute("UPDATE sql_cache SET used_at = ? WHERE question = ?", (now, key))
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"[sql_cache] disk read failed: {e}")
+            return None
+
+    def _disk_put(self, key: str, entry: Dict[str, Any]) -> None:
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sql_cache (question, label, entry, created_at, used_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, entry["label"], json.dumps(entry, ensure_ascii=False), entry["created_at"], entry["created_at"]),
+                )
+                # keep the on-disk table within the same LRU bound
+                conn.execute(
+                    "DELETE FROM sql_cache WHERE rowid IN ("
+                    " SELECT rowid FROM sql_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.Error as e:
+            print(f"[sql_cache] disk write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._mem)}
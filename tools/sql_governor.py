@@ -0,0 +1,172 @@
+import os, time, threading, contextvars
+from typing import Any, Callable, Dict, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from langchain_community.utilities import SQLDatabase
+from langchain_community.utilities.sql_database import truncate_word
+
+# rows returned verbatim to the agent; larger results are summarised
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "50"))
+# rows shown in the head of a summarised result
+SQL_RESULT_HEAD = int(os.getenv("SQL_RESULT_HEAD", "10"))
+# stop reading (and report a lower bound) after this many rows
+SQL_SCAN_MAX_ROWS = int(os.getenv("SQL_SCAN_MAX_ROWS", "100000"))
+# per-statement time limit in seconds (0 = none)
+SQL_STATEMENT_TIMEOUT = float(os.getenv("SQL_STATEMENT_TIMEOUT", "15"))
+# rows per network fetch from a server-side cursor
+SQL_FETCH_BATCH = int(os.getenv("SQL_FETCH_BATCH", "1000"))
+
+class QueryAborted(SQLAlchemyError):
+    """The statement hit the timeout or its turn was abandoned."""
+
+class CancelScope:
+    """Cancellation signal for the SQL work of one turn; callbacks run on cancel()."""
+    def __init__(self):
+        self.cancelled = False
+        self._callbacks: Dict[int, Callable[[], None]] = {}
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            callbacks = list(self._callbacks.values())
+        for cb in callbacks:
+            try:
+                cb()
+            except Exception as e:
+                print(f"[sql_governor] cancel callback failed: {e}")
+
+    # run cb on cancel(); returns a function that unregisters it
+    def on_cancel(self, cb: Callable[[], None]) -> Callable[[], None]:
+        with self._lock:
+            key = self._next
+            self._next += 1
+            self._callbacks[key] = cb
+        return lambda: self._callbacks.pop(key, None)
+
+_SCOPE: contextvars.ContextVar[CancelScope | None] = contextvars.ContextVar("sql_cancel_scope", default=None)
+
+# Make `scope` current for this task; executor threads started from it inherit it
+def bind(scope: CancelScope) -> None:
+    _SCOPE.set(scope)
+
+class _ColumnStats:
+    __slots__ = ("non_null", "numeric", "lo", "hi", "total")
+
+    def __init__(self):
+        self.non_null = self.numeric = 0
+        self.lo = self.hi = None
+        self.total = 0.0
+
+    def add(self, value: Any) -> None:
+        if value is None:
+            return
+        self.non_null += 1
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.numeric += 1
+            self.total += value
+            self.lo = value if self.lo is None or value < self.lo else self.lo
+            self.hi = value if self.hi is None or value > self.hi else self.hi
+
+    def describe(self) -> str:
+        if self.numeric and self.numeric == self.non_null:
+            return f"min={self.lo:g}, max={self.hi:g}, avg={self.total / self.numeric:.4g}"
+        return f"{self.non_null} non-null"
+
+class GovernedSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase whose run() streams rows, caps what is handed to the LLM, and
+    enforces a per-statement timeout / turn cancellation. Results above
+    SQL_MAX_ROWS become a summary: row count, the first rows and per-column
+    aggregates.
+    """
+    def run(self, command, fetch="all", include_columns=False, *, parameters=None, execution_options=None):
+        if fetch != "all" or not isinstance(command, str):
+            return super().run(command, fetch, include_columns, parameters=parameters, execution_options=execution_options)
+        columns, head, n_rows, complete, stats = self._governed_fetch(command, parameters or {})
+        rows = [{c: truncate_word(v, length=self._max_string_length) for c, v in zip(columns, r)} for r in head]
+        if not include_columns:
+            rows = [tuple(r.values()) for r in rows]
+        if n_rows <= SQL_MAX_ROWS and complete:
+            return str(rows) if rows else ""
+        count = f"{n_rows}" if complete else f"more than {n_rows}"
+        summary = "; ".join(f"{c}: {s.describe()}" for c, s in zip(columns, stats))
+        return (
+            f"Result truncated: {count} rows, showing the first {len(rows)}. Columns: {', '.join(columns)}.\n"
+            f"First rows: {rows}\n"
+            f"Column summary ({'all' if complete else 'first ' + str(n_rows)} rows): {summary}\n"
+            "Use aggregation, WHERE or LIMIT to get exact values instead of listing rows."
+        )
+
+    # (columns, rows) of a small vetted query under the same timeout / cancellation rules;
+    # rows past SQL_MAX_ROWS are dropped
+    def fetch(self, command: str, parameters: Dict[str, Any] | None = None) -> Tuple[List[str], List[tuple]]:
+        columns, head, _n_rows, _complete, _stats = self._governed_fetch(command, parameters or {})
+        return columns, head
+
+    # stream the result once: keep the head, count rows, accumulate column stats
+    def _governed_fetch(self, command: str, parameters: Dict[str, Any]) -> Tuple[List[str], List[tuple], int, bool, List[_ColumnStats]]:
+        scope = _SCOPE.get()
+        deadline = time.monotonic() + SQL_STATEMENT_TIMEOUT if SQL_STATEMENT_TIMEOUT > 0 else None
+        keep = max(SQL_MAX_ROWS, SQL_RESULT_HEAD)
+        _check(scope, deadline) # an abandoned turn starts no new statements
+        with self._engine.begin() as conn:
+            raw = conn.connection.dbapi_connection
+            undo = self._arm(conn, raw, scope, deadline)
+            try:
+                result = conn.execution_options(stream_results=True, yield_per=SQL_FETCH_BATCH).execute(text(command), parameters)
+                if not result.returns_rows:
+                    return [], [], 0, True, []
+                columns = list(result.keys())
+                stats = [_ColumnStats() for _ in columns]
+                head: List[tuple] = []
+                n_rows, complete = 0, True
+                for partition in result.partitions(SQL_FETCH_BATCH):
+                    _check(scope, deadline)
+                    for row in partition:
+                        if n_rows >= SQL_SCAN_MAX_ROWS: # a row past the cap: stop, the count is a lower bound
+                            complete = False
+                            break
+                        if n_rows < keep:
+                            head.append(tuple(row))
+                        for s, v in zip(stats, row):
+                            s.add(v)
+                        n_rows += 1
+                    if not complete:
+                        break
+                result.close()
+            except SQLAlchemyError as e:
+                if scope is not None and scope.cancelled:
+                    raise QueryAborted("query cancelled: the turn was abandoned") from e
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise QueryAborted(f"query cancelled after the {SQL_STATEMENT_TIMEOUT:g}s statement timeout; "
+                                       "simplify or aggregate the query") from e
+                raise
+            finally:
+                undo()
+        if n_rows > SQL_MAX_ROWS or not complete:
+            head = head[:SQL_RESULT_HEAD]
+        return columns, head, n_rows, complete, stats
+
+    # install the timeout / cancellation hooks for this dialect; returns the cleanup function
+    def _arm(self, conn, raw, scope: CancelScope | None, deadline: float | None) -> Callable[[], None]:
+        cleanups = []
+        if self.dialect == "postgresql":
+            if deadline is not None:
+                conn.execute(text(f"SET LOCAL statement_timeout = {int(SQL_STATEMENT_TIMEOUT * 1000)}"))
+            if scope is not None and hasattr(raw, "cancel"):
+                cleanups.append(scope.on_cancel(raw.cancel)) # psycopg2: cancels the running statement server-side
+        elif self.dialect == "sqlite" and hasattr(raw, "set_progress_handler"):
+            def progress() -> int: # non-zero aborts the statement
+                return int((scope is not None and scope.cancelled) or (deadline is not None and time.monotonic() >= deadline))
+            raw.set_progress_handler(progress, 10_000)
+            cleanups.append(lambda: raw.set_progress_handler(None, 0))
+        return lambda: [c() for c in cleanups]
+
+def _check(scope: CancelScope | None, deadline: float | None) -> None:
+    if scope is not None and scope.cancelled:
+        raise QueryAborted("query cancelled: the turn was abandoned")
+    if deadline is not None and time.monotonic() >= deadline:
+        raise QueryAborted(f"query cancelled after the {SQL_STATEMENT_TIMEOUT:g}s statement timeout; "
+                           "simplify or aggregate the query")
@@ -0,0 +1,141 @@
+import os, json, time, hashlib, threading
+from pathlib import Path
+from typing import Any, Dict, List
+from sqlalchemy import inspect, select, func, distinct, table, column, text
+from langchain_community.utilities import SQLDatabase
+
+# Where snapshots are stored (data/ is mounted read-only in docker, so keep them apart)
+DEFAULT_DIR = Path(__file__).resolve().parents[1] / ".cache" / "schema"
+SCHEMA_CACHE_DIR = Path(os.getenv("SCHEMA_CACHE_DIR", str(DEFAULT_DIR)))
+# how often (seconds) the catalog fingerprint is re-checked against the live DB
+SCHEMA_RECHECK_SECONDS = float(os.getenv("SCHEMA_RECHECK_SECONDS", "60"))
+# rebuild even with an unchanged catalog after this long (sample rows / stats drift)
+SCHEMA_MAX_AGE_SECONDS = float(os.getenv("SCHEMA_MAX_AGE_SECONDS", "86400"))
+
+# label -> (snapshot dict, time of last fingerprint check)
+_SNAPSHOTS: Dict[str, tuple] = {}
+_LOCK = threading.Lock()
+
+# Hash of the column catalog for the given tables (1 query on postgres)
+def catalog_fingerprint(db: SQLDatabase, tables: List[str]) -> str:
+    engine = db._engine
+    if engine.dialect.name == "postgresql":
+        q = text(
+            "SELECT table_name, column_name, data_type, ordinal_position, is_nullable "
+            "FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = ANY(:tables) "
+            "ORDER BY table_name, ordinal_position"
+        )
+        with engine.connect() as conn:
+            rows = [tuple(r) for r in conn.execute(q, {"tables": list(tables)})]
+    else: # generic fallback through the SQLAlchemy inspector
+        insp = inspect(engine)
+        rows = []
+        for t in sorted(tables):
+            for i, c in enumerate(insp.get_columns(t)):
+                rows.append((t, c["name"], str(c["type"]), i, c.get("nullable")))
+    return hashlib.sha256(repr(rows).encode("utf-8")).hexdigest()
+
+# Short text form of a value for the stats block
+def _short(v: Any, n: int = 40) -> str:
+    s = str(v)
+    return s if len(s) <= n else s[:n] + "…"
+
+# Row count plus per-column null/distinct/min/max (1 query per table)
+def _column_stats(db: SQLDatabase, table_name: str) -> str:
+    cols = [c["name"] for c in inspect(db._engine).get_columns(table_name)]
+    t = table(table_name, *[column(c) for c in cols])
+    exprs = [func.count()]
+    for c in cols:
+        exprs += [func.count(t.c[c]), func.count(distinct(t.c[c])), func.min(t.c[c]), func.max(t.c[c])]
+    with db._engine.connect() as conn:
+        row = conn.execute(select(*exprs).select_from(t)).one()
+    total = row[0]
+    lines = [f"/* stats {table_name}: rows={total}"]
+    for i, c in enumerate(cols):
+        non_null, n_distinct, lo, hi = row[1 + 4 * i: 5 + 4 * i]
+        lines.append(
+            f"  {c}: nulls={total - non_null} distinct={n_distinct} "
+            f"range=[{_short(lo)} .. {_short(hi)}]"
+        )
+    lines.append("*/")
+    return "\n".join(lines)
+
+# Build a fresh snapshot: DDL + sample rows (from SQLDatabase) and column stats
+def build_snapshot(label: str, db: SQLDatabase, fingerprint: str) -> Dict[str, Any]:
+    tables = sorted(db.get_usable_table_names())
+    stats = []
+    for t in tables:
+        try:
+            stats.append(_column_stats(db, t))
+        except Exception as e: # stats are a hint only; keep the DDL either way
+            print(f"[sql_schema] stats failed for {t}: {e}")
+    return {
+        "label": label,
+        "fingerprint": fingerprint,
+        "created_at": time.time(),
+        "tables": tables,
+        "table_info": db.get_table_info(tables),
+        "stats": "\n\n".join(stats),
+    }
+
+def _path(label: str) -> Path:
+    return SCHEMA_CACHE_DIR / f"{label}.json"
+
+def _read(label: str) -> Dict[str, Any] | None:
+    try:
+        with _path(label).open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write(snap: Dict[str, Any]) -> None:
+    try:
+        SCHEMA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = _path(snap["label"]).with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(snap, f, ensure_ascii=False)
+        tmp.replace(_path(snap["label"])) # atomic swap so readers never see half a file
+    except OSError as e: # read-only filesystem: keep the snapshot in memory only
+        print(f"[sql_schema] could not persist snapshot for {snap['label']}: {e}")
+
+# MAIN: return a valid snapshot for the label, rebuilding when the catalog changed
+def get_snapshot(label: str, db: SQLDatabase) -> Dict[str, Any]:
+    now = time.time()
+    cached = _SNAPSHOTS.get(label)
+    if cached and now - cached[1] < SCHEMA_RECHECK_SECONDS:
+        return cached[0]
+    with _LOCK:
+        cached = _SNAPSHOTS.get(label)
+        if cached and now - cached[1] < SCHEMA_RECHECK_SECONDS:
+            return cached[0]
+        tables = sorted(db.get_usable_table_names())
+        fp = catalog_fingerprint(db, tables)
+        snap = cached[0] if cached else _read(label)
+        fresh = (
+            snap is not None
+            and snap.get("fingerprint") == fp
+            and snap.get("tables") == tables
+            and now - snap.get("created_at", 0) < SCHEMA_MAX_AGE_SECONDS
+        )
+        if not fresh:
+            print(f"[sql_schema] rebuilding snapshot for {label}")
+            snap = build_snapshot(label, db, fp)
+            _write(snap)
+        _SNAPSHOTS[label] = (snap, now)
+        return snap
+
+# Render the snapshot as a prompt block
+def render_snapshot(snap: Dict[str, Any]) -> str:
+    parts = [f"Tables: {', '.join(snap['tables'])}", snap["table_info"]]
+    if snap.get("stats"):
+        parts.append("Column statistics:\n" + snap["stats"])
+    return "\n\n".join(parts)
+
+# Forget in-memory snapshots (the next call re-checks the fingerprint)
+def invalidate(label: str | None = None) -> None:
+    with _LOCK:
+        if label is None:
+            _SNAPSHOTS.clear()
+        else:
+            _SNAPSHOTS.pop(label, None)
@@ -0,0 +1,49 @@
+import os
+from pathlib import Path
+from urllib.parse import quote
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+# directory holding the embedded databases (built by `python -m tools.sqlite_import`)
+DEFAULT_DIR = Path(__file__).resolve().parents[1] / "data"
+SQLITE_DIR = Path(os.getenv("SQLITE_DIR", str(DEFAULT_DIR)))
+SQLITE_FILES = {"titanic": "titanic.db", "happiness": "happiness_index.db", "lego": "lego.db"}
+
+# per-connection page cache (KiB) and memory-mapped I/O window (bytes)
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 << 20)))
+# immutable=1 skips all file locking and change detection; only safe while nothing rewrites the files
+SQLITE_IMMUTABLE = os.getenv("SQLITE_IMMUTABLE", "1") != "0"
+
+def sqlite_path(label: str) -> Path:
+    return SQLITE_DIR / SQLITE_FILES[label]
+
+# read-only URI for the label's file
+def sqlite_uri(label: str) -> str:
+    path = sqlite_path(label)
+    if not path.exists():
+        raise RuntimeError(f"Missing SQLite file for '{label}': {path}. Build it with `python -m tools.sqlite_import`")
+    params = "mode=ro&immutable=1" if SQLITE_IMMUTABLE else "mode=ro"
+    return f"sqlite:///file:{quote(str(path.resolve()))}?{params}&uri=true"
+
+def _tune(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    cur.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+    cur.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_BYTES}")
+    cur.execute("PRAGMA temp_store = MEMORY")
+    cur.execute("PRAGMA query_only = ON")
+    cur.close()
+
+# Engine for an embedded database: a bounded pool of tuned connections, each checked out by one
+# thread at a time (callers beyond pool_size + max_overflow wait for a free connection)
+def create_sqlite_engine(label: str, pool_size: int = 5, max_overflow: int = 5) -> Engine:
+    engine = create_engine(
+        sqlite_uri(label),
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        connect_args={"check_same_thread": False}, # a pooled connection moves between threads
+    )
+    event.listen(engine, "connect", _tune)
+    return engine
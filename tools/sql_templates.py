@@ -0,0 +1,295 @@
+"""
+Vetted, parameterised SQL for the questions the SQL agent sees most often.
+
+A question that fully matches one of a template's patterns (after
+sql_cache.normalise_question) is answered with a single query and no LLM call;
+anything else goes to the agent. Slots (N, class, sex, country, theme) come from
+named groups in the pattern.
+
+The heaviest aggregates can read from summary tables instead of the base tables:
+    python -m tools.sqlite_import --force       # SQLite files: built with the data
+    python -m tools.sql_templates --materialize # Postgres: materialized views (re-run to refresh)
+    python -m tools.sql_templates "top 5 happiest countries"   # show the match
+"""
+import os, re, sys, threading, argparse
+from typing import Any, Callable, Dict, List, Tuple
+from tools.sql_cache import normalise_question
+
+SQL_TEMPLATES_ENABLED = os.getenv("SQL_TEMPLATES", "1") != "0"
+# read from the summary tables below when they exist in the database
+SQL_TEMPLATE_SUMMARIES = os.getenv("SQL_TEMPLATE_SUMMARIES", "1") != "0"
+SQL_TEMPLATE_MAX_N = int(os.getenv("SQL_TEMPLATE_MAX_N", "50"))
+
+# summary table -> defining query, per database
+SUMMARIES: Dict[str, Dict[str, str]] = {
+    "titanic": {
+        "tmpl_titanic_survival": (
+            "SELECT pclass, sex, COUNT(*) AS passengers, COUNT(survived) AS known, "
+            "SUM(CASE WHEN survived = 1 THEN 1 ELSE 0 END) AS survivors, "
+            "COUNT(age) AS aged, SUM(age) AS age_total "
+            "FROM passenger GROUP BY pclass, sex"
+        ),
+    },
+    "lego": {
+        "tmpl_lego_theme_sets": (
+            "SELECT t.id AS theme_id, t.name AS theme, COUNT(s.set_num) AS sets "
+            "FROM lego_themes t LEFT JOIN lego_sets s ON s.theme_id = t.id GROUP BY t.id, t.name"
+        ),
+    },
+}
+
+# statements that (re)build the label's summary tables
+def summary_ddl(label: str, dialect: str) -> List[str]:
+    stmts = []
+    for name, select in SUMMARIES.get(label, {}).items():
+        if dialect == "postgresql":
+            stmts += [f"DROP MATERIALIZED VIEW IF EXISTS {name}", f"CREATE MATERIALIZED VIEW {name} AS {select}"]
+        else:
+            stmts += [f"DROP TABLE IF EXISTS {name}", f"CREATE TABLE {name} AS {select}"]
+    return stmts
+
+class Template:
+    """One intent: its patterns, base SQL, optional summary-table SQL and answer formatter."""
+    def __init__(self, name: str, label: str, patterns: List[str], sql: str,
+                 answer: Callable[[List[tuple], Dict[str, Any]], str],
+                 summary_sql: str | None = None, defaults: Dict[str, Any] | None = None):
+        self.name = name
+        self.label = label
+        self.patterns = [re.compile(p) for p in patterns]
+        self.sql = sql
+        self.answer = answer
+        self.summary_sql = summary_sql
+        self.defaults = defaults or {}
+
+    # tables the summary query reads (all must exist to use it)
+    @property
+    def summaries(self) -> List[str]:
+        return [n for n in SUMMARIES.get(self.label, {}) if self.summary_sql and n in self.summary_sql]
+
+# ---- slots ----
+_NUMBERS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+            "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20}
+_CLASSES = {"first": 1, "1st": 1, "upper": 1, "1": 1, "second": 2, "2nd": 2, "middle": 2, "2": 2,
+            "third": 3, "3rd": 3, "lower": 3, "3": 3}
+_SEXES = {"men": "male", "males": "male", "male": "male", "male passengers": "male",
+          "women": "female", "females": "female", "female": "female", "female passengers": "female"}
+
+N = r"(?P<n>\d{1,3}|" + "|".join(_NUMBERS) + ")"
+CLS = r"(?P<pclass>" + "|".join(_CLASSES) + ")"
+SEX = r"(?P<sex>" + "|".join(sorted(_SEXES, key=len, reverse=True)) + ")"
+NAME = r"[a-z0-9][a-z0-9 ]*?"
+LEAD = r"(?:(?:please|can you|could you) )?(?:(?:show me|show|list|give me|tell me|find) )?(?:the )?"
+TITANIC = r"(?: (?:on|aboard|of) the titanic| the titanic(?: disaster)?)?"
+YEAR = r"(?: overall| in 2019| in the world)?"
+
+def _slots(groups: Dict[str, str]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for key, value in groups.items():
+        if value is None:
+            continue
+        if key == "n":
+            out["n"] = max(1, min(SQL_TEMPLATE_MAX_N, int(value) if value.isdigit() else _NUMBERS[value]))
+        elif key == "pclass":
+            out["pclass"] = _CLASSES[value]
+        elif key == "sex":
+            out["sex"] = _SEXES[value]
+        else: # free-text names are compared case-insensitively in SQL
+            out[key] = re.sub(r"^the ", "", value.strip())
+    return out
+
+# ---- answers ----
+def _pct(part, whole) -> str:
+    return f"{100.0 * float(part or 0) / float(whole):.1f}%" if whole else "n/a"
+
+# a number with `digits` decimals, or "n/a" for NULL (e.g. AVG over no rows)
+def _num(value, digits: int) -> str:
+    return "n/a" if value is None else f"{float(value):.{digits}f}"
+
+def _scalar(text: str) -> Callable[[List[tuple], Dict[str, Any]], str]:
+    return lambda rows, slots: text.format(rows[0][0] or 0, **slots)
+
+def _survival(key: str) -> Callable[[List[tuple], Dict[str, Any]], str]:
+    def answer(rows, slots):
+        lines = [f"Survival by {key} (passengers with a known outcome):"]
+        for group, known, survivors in rows:
+            name = f"class {group}" if key == "class" else group
+            lines.append(f"- {name}: {survivors or 0} of {known or 0} survived ({_pct(survivors, known)})")
+        return "\n".join(lines)
+    return answer
+
+def _survivors_in_group(rows, slots) -> str:
+    known, survivors = rows[0]
+    group = f"class {slots['pclass']} passengers" if "pclass" in slots else f"{slots['sex']} passengers"
+    return f"{survivors or 0} {group} survived, out of {known or 0} with a known outcome ({_pct(survivors or 0, known)})."
+
+def _average_age(rows, slots) -> str:
+    return "Average passenger age by class:\n" + "\n".join(f"- class {c}: {_num(age, 1)} years" for c, age in rows)
+
+def _ranking(plural: str, single: str) -> Callable[[List[tuple], Dict[str, Any]], str]:
+    def answer(rows, slots):
+        if len(rows) == 1:
+            rank, country, score = rows[0]
+            return f"{country} (rank {rank}, score {_num(score, 2)}) was the {single} in 2019."
+        return f"The {len(rows)} {plural} in 2019:\n" + "\n".join(f"{r}. {c} (score {_num(s, 2)})" for r, c, s in rows)
+    return answer
+
+def _country_rank(rows, slots) -> str:
+    rank, country, score = rows[0]
+    return f"{country} ranked {rank} in the 2019 happiness index with a score of {_num(score, 2)}."
+
+def _top_themes(rows, slots) -> str:
+    return f"Top {len(rows)} LEGO themes by number of sets:\n" + "\n".join(f"{i}. {t} ({n} sets)" for i, (t, n) in enumerate(rows, 1))
+
+def _theme_sets(rows, slots) -> str:
+    theme, sets = rows[0]
+    return f"The {theme} theme has {sets or 0} LEGO sets."
+
+_SURVIVAL_SUMMARY = "SELECT {col}, SUM(known), SUM(survivors) FROM tmpl_titanic_survival GROUP BY {col} ORDER BY {col}"
+_SURVIVAL_SQL = ("SELECT {col}, COUNT(survived), SUM(CASE WHEN survived = 1 THEN 1 ELSE 0 END) "
+                 "FROM passenger GROUP BY {col} ORDER BY {col}")
+
+# first full match wins: put the narrow patterns before the general ones
+TEMPLATES: List[Template] = [
+    # ---- titanic ----
+    Template("titanic_survivors", "titanic",
+             [rf"how many (?:passengers|people) survived{TITANIC}"],
+             "SELECT COUNT(*) FROM passenger WHERE survived = 1",
+             _scalar("{0} passengers survived the Titanic."),
+             summary_sql="SELECT SUM(survivors) FROM tmpl_titanic_survival"),
+    Template("titanic_passengers", "titanic",
+             [rf"how many passengers (?:were|are) (?:there|on board|aboard){TITANIC}(?: in total)?",
+              rf"{LEAD}total number of passengers{TITANIC}"],
+             "SELECT COUNT(*) FROM passenger",
+             _scalar("There were {0} passengers in the Titanic passenger list."),
+             summary_sql="SELECT SUM(passengers) FROM tmpl_titanic_survival"),
+    Template("titanic_sex_count", "titanic",
+             [rf"how many {SEX} (?:were )?(?:there )?(?:on board|aboard|on|travelled){TITANIC}"],
+             "SELECT COUNT(*) FROM passenger WHERE sex = :sex",
+             _scalar("There were {0} {sex} passengers on board."),
+             summary_sql="SELECT SUM(passengers) FROM tmpl_titanic_survival WHERE sex = :sex"),
+    Template("titanic_survival_by_class", "titanic",
+             [rf"{LEAD}(?:what (?:is|was|were) the )?(?:titanic )?survival (?:rate|rates|count|counts)?(?: of (?:titanic )?passengers)? (?:by|per|for each|in each) (?:passenger |ticket )?class{TITANIC}",
+              rf"how many (?:passengers |people )?survived (?:in each|by|per) (?:passenger |ticket )?class{TITANIC}"],
+             _SURVIVAL_SQL.format(col="pclass"), _survival("class"),
+             summary_sql=_SURVIVAL_SUMMARY.format(col="pclass")),
+    Template("titanic_survival_by_sex", "titanic",
+             [rf"{LEAD}(?:what (?:is|was|were) the )?(?:titanic )?survival (?:rate|rates|count|counts)?(?: of (?:titanic )?passengers)? (?:by|per|for each) (?:sex|gender){TITANIC}",
+              rf"how many (?:men and women|women and men) survived{TITANIC}",
+              rf"how many (?:passengers |people )?survived (?:by|per) (?:sex|gender){TITANIC}"],
+             _SURVIVAL_SQL.format(col="sex"), _survival("sex"),
+             summary_sql=_SURVIVAL_SUMMARY.format(col="sex")),
+    Template("titanic_survivors_in_class", "titanic",
+             [rf"how many (?:passengers |people )?(?:in (?:the )?)?{CLS} class (?:passengers )?survived{TITANIC}",
+              rf"how many (?:passengers |people )?survived in (?:the )?{CLS} class{TITANIC}"],
+             "SELECT COUNT(survived), SUM(CASE WHEN survived = 1 THEN 1 ELSE 0 END) FROM passenger WHERE pclass = :pclass",
+             _survivors_in_group,
+             summary_sql="SELECT SUM(known), SUM(survivors) FROM tmpl_titanic_survival WHERE pclass = :pclass"),
+    Template("titanic_survivors_by_sex", "titanic",
+             [rf"how many {SEX} survived{TITANIC}"],
+             "SELECT COUNT(survived), SUM(CASE WHEN survived = 1 THEN 1 ELSE 0 END) FROM passenger WHERE sex = :sex",
+             _survivors_in_group,
+             summary_sql="SELECT SUM(known), SUM(survivors) FROM tmpl_titanic_survival WHERE sex = :sex"),
+    Template("titanic_average_age_by_class", "titanic",
+             [rf"{LEAD}(?:what (?:is|was) the )?average age of (?:the )?(?:titanic )?passengers (?:by|per|in each) (?:passenger )?class{TITANIC}"],
+             "SELECT pclass, AVG(age) FROM passenger GROUP BY pclass ORDER BY pclass",
+             _average_age,
+             summary_sql="SELECT pclass, SUM(age_total) / SUM(aged) FROM tmpl_titanic_survival GROUP BY pclass ORDER BY pclass"),
+    # ---- happiness ----
+    Template("happiness_top_n", "happiness",
+             [rf"{LEAD}(?:(?:what|which) (?:are|were) the )?top {N} (?:happiest|most happy) countries{YEAR}",
+              rf"{LEAD}{N} happiest countries{YEAR}"],
+             "SELECT overall_rank, country_or_region, score FROM happiness_2019 ORDER BY overall_rank LIMIT :n",
+             _ranking("happiest countries", "happiest country")),
+    Template("happiness_happiest", "happiness",
+             [rf"(?:which|what) (?:country|nation) (?:had|has|was|is) the (?:highest happiness score|happiest){YEAR}",
+              rf"(?:which|what) (?:is|was) the happiest (?:country|nation){YEAR}"],
+             "SELECT overall_rank, country_or_region, score FROM happiness_2019 ORDER BY overall_rank LIMIT 1",
+             _ranking("happiest countries", "happiest country")),
+    Template("happiness_bottom_n", "happiness",
+             [rf"{LEAD}(?:(?:what|which) (?:are|were) the )?(?:top |bottom )?{N} (?:least happy|unhappiest|saddest) countries{YEAR}"],
+             "SELECT overall_rank, country_or_region, score FROM happiness_2019 ORDER BY overall_rank DESC LIMIT :n",
+             _ranking("least happy countries", "least happy country")),
+    Template("happiness_unhappiest", "happiness",
+             [rf"(?:which|what) (?:country|nation) (?:had|has|was|is) the (?:lowest happiness score|least happy|unhappiest){YEAR}"],
+             "SELECT overall_rank, country_or_region, score FROM happiness_2019 ORDER BY overall_rank DESC LIMIT 1",
+             _ranking("least happy countries", "least happy country")),
+    Template("happiness_country_rank", "happiness",
+             [rf"(?:what (?:is|was) )?(?:the )?(?:happiness )?(?:rank|ranking|score|happiness score) (?:of|for) (?P<country>{NAME})(?: in 2019)?",
+              rf"(?:what (?:is|was) )?(?P<country>{NAME}) s happiness (?:rank|ranking|score)(?: in 2019)?",
+              rf"how happy (?:is|was) (?P<country>{NAME})(?: in 2019)?"],
+             "SELECT overall_rank, country_or_region, score FROM happiness_2019 WHERE LOWER(country_or_region) = :country",
+             _country_rank),
+    # ---- lego ----
+    Template("lego_set_count", "lego",
+             [r"how many lego sets (?:exist|are there|were (?:made|released))(?: in total)?",
+              rf"{LEAD}total number of lego sets"],
+             "SELECT COUNT(*) FROM lego_sets",
+             _scalar("There are {0} LEGO sets in the database."),
+             summary_sql="SELECT SUM(sets) FROM tmpl_lego_theme_sets"),
+    Template("lego_top_themes", "lego",
+             [rf"{LEAD}(?:(?:what|which) (?:are|were) the )?top {N} lego themes(?: by (?:the )?(?:number of sets|set count|sets))?",
+              r"(?:which|what) lego themes have the most sets"],
+             "SELECT t.name, COUNT(*) AS sets FROM lego_sets s JOIN lego_themes t ON t.id = s.theme_id "
+             "GROUP BY t.id, t.name ORDER BY sets DESC LIMIT :n",
+             _top_themes,
+             summary_sql="SELECT theme, sets FROM tmpl_lego_theme_sets WHERE sets > 0 ORDER BY sets DESC LIMIT :n",
+             defaults={"n": 5}),
+    Template("lego_theme_sets", "lego",
+             [rf"how many (?:lego )?sets (?:are there |exist )?in the (?P<theme>{NAME}) theme",
+              rf"how many (?P<theme>{NAME}) (?:lego )?sets (?:are there|exist)"],
+             "SELECT MIN(t.name), COUNT(s.set_num) FROM lego_themes t LEFT JOIN lego_sets s ON s.theme_id = t.id "
+             "WHERE LOWER(t.name) = :theme GROUP BY LOWER(t.name)",
+             _theme_sets,
+             summary_sql="SELECT MIN(theme), SUM(sets) FROM tmpl_lego_theme_sets WHERE LOWER(theme) = :theme GROUP BY LOWER(theme)"),
+]
+
+# Template and slot values for the question, or None
+def match(question: str) -> Tuple[Template, Dict[str, Any]] | None:
+    q = normalise_question(question)
+    for template in TEMPLATES:
+        for pattern in template.patterns:
+            m = pattern.fullmatch(q)
+            if m:
+                return template, {**template.defaults, **_slots(m.groupdict())}
+    return None
+
+# hit-rate counters (per process)
+STATS: Dict[str, Any] = {"hits": 0, "misses": 0, "templates": {}}
+_STATS_LOCK = threading.Lock()
+
+def record(name: str | None) -> None:
+    with _STATS_LOCK:
+        if name is None:
+            STATS["misses"] += 1
+        else:
+            STATS["hits"] += 1
+            STATS["templates"][name] = STATS["templates"].get(name, 0) + 1
+
+def hit_rate() -> float:
+    total = STATS["hits"] + STATS["misses"]
+    return STATS["hits"] / total if total else 0.0
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="SQL query templates: match questions or build summary tables")
+    ap.add_argument("questions", nargs="*", help="questions to match against the templates")
+    ap.add_argument("--materialize", nargs="*", metavar="LABEL", help="create / refresh the Postgres summary views")
+    args = ap.parse_args(argv)
+    for q in args.questions:
+        hit = match(q)
+        print(f"{q!r} -> " + (f"{hit[0].name} {hit[1]}" if hit else "agent"))
+    if args.materialize is not None:
+        from sqlalchemy import create_engine, text
+        from tools import sql_agent
+        if sql_agent.SQL_BACKEND == "sqlite":
+            print("[sql_templates] SQLite summary tables are built by `python -m tools.sqlite_import --force`")
+            return 1
+        for label in args.materialize or list(SUMMARIES):
+            engine = create_engine(sql_agent._get_db_uri(label))
+            with engine.begin() as conn:
+                for stmt in summary_ddl(label, engine.dialect.name):
+                    conn.execute(text(stmt))
+            print(f"[sql_templates] materialized {', '.join(SUMMARIES[label])} in {label}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
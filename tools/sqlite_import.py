@@ -0,0 +1,150 @@
+"""
+Build the embedded SQLite databases from the Postgres dumps in init/dumps/.
+
+    python -m tools.sqlite_import                 # every init/dumps/*.sql -> data/<name>.db (skips up-to-date files)
+    python -m tools.sqlite_import init/dumps/lego.sql --force
+
+Understands what pg_dump and the hand-written dumps in init/dumps/ contain: CREATE
+TABLE, COPY ... FROM stdin blocks, INSERT, primary/unique constraints and
+CREATE INDEX. Sequences, owners, grants and foreign keys are skipped; the
+databases are opened read-only by the app, so the summary tables used by
+tools/sql_templates.py are built here too.
+Stop the app (or anything holding the files open with SQLITE_IMMUTABLE=1)
+before rebuilding.
+"""
+import os, re, sys, sqlite3, argparse
+from pathlib import Path
+from typing import Iterator, List, Tuple
+from tools.sql_templates import summary_ddl
+
+ROOT = Path(__file__).resolve().parents[1]
+INIT_DIR = ROOT / "init" / "dumps"
+# dump file -> database file used by tools/sql_sqlite.py
+TARGETS = {"titanic.sql": "titanic.db", "happiness_index.sql": "happiness_index.db", "lego.sql": "lego.db"}
+# database file -> label used by the SQL agent
+LABELS = {"titanic.db": "titanic", "happiness_index.db": "happiness", "lego.db": "lego"}
+
+# Postgres column types -> SQLite type names with the intended affinity
+_TYPE_MAP = [
+    (re.compile(r"\b(?:big|small)?serial\b", re.I), "INTEGER"),
+    (re.compile(r"\b(?:bigint|smallint|integer|int[248]?)\b", re.I), "INTEGER"),
+    (re.compile(r"\bdouble precision\b|\breal\b|\bfloat[48]?\b|\bnumeric(?:\s*\(\s*\d+\s*(?:,\s*\d+\s*)?\))?", re.I), "REAL"),
+    (re.compile(r"\bcharacter varying(?:\s*\(\s*\d+\s*\))?|\bvarchar(?:\s*\(\s*\d+\s*\))?|\bcharacter(?:\s*\(\s*\d+\s*\))?|\bchar(?:\s*\(\s*\d+\s*\))?", re.I), "TEXT"),
+    (re.compile(r"\btimestamp(?:\s*\(\d+\))?(?: with(?:out)? time zone)?|\bdate\b|\btime\b", re.I), "TEXT"),
+    (re.compile(r"\bboolean\b", re.I), "INTEGER"),
+]
+_DEFAULT_NEXTVAL = re.compile(r"\s+DEFAULT\s+nextval\([^)]*\)(?:::regclass)?", re.I)
+_SCHEMA = re.compile(r"\bpublic\.", re.I)
+_CONSTRAINT = re.compile(
+    r"ALTER TABLE (?:ONLY )?(\S+)\s+ADD CONSTRAINT (\S+) (PRIMARY KEY|UNIQUE) \(([^)]*)\)", re.I | re.S)
+_INDEX = re.compile(r"CREATE (UNIQUE )?INDEX (\S+) ON (?:ONLY )?(\S+)(?: USING \w+)? \(([^)]*)\)", re.I | re.S)
+_COPY = re.compile(r"COPY (\S+) \(([^)]*)\) FROM stdin;", re.I)
+_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "b": "\b", "f": "\f", "v": "\v", "\\": "\\"}
+_ESCAPE_RE = re.compile(r"\\([0-7]{1,3}|.)")
+
+def _unescape(value: str) -> str | None:
+    if value == r"\N":
+        return None
+    if "\\" not in value:
+        return value
+    return _ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 8)) if m.group(1).isdigit() else _ESCAPES.get(m.group(1), m.group(1)), value)
+
+def _sqlite_type(ddl: str) -> str:
+    for pattern, name in _TYPE_MAP:
+        ddl = pattern.sub(name, ddl)
+    return _DEFAULT_NEXTVAL.sub("", ddl)
+
+# Split a dump into ("sql", statement) and ("copy", (table, columns, rows)) items
+def iter_dump(path: Path) -> Iterator[Tuple[str, object]]:
+    with path.open(encoding="utf-8") as f:
+        buf: List[str] = []
+        for line in f:
+            if not buf and (line.startswith("--") or not line.strip()):
+                continue
+            m = _COPY.match(line.strip()) if not buf else None
+            if m:
+                rows = []
+                for row in f:
+                    row = row.rstrip("\n")
+                    if row == r"\.":
+                        break
+                    rows.append([_unescape(v) for v in row.split("\t")])
+                yield "copy", (m.group(1), [c.strip() for c in m.group(2).split(",")], rows)
+                continue
+            buf.append(line)
+            if line.rstrip().endswith(";"):
+                yield "sql", "".join(buf).strip()
+                buf = []
+
+def convert(src: Path, dst: Path) -> dict:
+    tmp = dst.with_suffix(dst.suffix + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    counts = {"tables": 0, "rows": 0, "indexes": 0, "summaries": 0, "skipped": 0}
+    indexes: List[str] = [] # created after the data is loaded
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        for kind, item in iter_dump(src):
+            if kind == "copy":
+                table, columns, rows = item
+                marks = ", ".join("?" * len(columns))
+                conn.executemany(f"INSERT INTO {_SCHEMA.sub('', table)} ({', '.join(columns)}) VALUES ({marks})", rows)
+                counts["rows"] += len(rows)
+                continue
+            stmt = item
+            head = stmt.split(None, 2)[:2]
+            verb = " ".join(head).upper()
+            if verb == "CREATE TABLE":
+                conn.execute(_sqlite_type(_SCHEMA.sub("", stmt)))
+                counts["tables"] += 1
+            elif verb.startswith("DROP TABLE"):
+                conn.execute(_SCHEMA.sub("", stmt))
+            elif verb.startswith("INSERT INTO"):
+                conn.execute(_SCHEMA.sub("", stmt))
+                counts["rows"] += 1
+            elif _CONSTRAINT.match(stmt):
+                table, name, _kind, cols = _CONSTRAINT.match(stmt).groups()
+                indexes.append(f'CREATE UNIQUE INDEX "{name.strip(chr(34))}" ON {_SCHEMA.sub("", table)} ({cols})')
+            elif _INDEX.match(stmt):
+                unique, name, table, cols = _INDEX.match(stmt).groups()
+                indexes.append(f'CREATE {unique or ""}INDEX "{name.strip(chr(34))}" ON {_SCHEMA.sub("", table)} ({cols})')
+            else: # SET, sequences, owners, grants, foreign keys, comments
+                counts["skipped"] += 1
+        for stmt in indexes:
+            conn.execute(stmt)
+        counts["indexes"] = len(indexes)
+        for stmt in summary_ddl(LABELS.get(dst.name, ""), "sqlite"):
+            conn.execute(stmt)
+            counts["summaries"] += stmt.startswith("CREATE")
+        conn.commit()
+        conn.execute("ANALYZE") # planner statistics for the read-only copy
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, dst) # readers never see a half-built file
+    return counts
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Convert Postgres dumps in init/ to SQLite files")
+    ap.add_argument("dumps", nargs="*", type=Path, help="dump files (default: init/dumps/*.sql)")
+    ap.add_argument("--out-dir", type=Path, default=Path(os.getenv("SQLITE_DIR", str(ROOT / "data"))))
+    ap.add_argument("--force", action="store_true", help="rebuild even if the .db is newer than the dump")
+    args = ap.parse_args(argv)
+    dumps = args.dumps or sorted(INIT_DIR.glob("*.sql"))
+    if not args.dumps:
+        for name in TARGETS:
+            if not (INIT_DIR / name).exists():
+                print(f"[sqlite_import] {INIT_DIR / name} not found, skipping")
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    for src in dumps:
+        dst = args.out_dir / TARGETS.get(src.name, src.stem + ".db")
+        if not args.force and dst.exists() and dst.stat().st_mtime >= src.stat().st_mtime:
+            print(f"[sqlite_import] {dst} is up to date")
+            continue
+        counts = convert(src, dst)
+        print(f"[sqlite_import] {src.name} -> {dst}: {counts}")
+
+if __name__ == "__main__":
+    sys.exit(main())
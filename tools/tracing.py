@@ -0,0 +1,313 @@
+import os, json, time, uuid, threading, contextvars
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import ensure_config
+
+# off by default: with TRACING unset every hook below returns after one flag check
+TRACING_ENABLED = os.getenv("TRACING", "0") == "1"
+# one JSON line per turn ("" = don't write traces)
+DEFAULT_PATH = Path(__file__).resolve().parents[1] / ".cache" / "traces.jsonl"
+TRACE_PATH = os.getenv("TRACE_PATH", str(DEFAULT_PATH))
+# Prometheus text endpoint on http://localhost:<port>/metrics (0 = off)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Metrics:
+    """Process-wide counters and duration histograms in Prometheus text format."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist: Dict[tuple, list] = {} # (kind, name) -> [bucket counts..., +Inf, sum]
+        self._counters: Dict[tuple, float] = defaultdict(float) # (metric, sorted labels) -> value
+
+    def observe(self, kind: str, name: str, seconds: float) -> None:
+        with self._lock:
+            h = self._hist.get((kind, name))
+            if h is None:
+                h = self._hist[(kind, name)] = [0] * (len(DURATION_BUCKETS) + 1) + [0.0]
+            for i, le in enumerate(DURATION_BUCKETS):
+                if seconds <= le:
+                    h[i] += 1
+            h[len(DURATION_BUCKETS)] += 1
+            h[-1] += seconds
+
+    def inc(self, metric: str, value: float = 1, **labels: Any) -> None:
+        key = (metric, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def render(self) -> str:
+        lines = ["# TYPE agent_span_seconds histogram"]
+        with self._lock:
+            for (kind, name), h in sorted(self._hist.items()):
+                labels = f'kind="{_esc(kind)}",name="{_esc(name)}"'
+                for le, n in zip(DURATION_BUCKETS, h):
+                    lines.append(f'agent_span_seconds_bucket{{{labels},le="{le}"}} {n}')
+                lines.append(f'agent_span_seconds_bucket{{{labels},le="+Inf"}} {h[len(DURATION_BUCKETS)]}')
+                lines.append(f"agent_span_seconds_sum{{{labels}}} {h[-1]}")
+                lines.append(f"agent_span_seconds_count{{{labels}}} {h[len(DURATION_BUCKETS)]}")
+            for metric in sorted({m for m, _ in self._counters}):
+                lines.append(f"# TYPE {metric} counter")
+                for (m, labels), value in sorted(self._counters.items()):
+                    if m == metric:
+                        text = ",".join(f'{k}="{_esc(v)}"' for k, v in labels)
+                        lines.append(f"{metric}{{{text}}} {value:g}" if text else f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+def _esc(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+METRICS = Metrics()
+
+# graph node path of the running code, e.g. "weather/tools" ("" outside the graph)
+def _node_path(metadata: Dict[str, Any]) -> str:
+    ns = metadata.get("langgraph_checkpoint_ns", "")
+    return "/".join(part.split(":")[0] for part in ns.split("|") if part) or metadata.get("langgraph_node", "")
+
+def _current_node() -> str:
+    return _node_path(ensure_config().get("metadata") or {})
+
+class Turn:
+    """Spans and events recorded while answering one user message."""
+    def __init__(self, question: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.question = question
+        self.ts = time.time()
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.events: List[Dict[str, Any]] = []
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self.handler = TraceHandler(self)
+
+    def span(self, kind: str, name: str, start: float, seconds: float, node: str = "", **attrs: Any) -> None:
+        with self._lock:
+            self.spans.append({"kind": kind, "name": name, "node": node,
+                               "start": round(start - self.started, 6), "seconds": round(seconds, 6), **attrs})
+
+    def event(self, kind: str, name: str, node: str = "", **attrs: Any) -> None:
+        with self._lock:
+            self.events.append({"kind": kind, "name": name, "node": node,
+                                "at": round(time.perf_counter() - self.started, 6), **attrs})
+
+    # close the turn: update turn metrics and append the trace to TRACE_PATH
+    def finish(self) -> Dict[str, Any]:
+        self.seconds = time.perf_counter() - self.started
+        METRICS.observe("turn", "turn", self.seconds)
+        METRICS.inc("agent_turns_total")
+        trace = {"turn_id": self.id, "ts": self.ts, "question": self.question, "seconds": round(self.seconds, 6),
+                 "spans": self.spans, "events": self.events}
+        if TRACE_PATH:
+            _write_trace(trace)
+        return trace
+
+    # per top-level node: time, LLM calls/tokens, SQL statements/rows, HTTP requests, cache hits
+    def breakdown(self) -> List[Dict[str, Any]]:
+        rows: Dict[str, Dict[str, Any]] = {}
+        for s in sorted(self.spans, key=lambda s: s["start"]):
+            top = s["node"].split("/")[0] if s["node"] else "(outside graph)"
+            row = rows.setdefault(top, {"node": top, "seconds": 0.0, "llm_calls": 0, "llm_seconds": 0.0, "tokens": 0,
+                                        "sql": 0, "sql_seconds": 0.0, "rows": 0, "http": 0, "http_seconds": 0.0, "cache_hits": 0})
+            if s["kind"] == "node" and s["node"] == top:
+                row["seconds"] += s["seconds"]
+            elif s["kind"] == "llm":
+                row["llm_calls"] += 1
+                row["llm_seconds"] += s["seconds"]
+                row["tokens"] += s.get("input_tokens", 0) + s.get("output_tokens", 0)
+            elif s["kind"] == "sql":
+                row["sql"] += 1
+                row["sql_seconds"] += s["seconds"]
+                row["rows"] += max(s.get("rows") or 0, 0)
+            elif s["kind"] == "http":
+                row["http"] += 1
+                row["http_seconds"] += s["seconds"]
+        for e in self.events:
+            if e["kind"] == "cache" and e.get("result") == "hit":
+                top = e["node"].split("/")[0] if e["node"] else "(outside graph)"
+                if top in rows:
+                    rows[top]["cache_hits"] += 1
+        return list(rows.values())
+
+_WRITE_LOCK = threading.Lock()
+
+def _write_trace(trace: Dict[str, Any]) -> None:
+    try:
+        path = Path(TRACE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(trace, ensure_ascii=False, default=str) + "\n"
+        with _WRITE_LOCK, path.open("a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError as e: # tracing must never break a turn
+        print(f"[tracing] could not write trace: {e}")
+
+_CURRENT: contextvars.ContextVar[Turn | None] = contextvars.ContextVar("trace_turn", default=None)
+
+# Start tracing a turn (None when tracing is off)
+def start_turn(question: str) -> Turn | None:
+    return Turn(question) if TRACING_ENABLED else None
+
+# Make `turn` the current turn for this context (threads/tasks started from here inherit it)
+def activate(turn: Turn | None) -> None:
+    if turn is not None:
+        _CURRENT.set(turn)
+
+# callbacks to pass in the graph config for this turn
+def callbacks(turn: Turn | None) -> list:
+    return [turn.handler] if turn is not None else []
+
+# Wrap graph.astream(...) so the turn is current inside the event loop that runs it
+async def bind(turn: Turn | None, agen: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    activate(turn)
+    async for item in agen:
+        yield item
+
+# Record a finished span (SQL statement, HTTP request, ...) for the current turn
+def record(kind: str, name: str, seconds: float, **attrs: Any) -> None:
+    if not TRACING_ENABLED:
+        return
+    METRICS.observe(kind, name, seconds)
+    turn = _CURRENT.get()
+    if turn is not None:
+        turn.span(kind, name, time.perf_counter() - seconds, seconds, node=_current_node(), **attrs)
+
+# Record a point event (cache hit/miss, retry, classifier decision) for the current turn
+def event(kind: str, name: str, **attrs: Any) -> None:
+    if not TRACING_ENABLED:
+        return
+    if kind == "cache":
+        METRICS.inc("agent_cache_requests_total", cache=name, result=attrs.get("result", ""))
+    else:
+        METRICS.inc("agent_events_total", kind=kind, name=name)
+    turn = _CURRENT.get()
+    if turn is not None:
+        turn.event(kind, name, node=_current_node(), **attrs)
+
+class TraceHandler(BaseCallbackHandler):
+    """Graph node, LLM and tool spans for one turn, from LangChain callbacks."""
+    run_inline = True
+
+    def __init__(self, turn: Turn):
+        self.turn = turn
+        self._open: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, kind: str, name: str, node: str, **attrs: Any) -> None:
+        with self._lock:
+            self._open[run_id] = (kind, name, node, time.perf_counter(), attrs)
+
+    def _end(self, run_id, **attrs: Any) -> None:
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+        if opened is None:
+            return
+        kind, name, node, start, start_attrs = opened
+        seconds = time.perf_counter() - start
+        METRICS.observe(kind, name, seconds)
+        self.turn.span(kind, name, start, seconds, node=node, **start_attrs, **attrs)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        if not node or kwargs.get("name") != node: # only the node runs themselves
+            return
+        path = _node_path(metadata)
+        with self._lock:
+            parent = self._open.get(parent_run_id)
+        if parent and parent[0] == "node" and parent[2] == path: # a function named like its node
+            return
+        self._start(run_id, "node", path, path)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        self._start(run_id, "llm", metadata.get("ls_model_name") or "chat_model", _node_path(metadata))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = {}
+        for gens in response.generations or []:
+            for g in gens:
+                usage = getattr(getattr(g, "message", None), "usage_metadata", None) or usage
+        tokens = {"input_tokens": usage.get("input_tokens", 0), "output_tokens": usage.get("output_tokens", 0)}
+        with self._lock:
+            opened = self._open.get(run_id)
+        if opened:
+            for direction, n in tokens.items():
+                METRICS.inc("agent_llm_tokens_total", n, model=opened[1], type=direction.split("_")[0])
+        self._end(run_id, **tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(run_id, "tool", name, _node_path(metadata or {}))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+# Time every SQL statement on this engine (no listeners are added when tracing is off)
+def instrument_engine(engine, label: str) -> None:
+    if not TRACING_ENABLED:
+        return
+    from sqlalchemy import event as sa_event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("trace_starts", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("trace_starts")
+        if not starts:
+            return
+        seconds = time.perf_counter() - starts.pop()
+        rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+        if rows:
+            METRICS.inc("agent_sql_rows_total", rows, db=label)
+        record("sql", label, seconds, rows=rows, statement=" ".join(statement.split())[:300])
+
+    sa_event.listen(engine, "before_cursor_execute", before)
+    sa_event.listen(engine, "after_cursor_execute", after)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_SERVER: ThreadingHTTPServer | None = None
+_SERVER_LOCK = threading.Lock()
+
+# Serve METRICS on localhost once per process (no-op when tracing or the port is off)
+def start_metrics_server(port: int = METRICS_PORT) -> ThreadingHTTPServer | None:
+    global _SERVER
+    if not TRACING_ENABLED or not port:
+        return None
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            try:
+                _SERVER = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            except OSError as e: # e.g. port taken by another worker
+                print(f"[tracing] metrics endpoint not started on port {port}: {e}")
+                return None
+            threading.Thread(target=_SERVER.serve_forever, name="metrics", daemon=True).start()
+            print(f"[tracing] metrics on http://127.0.0.1:{port}/metrics")
+    return _SERVER
@@ -1,60 +1,95 @@
-import os, json, requests
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain.tools import tool
+import json
+from typing import Any, Dict, List
+from langchain_core.tools import StructuredTool
+from langchain_core.runnables import RunnableLambda
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
-from langgraph.graph import START, END, StateGraph, MessagesState
+from langgraph.graph import START, END, StateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
+from tools import weather_client, context_window, llm_registry
+from tools.context_window import ConversationState
 
-load_dotenv()
-llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0)
+llm_registry.load_env()
+llm = None # set on first use (benches assign a fake)
+
+def _llm():
+    global llm
+    if llm is None:
+        llm = llm_registry.get("gpt-4.1-mini")
+    return llm
+
+# Format the per-city results as the tool's JSON output
+def _weather_json(results: List[Dict[str, Any]]) -> str:
+    if not results:
+        return json.dumps({"status": "error", "message": "no city given"}, ensure_ascii=False)
+    if len(results) == 1:
+        return json.dumps(results[0], ensure_ascii=False)
+    status = "ok" if any(r["status"] == "ok" for r in results) else "error"
+    return json.dumps({"status": status, "results": results}, ensure_ascii=False)
 
 # MAIN: Weather tool
-# OUTPUT: {"status":"ok","city":"London","weather":"Partly cloudy","temperature_c":14.0}
-@tool("get_weather", return_direct=False)
-def get_weather(city: str) -> str:
+# OUTPUT (one city):  {"status":"ok","city":"London","weather":"Partly cloudy","temperature_c":14.0}
+# OUTPUT (several):   {"status":"ok","results":[{"status":"ok","city":"London",...}, {...}]}
+def _get_weather(cities: List[str]) -> str:
     """
-    Fetch current weather information for a given city using WeatherAPI.com.
+    Fetch current weather information for one or more cities using WeatherAPI.com.
+    Pass every city the user asked about in a single call; they are fetched concurrently.
     Args:
-        city (str): City name, e.g., "London".
+        cities (list[str]): City names, e.g., ["London"] or ["London", "Paris", "Tokyo"].
     Returns:
-        str: JSON string with weather description and temperature in Celsius, or an error message.
+        str: JSON string with weather description and temperature in Celsius per city, or an error message.
     """
-    api_key = os.getenv("WEATHER_API_KEY")
-    if not api_key:
-        return json.dumps({"status":"error","message":"API key not set"}, ensure_ascii=False)
-    try:
-        url = f"http://api.weatherapi.com/v1/current.json?key={api_key}&q={city}&lang=en"
-        r = requests.get(url, timeout=10) # 10 seconds timeout to avoid hanging
-        r.raise_for_status() # raise error for HTTP status 4xx/5xx -> except
-        data = r.json()
-        desc = data["current"]["condition"]["text"]
-        temp = data["current"]["temp_c"]
-        return json.dumps({
-            "status": "ok",
-            "city": city,
-            "weather": desc,
-            "temperature_c": temp
-        }, ensure_ascii=False)
-    except Exception as e:
-        return json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False)
+    # pooled session + per-city TTL cache + request coalescing (see weather_client)
+    return _weather_json(weather_client.fetch_many(cities))
+
+# async version: same cache, non-blocking HTTP client
+async def _aget_weather(cities: List[str]) -> str:
+    return _weather_json(await weather_client.afetch_many(cities))
+
+get_weather = StructuredTool.from_function(func=_get_weather, coroutine=_aget_weather, name="get_weather")
+
+WEATHER_SYS = {
+    "role": "system",
+    "content": (
+        "You are a weather assistant. Extract the city name from the user text. "
+        "If no clear city is present, ask a short follow-up question to clarify. "
+        "When you know the city, call the tool get_weather with {cities: [city]}. "
+        "If the user asks about several cities, call get_weather ONCE with all of them in cities."
+    ),
+}
+
+# One get_weather call per turn, whatever the model emits: parallel calls are merged
+# into a single batch (the graph runs one tools step and ends, so a second call would
+# never be answered by a later round)
+def _one_call(resp: AIMessage) -> AIMessage:
+    calls = [tc for tc in resp.tool_calls if tc["name"] == get_weather.name]
+    if len(resp.tool_calls) <= 1 and len(calls) == len(resp.tool_calls):
+        return resp
+    cities: List[str] = []
+    for tc in calls:
+        cities += tc["args"].get("cities") or []
+    merged = [{**calls[0], "args": {"cities": cities}}] if calls else []
+    extra = {k: v for k, v in resp.additional_kwargs.items() if k != "tool_calls"} # provider copy of the calls
+    print(f"[weather_agent] merged {len(resp.tool_calls)} tool calls into one: {cities}")
+    return resp.model_copy(update={"tool_calls": merged, "additional_kwargs": extra})
+
+# ask the model for a single call too (OpenAI parallel_tool_calls)
+def _bound():
+    return _llm().bind_tools([get_weather], parallel_tool_calls=False)
 
 # city decision node
-def decide_city(state: MessagesState):
-    user = state["messages"][-1].content if state["messages"] else "" # get latest user message or blank ""
-    sys = {
-        "role": "system",
-        "content": (
-            "You are a weather assistant. Extract the city name from the user text. "
-            "If no clear city is present, ask a short follow-up question to clarify. "
-            "When you know the city, call the tool get_weather with {city}."
-        ),
-    }
-    resp = llm.bind_tools([get_weather]).invoke([sys] + state["messages"]) # pass system + user msgs to LLM 
-    return {"messages": [resp]}
-
-builder = StateGraph(MessagesState)
-builder.add_node("decide_city", decide_city)
+def decide_city(state: ConversationState):
+    msgs = context_window.track("weather.decide_city", [WEATHER_SYS] + context_window.window(state))
+    resp = _bound().invoke(msgs) # pass system + summary + recent msgs to LLM 
+    return {"messages": [_one_call(resp)]}
+
+# async city decision node
+async def adecide_city(state: ConversationState):
+    msgs = context_window.track("weather.decide_city", [WEATHER_SYS] + context_window.window(state))
+    resp = await _bound().ainvoke(msgs)
+    return {"messages": [_one_call(resp)]}
+
+builder = StateGraph(ConversationState)
+builder.add_node("decide_city", RunnableLambda(decide_city, afunc=adecide_city))
 builder.add_node("tools", ToolNode([get_weather]))  # 天気ツールはこのサブグラフ内でだけ使う
 
 builder.add_edge(START, "decide_city")
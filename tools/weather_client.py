@@ -0,0 +1,226 @@
+import os, time, random, asyncio, threading, weakref, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tools import tracing
+
+# WeatherAPI endpoint (override to point at a local stub server)
+WEATHER_API_BASE = os.getenv("WEATHER_API_BASE", "http://api.weatherapi.com/v1")
+# current conditions only refresh every few minutes upstream
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "300"))
+WEATHER_CONNECT_TIMEOUT = float(os.getenv("WEATHER_CONNECT_TIMEOUT", "3"))
+WEATHER_READ_TIMEOUT = float(os.getenv("WEATHER_READ_TIMEOUT", "5"))
+WEATHER_RETRIES = int(os.getenv("WEATHER_RETRIES", "2"))
+WEATHER_BACKOFF = float(os.getenv("WEATHER_BACKOFF", "0.2"))   # 0.2s, 0.4s, ...
+WEATHER_POOL_SIZE = int(os.getenv("WEATHER_POOL_SIZE", "10"))
+WEATHER_MAX_PARALLEL = int(os.getenv("WEATHER_MAX_PARALLEL", "8"))  # concurrent lookups per process
+
+# Shared keep-alive session with short retries on connection errors / 429 / 5xx
+def _make_session() -> requests.Session:
+    retry = Retry(
+        total=WEATHER_RETRIES,
+        backoff_factor=WEATHER_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=WEATHER_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_SESSION = _make_session()
+
+# normalised city -> (expires_at, result)
+_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_CACHE_LOCK = threading.Lock()
+
+class _Call:
+    """One in-flight upstream request that concurrent callers wait on."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Dict[str, Any] = {"status": "error", "message": "request failed"}
+
+_INFLIGHT: Dict[str, _Call] = {}
+
+# counters for monitoring / benchmarks
+STATS = {"hits": 0, "misses": 0, "coalesced": 0, "upstream": 0}
+
+def normalise_city(city: str) -> str:
+    return " ".join(city.split()).casefold()
+
+# One upstream call (retries are handled by the session adapter)
+def _fetch(city: str, api_key: str) -> Dict[str, Any]:
+    STATS["upstream"] += 1
+    started = time.perf_counter()
+    try:
+        r = _SESSION.get(
+            f"{WEATHER_API_BASE}/current.json",
+            params={"key": api_key, "q": city, "lang": "en"}, # encoded by requests
+            timeout=(WEATHER_CONNECT_TIMEOUT, WEATHER_READ_TIMEOUT),
+        )
+        tracing.record("http", "weatherapi", time.perf_counter() - started, status=r.status_code, city=city)
+        r.raise_for_status() # raise error for HTTP status 4xx/5xx -> except
+        data = r.json()
+        return {
+            "status": "ok",
+            "city": city,
+            "weather": data["current"]["condition"]["text"],
+            "temperature_c": data["current"]["temp_c"],
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+# MAIN: current weather for a city, served from the TTL cache when possible.
+# Concurrent callers for the same city share a single upstream request.
+def fetch_current(city: str) -> Dict[str, Any]:
+    api_key = os.getenv("WEATHER_API_KEY")
+    if not api_key:
+        return {"status": "error", "message": "API key not set"}
+    key = normalise_city(city)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+        if cached and cached[0] > time.monotonic():
+            STATS["hits"] += 1
+            tracing.event("cache", "weather", result="hit", city=city)
+            return {**cached[1], "city": city}
+        call = _INFLIGHT.get(key)
+        leader = call is None
+        if leader:
+            call = _INFLIGHT[key] = _Call()
+            STATS["misses"] += 1
+        else:
+            STATS["coalesced"] += 1
+    tracing.event("cache", "weather", result="miss" if leader else "coalesced", city=city)
+    if not leader: # someone is already fetching this city
+        call.done.wait()
+        return {**call.result, "city": city} if call.result.get("status") == "ok" else call.result
+    try:
+        call.result = _fetch(city, api_key)
+        if call.result["status"] == "ok": # errors are not cached
+            with _CACHE_LOCK:
+                _CACHE[key] = (time.monotonic() + WEATHER_CACHE_TTL, call.result)
+    finally:
+        with _CACHE_LOCK:
+            _INFLIGHT.pop(key, None)
+        call.done.set()
+    return call.result
+
+# drop blanks and duplicates, keep the first spelling
+def _unique_cities(cities: List[str]) -> List[str]:
+    unique: Dict[str, str] = {}
+    for c in cities:
+        if c.strip():
+            unique.setdefault(normalise_city(c), c)
+    return list(unique.values())
+
+# bounded pool shared by all sessions for multi-city lookups
+_POOL = ThreadPoolExecutor(max_workers=WEATHER_MAX_PARALLEL, thread_name_prefix="weather")
+
+# Current weather for several cities at once (about one upstream round trip in total)
+def fetch_many(cities: List[str]) -> List[Dict[str, Any]]:
+    unique = _unique_cities(cities)
+    if len(unique) <= 1:
+        return [fetch_current(c) for c in unique]
+    # each lookup runs in a copy of the caller's context so tracing follows it to the pool thread
+    futures = [_POOL.submit(contextvars.copy_context().run, fetch_current, c) for c in unique]
+    return [f.result() for f in futures]
+
+# ---------- async path (used by the async graph) ----------
+
+class _AsyncState:
+    """Per-event-loop HTTP client and in-flight requests (neither can cross loops)."""
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(WEATHER_READ_TIMEOUT, connect=WEATHER_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=WEATHER_POOL_SIZE, max_keepalive_connections=WEATHER_POOL_SIZE),
+        )
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+_ASYNC_STATES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _AsyncState]" = weakref.WeakKeyDictionary()
+
+def _async_state() -> _AsyncState:
+    loop = asyncio.get_running_loop()
+    state = _ASYNC_STATES.get(loop)
+    if state is None:
+        state = _ASYNC_STATES[loop] = _AsyncState()
+    return state
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# One upstream call with the same retry policy as the sync session
+async def _afetch(client: httpx.AsyncClient, city: str, api_key: str) -> Dict[str, Any]:
+    STATS["upstream"] += 1
+    try:
+        for attempt in range(WEATHER_RETRIES + 1):
+            try:
+                started = time.perf_counter()
+                r = await client.get(f"{WEATHER_API_BASE}/current.json", params={"key": api_key, "q": city, "lang": "en"})
+                tracing.record("http", "weatherapi", time.perf_counter() - started, status=r.status_code, city=city, attempt=attempt)
+                if r.status_code not in _RETRY_STATUS or attempt == WEATHER_RETRIES:
+                    break
+            except httpx.TransportError:
+                if attempt == WEATHER_RETRIES:
+                    raise
+            await asyncio.sleep(WEATHER_BACKOFF * (2 ** attempt) * (0.5 + random.random())) # jittered backoff
+        r.raise_for_status()
+        data = r.json()
+        return {
+            "status": "ok",
+            "city": city,
+            "weather": data["current"]["condition"]["text"],
+            "temperature_c": data["current"]["temp_c"],
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+# Async fetch_current: same cache, coalescing on the running loop
+async def afetch_current(city: str) -> Dict[str, Any]:
+    api_key = os.getenv("WEATHER_API_KEY")
+    if not api_key:
+        return {"status": "error", "message": "API key not set"}
+    key = normalise_city(city)
+    state = _async_state()
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+        if cached and cached[0] > time.monotonic():
+            STATS["hits"] += 1
+            tracing.event("cache", "weather", result="hit", city=city)
+            return {**cached[1], "city": city}
+    future = state.inflight.get(key)
+    if future is not None: # someone on this loop is already fetching this city
+        STATS["coalesced"] += 1
+        tracing.event("cache", "weather", result="coalesced", city=city)
+        result = await asyncio.shield(future)
+        return {**result, "city": city} if result.get("status") == "ok" else result
+    STATS["misses"] += 1
+    tracing.event("cache", "weather", result="miss", city=city)
+    future = state.inflight[key] = asyncio.get_running_loop().create_future()
+    result = {"status": "error", "message": "request failed"}
+    try:
+        result = await _afetch(state.client, city, api_key)
+        if result["status"] == "ok": # errors are not cached
+            with _CACHE_LOCK:
+                _CACHE[key] = (time.monotonic() + WEATHER_CACHE_TTL, result)
+    finally:
+        state.inflight.pop(key, None)
+        future.set_result(result)
+    return result
+
+# Async fetch_many: all cities concurrently, bounded by WEATHER_MAX_PARALLEL
+async def afetch_many(cities: List[str]) -> List[Dict[str, Any]]:
+    limit = asyncio.Semaphore(WEATHER_MAX_PARALLEL)
+
+    async def one(city: str) -> Dict[str, Any]:
+        async with limit:
+            return await afetch_current(city)
+
+    return list(await asyncio.gather(*(one(c) for c in _unique_cities(cities))))
+
+def clear_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE.clear()